@@ -1,11 +1,179 @@
-from fastapi import FastAPI
+import os
+import re
+from collections import OrderedDict
+
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import FileResponse, RedirectResponse
+
+import yaml_io
+from lhie1 import LHIE1_PROVIDERS_MAP, lhie1_filename
+from artifacts import artifact_path, current_source, pointer_version, read_pointer, render_and_publish
+from profiles import valid_token
+from renderer import VARIANTS, variant_from_user_agent
+from rule_compiler import RULESET_DIR
+from rule_convert import CONVERT_DIR
+from rule_mirror import MIRROR_DIR, read_manifest, upstream_url
+from validator import validate_config
 
 app = FastAPI()
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok", "mode": "standalone", "message": "Online features have been disabled."}
+    return {"status": "ok", "mode": "standalone"}
+
+# 指针缓存，轮询时只需 stat 而不必每次解析 JSON；按最近使用淘汰，档案删除后在下次请求时移除
+_pointer_cache = OrderedDict()  # (token, 变体) -> (指针文件 mtime, 指针)
+_POINTER_CACHE_SIZE = 256
+
+
+def _etag_matches(header, etags):
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") in etags for tag in header.split(","))
+
+
+def _accepts_gzip(header):
+    for coding in (header or "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() == "gzip":
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def _current_pointer(token, variant):
+    source = current_source(token)
+    if source is None:
+        for v in (None, *VARIANTS):
+            _pointer_cache.pop((token, v), None)
+        return None
+    mtime = pointer_version(token, variant)
+    cached = _pointer_cache.get((token, variant))
+    pointer = cached[1] if cached and cached[0] == mtime else read_pointer(token, variant)
+    if pointer is None or pointer.get("source") != source:
+        # 档案或转换计划在保存之后发生了变化 (或该变体尚未渲染)，重新渲染
+        pointer = render_and_publish(token, variant)
+        if pointer is None:
+            return None
+        mtime = pointer_version(token, variant)
+    _pointer_cache.pop((token, variant), None)
+    _pointer_cache[(token, variant)] = (mtime, pointer)
+    while len(_pointer_cache) > _POINTER_CACHE_SIZE:
+        _pointer_cache.popitem(last=False)
+    return pointer
+
 
 @app.get("/sub/{token}")
-def get_subscription(token: str):
-    return {"error": "Online features disabled"}
+def get_subscription(token: str, request: Request, target: str = None):
+    """
+    输出已保存档案的预渲染配置 (文件响应，内容不经过内存)。
+    target=desktop / openclash 指定变体，未指定时按 User-Agent 推断，否则使用档案保存的生成模式。
+    内容未变化时只需几次 stat；支持 If-None-Match (304) 与预压缩的 gzip。
+    """
+    if not valid_token(token):
+        raise HTTPException(status_code=404, detail="订阅不存在")
+    if target is not None and target not in VARIANTS:
+        raise HTTPException(status_code=400, detail=f"未知的 target，可选: {', '.join(VARIANTS)}")
+    variant = target or variant_from_user_agent(request.headers.get("user-agent"))
+    try:
+        pointer = _current_pointer(token, variant)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"配置渲染失败: {e}")
+    if pointer is None:
+        raise HTTPException(status_code=404, detail="订阅不存在")
+
+    etag = f'"{pointer["sha256"][:32]}"'
+    gzip_etag = f'"{pointer["sha256"][:32]}-gzip"'     # 不同内容编码的表示需要不同的强 ETag
+    use_gzip = _accepts_gzip(request.headers.get("accept-encoding"))
+    headers = {
+        "ETag": gzip_etag if use_gzip else etag,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding, User-Agent",
+        "Content-Disposition": 'inline; filename="config.yaml"',
+    }
+    if _etag_matches(request.headers.get("if-none-match"), (etag, gzip_etag)):
+        return Response(status_code=304, headers=headers)
+    path = artifact_path(pointer["sha256"])
+    if use_gzip:
+        path += ".gz"
+        headers["Content-Encoding"] = "gzip"
+    return FileResponse(path, media_type="text/yaml; charset=utf-8", headers=headers)
+
+
+@app.post("/validate")
+async def validate(request: Request):
+    """校验请求体中的 Clash YAML 配置"""
+    body = await request.body()
+    try:
+        config = yaml_io.load(body)
+    except yaml_io.YAMLError as e:
+        raise HTTPException(status_code=400, detail=f"YAML 解析错误: {e}")
+    if not isinstance(config, dict):
+        raise HTTPException(status_code=400, detail="内容不是有效的 Clash 配置")
+    errors, warnings = validate_config(config)
+    return {"valid": not errors, "errors": errors, "warnings": warnings}
+
+# 镜像清单按修改时间缓存，同步任务更新后自动重新读取
+_mirror_index = {"mtime": None, "files": {}}
+_LHIE1_FILES = {lhie1_filename(name): name for name in LHIE1_PROVIDERS_MAP}
+
+
+def _mirrored_files():
+    try:
+        mtime = os.path.getmtime(os.path.join(MIRROR_DIR, "manifest.json"))
+    except OSError:
+        return {}
+    if mtime != _mirror_index["mtime"]:
+        manifest = read_manifest(MIRROR_DIR)
+        _mirror_index["files"] = {entry["file"]: entry for entry in manifest.values()}
+        _mirror_index["mtime"] = mtime
+    return _mirror_index["files"]
+
+
+_COMPILED_RE = re.compile(r"^custom-[0-9a-f]{12}\.yaml$")
+
+
+@app.get("/ruleset/{filename}")
+def get_ruleset(filename: str, request: Request):
+    """
+    提供离线镜像的 lhie1 规则集 (尚未镜像的规则集重定向到上游)，
+    以及 rule_compiler 编译生成的 custom-<hash>.yaml (文件名即内容哈希，内容不会变化)。
+    """
+    if _COMPILED_RE.match(filename):
+        path = os.path.join(RULESET_DIR, filename)
+        if not os.path.exists(path):
+            raise HTTPException(status_code=404, detail="规则集不存在")
+        etag = f'"{filename}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return FileResponse(path, media_type="text/yaml; charset=utf-8", headers={"ETag": etag})
+
+    entry = _mirrored_files().get(filename)
+    if entry is None:
+        name = _LHIE1_FILES.get(filename)
+        if name is None:
+            raise HTTPException(status_code=404, detail="规则集不存在")
+        return RedirectResponse(upstream_url(name), status_code=307)
+
+    etag = f'"{entry["sha256"]}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return FileResponse(os.path.join(MIRROR_DIR, entry["file"]), media_type="text/yaml; charset=utf-8",
+                        headers={"ETag": etag})
+
+
+_CONVERTED_RE = re.compile(r"^[0-9a-f]{16}\.(mrs|txt)$")
+
+
+@app.get("/ruleset/converted/{filename}")
+def get_converted_ruleset(filename: str, request: Request):
+    """提供 rule_convert 拆分生成的规则集 (文件名即内容哈希，内容不会变化)"""
+    path = os.path.join(CONVERT_DIR, filename)
+    if not _CONVERTED_RE.match(filename) or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="规则集不存在")
+    etag = f'"{filename}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    media_type = "application/octet-stream" if filename.endswith(".mrs") else "text/plain; charset=utf-8"
+    return FileResponse(path, media_type=media_type, headers={"ETag": etag})
@@ -0,0 +1,222 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from prober import table_version
+from profiles import DATA_DIR, load_profile, profile_version, valid_token
+from renderer import VARIANTS, profile_inputs, render_profile
+from rule_convert import plan_version
+
+# ==========================================
+# 预渲染配置产物 (Artifact)
+# ==========================================
+# 保存订阅时渲染一次，写入按内容寻址的文件，同时生成预压缩的 .gz：
+#   data/artifacts/<sha256>.yaml       渲染结果
+#   data/artifacts/<sha256>.yaml.gz    gzip 版本
+#   data/artifacts/current/<token>.json  指针 (sha256、大小、渲染来源的档案版本，及档案用到的转换计划与延迟表版本)
+#   data/artifacts/current/<token>.<变体>.json  指定变体 (desktop / openclash) 的指针
+# 所有文件先写临时文件再原子替换，API 读到的永远是完整内容。
+# API 直接以文件响应输出，请求耗时与内存占用与配置大小无关。
+# 指针记录的来源版本与当前不一致 (档案被外部修改、转换计划或延迟表更新) 时由 API 重新渲染；
+# 未开启规则集转换 / 排除不可达节点的档案不受转换计划 / 延迟表更新的影响。
+
+ARTIFACT_DIR = os.path.join(DATA_DIR, "artifacts")
+POINTER_DIRNAME = "current"
+GZIP_LEVEL = 9          # 只在保存时压缩一次，取最高压缩率
+PRUNE_GRACE = 3600      # 未被引用的产物保留时间 (秒)，避免删除正在下载的文件
+
+# 以下缓存按最近使用淘汰，删除的档案不会一直占用内存 (API 进程长期运行，且见不到 Web 端的删除操作)
+_CACHE_SIZE = 256
+_locks = OrderedDict()  # (token, 变体) -> 渲染锁
+_inputs = OrderedDict() # token -> (档案版本, 是否使用转换计划, 是否使用延迟表)
+_cache_guard = threading.Lock()
+
+
+def _atomic_write(path, data):
+    tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def artifact_path(sha256, artifact_dir=ARTIFACT_DIR):
+    return os.path.join(artifact_dir, f"{sha256}.yaml")
+
+
+def _pointer_path(token, artifact_dir, variant=None):
+    if not valid_token(token):
+        raise ValueError(f"无效的 token: {token}")
+    if variant is not None and variant not in VARIANTS:
+        raise ValueError(f"未知的变体: {variant}")
+    name = token if variant is None else f"{token}.{variant}"
+    return os.path.join(artifact_dir, POINTER_DIRNAME, f"{name}.json")
+
+
+def _render_lock(token, variant):
+    """取得渲染锁；超出数量时淘汰最久未用、且当前未被持有的锁"""
+    key = (token, variant)
+    with _cache_guard:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = threading.Lock()
+        _locks.move_to_end(key)
+        for old_key in list(_locks)[:max(0, len(_locks) - _CACHE_SIZE)]:
+            if not _locks[old_key].locked():
+                del _locks[old_key]
+    return lock
+
+
+def forget(token):
+    """丢弃档案在本进程中的缓存 (档案删除后调用)"""
+    with _cache_guard:
+        _inputs.pop(token, None)
+        for variant in (None, *VARIANTS):
+            _locks.pop((token, variant), None)
+
+
+def _profile_inputs(token, version):
+    """档案用到的外部数据，按档案版本缓存，只在档案变化后重新读取"""
+    with _cache_guard:
+        cached = _inputs.get(token)
+        if cached and cached[0] == version:
+            _inputs.move_to_end(token)
+            return cached[1:]
+    profile = load_profile(token)
+    inputs = profile_inputs(profile["global_config"]) if profile else (False, False)
+    with _cache_guard:
+        _inputs.pop(token, None)
+        _inputs[token] = (version, *inputs)
+        while len(_inputs) > _CACHE_SIZE:
+            _inputs.popitem(last=False)
+    return inputs
+
+
+def current_source(token):
+    """
+    档案当前的渲染来源版本 [档案版本, 转换计划版本, 延迟表版本]；档案不存在时返回 None。
+    档案未用到的转换计划 / 延迟表记为 None，其更新不会使已发布的产物失效。
+    """
+    version = profile_version(token)
+    if version is None:
+        forget(token)
+        return None
+    uses_plan, uses_table = _profile_inputs(token, version)
+    return [list(version), plan_version() if uses_plan else None, table_version() if uses_table else None]
+
+
+def publish(token, body, source=None, variant=None, artifact_dir=ARTIFACT_DIR):
+    """写入渲染结果与 gzip 版本 (内容已存在时跳过)，再原子更新指针。返回指针字典"""
+    os.makedirs(os.path.join(artifact_dir, POINTER_DIRNAME), exist_ok=True)
+    sha256 = hashlib.sha256(body).hexdigest()
+    path = artifact_path(sha256, artifact_dir)
+    if not os.path.exists(path + ".gz"):
+        _atomic_write(path + ".gz", gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0))
+    if not os.path.exists(path):
+        _atomic_write(path, body)
+    pointer = {
+        "sha256": sha256,
+        "size": len(body),
+        "gz_size": os.path.getsize(path + ".gz"),
+        "source": source,
+        "published_at": int(time.time()),
+    }
+    _atomic_write(_pointer_path(token, artifact_dir, variant), json.dumps(pointer).encode("utf-8"))
+    return pointer
+
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def read_pointer(token, variant=None, artifact_dir=ARTIFACT_DIR):
+    return _read_json(_pointer_path(token, artifact_dir, variant))
+
+
+def pointer_version(token, variant=None, artifact_dir=ARTIFACT_DIR):
+    """指针文件的修改时间，用于缓存已读取的指针；不存在时返回 None"""
+    try:
+        return os.stat(_pointer_path(token, artifact_dir, variant)).st_mtime_ns
+    except (OSError, ValueError):
+        return None
+
+
+def render_and_publish(token, variant=None, artifact_dir=ARTIFACT_DIR, profile=None):
+    """
+    渲染档案 (的指定变体) 并发布，返回指针；档案不存在时返回 None。
+    同一 token 与变体的并发调用只会渲染一次，其余调用直接使用结果。
+    """
+    with _render_lock(token, variant):
+        source = current_source(token)
+        if source is None:
+            return None
+        pointer = read_pointer(token, variant, artifact_dir)
+        if pointer and pointer.get("source") == source and os.path.exists(artifact_path(pointer["sha256"], artifact_dir)):
+            return pointer
+        if profile is None:
+            profile = load_profile(token)
+            if profile is None:
+                return None
+        return publish(token, render_profile(profile, variant), source=source, variant=variant,
+                       artifact_dir=artifact_dir)
+
+
+def publish_all(token, artifact_dir=ARTIFACT_DIR):
+    """
+    发布档案的默认版本与全部变体，返回默认版本的指针。
+    变体之间共用分段缓存，节点列表只序列化一次。
+    """
+    profile = load_profile(token)
+    if profile is None:
+        return None
+    pointer = render_and_publish(token, artifact_dir=artifact_dir, profile=profile)
+    for variant in VARIANTS:
+        render_and_publish(token, variant, artifact_dir=artifact_dir, profile=profile)
+    return pointer
+
+
+def remove(token, artifact_dir=ARTIFACT_DIR):
+    forget(token)
+    for variant in (None, *VARIANTS):
+        try:
+            os.remove(_pointer_path(token, artifact_dir, variant))
+        except (OSError, ValueError):
+            pass
+
+
+def prune(artifact_dir=ARTIFACT_DIR, grace=PRUNE_GRACE):
+    """删除不再被任何指针引用、且超过保留时间的产物，返回删除的文件数"""
+    pointer_dir = os.path.join(artifact_dir, POINTER_DIRNAME)
+    referenced = set()
+    try:
+        names = os.listdir(pointer_dir)
+    except OSError:
+        names = []
+    for name in names:
+        if name.endswith(".json"):
+            pointer = _read_json(os.path.join(pointer_dir, name))
+            if pointer:
+                referenced.add(pointer["sha256"])
+
+    removed = 0
+    now = time.time()
+    for name in os.listdir(artifact_dir):
+        if not name.endswith((".yaml", ".yaml.gz")):
+            continue
+        if name.split(".", 1)[0] in referenced:
+            continue
+        path = os.path.join(artifact_dir, name)
+        try:
+            if now - os.path.getmtime(path) > grace:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
@@ -0,0 +1,180 @@
+import socket
+import sys
+
+import yaml_io
+from validator import parse_rule
+
+# ==========================================
+# IP 网段聚合
+# ==========================================
+# 网段转换为整数区间 [start, end]，IPv4 / IPv6 分开排序后合并重叠与相邻区间，
+# 再把每个区间拆成最少的对齐前缀。整体为 O(N log N)，50 万条约数秒。
+
+CIDR_RULE_TYPES = ("IP-CIDR", "IP-CIDR6")
+_FAMILIES = {32: socket.AF_INET, 128: socket.AF_INET6}
+
+
+def parse_cidr(value):
+    """解析网段为 (地址位数 32/128, 网络地址整数, 前缀长度)，主机位会被清零；格式错误时抛出 ValueError"""
+    addr, _, prefix = value.strip().partition("/")
+    for bits, family in _FAMILIES.items():
+        try:
+            packed = socket.inet_pton(family, addr)
+        except OSError:
+            continue
+        try:
+            plen = int(prefix) if prefix else bits
+        except ValueError:
+            raise ValueError(f"无效的前缀长度: {value}") from None
+        if not 0 <= plen <= bits:
+            raise ValueError(f"前缀长度超出范围: {value}")
+        host_bits = bits - plen
+        return bits, int.from_bytes(packed, "big") >> host_bits << host_bits, plen
+    raise ValueError(f"无效的网段: {value}")
+
+
+def format_cidr(bits, network, plen):
+    return f"{socket.inet_ntop(_FAMILIES[bits], network.to_bytes(bits // 8, 'big'))}/{plen}"
+
+
+def _merge(ranges):
+    """合并已排序的 [start, end] 区间 (重叠或相邻)"""
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _range_to_prefixes(bits, start, end):
+    """将区间拆分为最少的对齐前缀"""
+    result = []
+    while start <= end:
+        # start 的对齐块大小 (最低位的 1)，start 为 0 时可以取整个地址空间
+        size = start & -start if start else 1 << bits
+        while size > end - start + 1:
+            size >>= 1
+        result.append((start, bits - size.bit_length() + 1))
+        start += size
+    return result
+
+
+def aggregate(cidrs):
+    """
+    聚合网段列表，返回 (聚合后的网段字符串列表, 无法解析的条目列表)。
+    IPv4 在前、IPv6 在后，各自按地址升序排列。
+    """
+    ranges = {32: [], 128: []}
+    invalid = []
+    for value in cidrs:
+        try:
+            bits, network, plen = parse_cidr(value)
+        except ValueError:
+            invalid.append(value)
+            continue
+        ranges[bits].append((network, network + (1 << (bits - plen)) - 1))
+
+    result = []
+    for bits in (32, 128):
+        ranges[bits].sort()
+        for start, end in _merge(ranges[bits]):
+            result.extend(format_cidr(bits, net, plen) for net, plen in _range_to_prefixes(bits, start, end))
+    return result, invalid
+
+
+def _cidr_rule_key(rule):
+    """IP-CIDR 规则返回 ((目标策略, 附加参数), 网段)，其他规则返回 None"""
+    try:
+        rule_type, payload, target = parse_rule(rule)
+    except ValueError:
+        return None
+    if rule_type not in CIDR_RULE_TYPES:
+        return None
+    options = tuple(p.strip() for p in rule.split(",")[3:])
+    return (target, options), payload
+
+
+def aggregate_rules(rules):
+    """
+    聚合连续的、目标策略与附加参数 (如 no-resolve) 相同的 IP-CIDR / IP-CIDR6 规则。
+    只在相邻规则内合并，匹配结果不变。返回 (新规则列表, 聚合前网段规则数, 聚合后网段规则数)。
+    """
+    result = []
+    before = after = 0
+    run_key = None
+    run = []
+
+    def flush():
+        nonlocal after
+        target, options = run_key
+        merged, _ = aggregate(run)
+        suffix = "".join(f",{o}" for o in options)
+        for cidr in merged:
+            rule_type = "IP-CIDR6" if ":" in cidr else "IP-CIDR"
+            result.append(f"{rule_type},{cidr},{target}{suffix}")
+        after += len(merged)
+
+    for rule in rules:
+        parsed = _cidr_rule_key(rule)
+        # 无法解析的网段保持原样，不参与合并
+        if parsed is not None:
+            try:
+                parse_cidr(parsed[1])
+            except ValueError:
+                parsed = None
+        if parsed is not None and parsed[0] == run_key:
+            run.append(parsed[1])
+            before += 1
+            continue
+        if run:
+            flush()
+        if parsed is None:
+            result.append(rule)
+            run_key, run = None, []
+        else:
+            run_key, run = parsed[0], [parsed[1]]
+            before += 1
+    if run:
+        flush()
+    return result, before, after
+
+
+def aggregate_provider_file(data):
+    """
+    聚合 ipcidr 规则集文件内容 (bytes，YAML payload 或每行一条的文本格式，保持原格式)。
+    返回 (新内容 bytes, 聚合前条数, 聚合后条数, 无法解析的条目列表)。
+    """
+    text = data.decode("utf-8-sig")
+    if "payload:" in text:
+        cidrs = yaml_io.load_payload(text)
+        merged, invalid = aggregate(cidrs)
+        content = "payload:\n" + "".join(f"- {cidr}\n" for cidr in merged)
+    else:
+        cidrs = [l.strip() for l in text.splitlines() if l.strip() and not l.strip().startswith("#")]
+        merged, invalid = aggregate(cidrs)
+        content = "\n".join(merged) + "\n"
+    return content.encode("utf-8"), len(cidrs), len(merged), invalid
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) not in (1, 2):
+        print("用法: python cidr.py 输入文件 [输出文件]")
+        return 2
+    with open(argv[0], "rb") as f:
+        data = f.read()
+    content, before, after, invalid = aggregate_provider_file(data)
+    if len(argv) == 2:
+        with open(argv[1], "wb") as f:
+            f.write(content)
+    else:
+        sys.stdout.write(content.decode("utf-8"))
+    print(f"聚合完成: {before} -> {after} 条 (减少 {before - after})，无法解析 {len(invalid)} 条", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
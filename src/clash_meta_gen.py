@@ -1,5 +1,8 @@
-import yaml
+import yaml_io
 import os
+import re
+
+from region import REGION_NAMES, group_by_region, region_filter
 
 # ==========================================
 # 安全警告 / Security Warning
@@ -116,7 +119,8 @@ proxies_data = [
 # 策略组逻辑 (保持原有结构)
 # ==========================================
 
-def create_group(name, type_name, proxies_list, extra_proxies=None, url=None, interval=None, disable_udp=False, tolerance=None):
+def create_group(name, type_name, proxies_list, extra_proxies=None, url=None, interval=None, disable_udp=False, tolerance=None,
+                 include_all=False, filter=None, use=None, exclude_filter=None):
     group = {
         "name": name,
         "type": type_name,
@@ -125,8 +129,17 @@ def create_group(name, type_name, proxies_list, extra_proxies=None, url=None, in
     if extra_proxies:
         group["proxies"].extend(extra_proxies)
         
-    node_names = [p['name'] for p in proxies_list]
-    group["proxies"].extend(node_names)
+    if include_all:
+        # 精简模式：由核心在加载时自动纳入全部节点，配置体积与节点数无关
+        group["include-all-proxies"] = True
+        if not group["proxies"]:
+            del group["proxies"]
+    else:
+        node_names = [p['name'] for p in proxies_list]
+        group["proxies"].extend(node_names)
+    if filter: group["filter"] = filter
+    if exclude_filter: group["exclude-filter"] = exclude_filter
+    if use: group["use"] = use
     
     if url: group["url"] = url
     if interval: group["interval"] = interval
@@ -134,16 +147,62 @@ def create_group(name, type_name, proxies_list, extra_proxies=None, url=None, in
     if tolerance and type_name == "url-test": group["tolerance"] = tolerance
     return group
 
-def generate_proxy_groups(all_proxies):
+def _exclude_names_filter(names):
+    """精确匹配给定节点名称的 exclude-filter 正则 (反引号在 Clash Meta 中用于分隔多个正则，需转义)"""
+    return "^(?:" + "|".join(re.escape(n).replace("`", r"\x60") for n in sorted(names)) + ")$"
+
+def _join_filters(*filters):
+    """合并多个 exclude-filter (Clash Meta 以反引号分隔)，全部为空时返回 None"""
+    return "`".join(f for f in filters if f) or None
+
+def _alive(proxies, dead):
+    """返回 (参与测速的节点, 被排除的节点名称)；全部不可达时保留原样，避免生成空的测速组"""
+    if not dead:
+        return proxies, set()
+    alive = [p for p in proxies if p['name'] not in dead]
+    if not alive:
+        return proxies, set()
+    return alive, {p['name'] for p in proxies if p['name'] in dead}
+
+def generate_proxy_groups(all_proxies, compact=False, unreachable=None, regions=False):
+    """
+    compact=True 时使用 Clash Meta 的 include-all-proxies 代替逐个列出节点名，
+    每个策略组的大小与节点数量无关。
+    unreachable 为探测判定不可达的节点名称集合 (见 prober.py)，这些节点不参与自动测速；
+    全部节点都不可达时保留原样，避免生成空的测速组。
+    regions=True 时按名称识别节点地区 (见 region.py)，为每个地区生成 url-test 组，
+    自动测速、应用与电视分组改为引用地区组，只直接列出无法识别地区的节点。
+    """
     groups = []
-    
+    test_options = {"url": "http://cp.cloudflare.com/generate_204", "interval": 600, "tolerance": 50}
+    dead = set(unreachable or ())
+
+    if regions:
+        region_list, rest_proxies = group_by_region(all_proxies)
+        region_groups = [f"{REGION_NAMES[code]} - UrlTest" for code, _ in region_list]
+        # 精简模式下由内核排除属于任一地区的节点
+        rest_filter = region_filter({code for code, _ in region_list}) if compact and region_list else None
+    else:
+        region_list, rest_proxies, region_groups, rest_filter = [], all_proxies, [], None
+
     # 1. 自动测速
-    groups.append(create_group("Auto - UrlTest", "url-test", all_proxies, 
-                               url="http://cp.cloudflare.com/generate_204", interval=600, tolerance=50))
+    auto_proxies, auto_dead = _alive(rest_proxies, dead)
+    groups.append(create_group("Auto - UrlTest", "url-test", auto_proxies, extra_proxies=region_groups,
+                               include_all=compact,
+                               exclude_filter=_join_filters(rest_filter, compact and auto_dead and _exclude_names_filter(auto_dead)),
+                               **test_options))
+
+    # 1.5 地区测速
+    for (code, members), group_name in zip(region_list, region_groups):
+        members, members_dead = _alive(members, dead)
+        groups.append(create_group(group_name, "url-test", members, include_all=compact,
+                                   filter=region_filter({code}) if compact else None,
+                                   exclude_filter=_exclude_names_filter(members_dead) if compact and members_dead else None,
+                                   **test_options))
     
     # 2. 手动选择
     groups.append(create_group("Proxy", "select", all_proxies, 
-                               extra_proxies=["Auto - UrlTest", "DIRECT"]))
+                               extra_proxies=["Auto - UrlTest", "DIRECT"] + region_groups, include_all=compact))
     
     # 3. 基础流量规则
     groups.append({"name": "Domestic", "type": "select", "proxies": ["DIRECT", "Proxy"]})
@@ -160,20 +219,25 @@ def generate_proxy_groups(all_proxies):
     for app in app_groups:
         # Bilibili 特殊处理：默认直连
         if app == "Bilibili":
-            groups.append(create_group(app, "select", all_proxies, extra_proxies=["CN Mainland TV", "DIRECT", "Proxy"]))
+            groups.append(create_group(app, "select", rest_proxies, extra_proxies=["CN Mainland TV", "DIRECT", "Proxy"] + region_groups,
+                                       include_all=compact, exclude_filter=rest_filter))
         else:
-            groups.append(create_group(app, "select", all_proxies, extra_proxies=["Proxy", "DIRECT"]))
+            groups.append(create_group(app, "select", rest_proxies, extra_proxies=["Proxy", "DIRECT"] + region_groups,
+                                       include_all=compact, exclude_filter=rest_filter))
 
     # Youtube 特殊处理：disable-udp
-    groups.append(create_group("Youtube", "select", all_proxies, extra_proxies=["Global TV", "DIRECT", "Proxy"], disable_udp=True))
+    groups.append(create_group("Youtube", "select", rest_proxies, extra_proxies=["Global TV", "DIRECT", "Proxy"] + region_groups,
+                               disable_udp=True, include_all=compact, exclude_filter=rest_filter))
 
     # 5. 拦截与功能
     groups.append({"name": "AdBlock", "type": "select", "proxies": ["REJECT", "DIRECT", "Proxy"]})
     groups.append({"name": "HTTPDNS", "type": "select", "proxies": ["REJECT", "DIRECT", "Proxy"]})
     
     # 电视分组
-    groups.append(create_group("Global TV", "select", all_proxies, extra_proxies=["Proxy", "DIRECT"]))
-    groups.append(create_group("Asian TV", "select", all_proxies, extra_proxies=["Proxy", "DIRECT"]))
+    groups.append(create_group("Global TV", "select", rest_proxies, extra_proxies=["Proxy", "DIRECT"] + region_groups,
+                               include_all=compact, exclude_filter=rest_filter))
+    groups.append(create_group("Asian TV", "select", rest_proxies, extra_proxies=["Proxy", "DIRECT"] + region_groups,
+                               include_all=compact, exclude_filter=rest_filter))
     groups.append({"name": "CN Mainland TV", "type": "select", "proxies": ["DIRECT", "Proxy"]})
     
     return groups
@@ -221,7 +285,7 @@ def main():
     
     try:
         with open(output_path, 'w', encoding='utf-8') as f:
-            yaml.dump(final_config, f, allow_unicode=True, sort_keys=False, default_flow_style=False)
+            yaml_io.dump(final_config, f)
         print(f"✅ [Safe Mode] 配置文件已生成: {output_path}")
         print("⚠️  注意：此配置包含示例占位符。请在运行前替换为真实的服务器信息。")
     except Exception as e:
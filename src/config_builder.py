@@ -0,0 +1,494 @@
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+
+from cidr import aggregate_rules
+from clash_meta_gen import generate_proxy_groups
+from lhie1 import LHIE1_BASE_URL, LHIE1_PROVIDERS_MAP, lhie1_filename
+from healthcheck import DEFAULT_MAX_FANOUT, apply_budget
+from node_store import NodeStore
+from prober import unreachable_names
+from rule_analyzer import drop_shadowed
+from rule_compiler import compile_rules
+from rule_convert import apply_plan
+
+# ==========================================
+# 生成模式
+# ==========================================
+TARGET_DESKTOP = "全平台客户端 (PC/移动端)"
+TARGET_OPENCLASH = "OpenClash / 软路由"
+
+# ==========================================
+# 生产环境级配置常量 (提取自你的 Config)
+# ==========================================
+# Fake-IP 过滤列表 (防止国内应用卡顿)
+FAKE_IP_FILTER_LIST = [
+    "+.services.googleapis.cn", "+.googleapis.cn", "*.lan", "*.localdomain", "*.example", "*.invalid",
+    "*.localhost", "*.test", "*.local", "*.home.arpa", "*.direct", "cable.auth.com",
+    "network-test.debian.org", "detectportal.firefox.com", "msftconnecttest.com", "msftncsi.com",
+    "localhost.*.weixin.qq.com", "*.blzstatic.cn", "*.126.net", "*.163.com", "*.music.163.com",
+    "*.kuwo.cn", "*.kugou.com", "*.y.qq.com", "*.music.migu.cn", "music.migu.cn",
+    "+.qq.com", "+.tencent.com", "+.srv.nintendo.net", "*.xboxlive.com", "+.battle.net",
+    "proxy.golang.org", "stun.*.*", "heartbeat.belkin.com", "*.linksys.com", "*.router.asus.com",
+    "mesu.apple.com", "swscan.apple.com", "swquery.apple.com", "swdownload.apple.com",
+    "Mijia Cloud", "+.cmbchina.com", "local.adguard.org", "geosite:cn"
+]
+
+# 嗅探配置 (强制嗅探 Netflix 等)
+SNIFFER_FORCE_DOMAIN = [
+    "+.netflix.com", "+.nflxvideo.net", "+.amazonaws.com", "+.media.dssott.com"
+]
+SNIFFER_SKIP_DOMAIN = [
+    "Mijia Cloud", "dlg.io.mi.com", "+.oray.com", "+.sunlogin.net", "+.push.apple.com"
+]
+
+# 强力直连兜底规则 (自定义规则默认值)
+DEFAULT_DIRECT_RULES = """## 基础直连规则
+DOMAIN-SUFFIX,weather.com,DIRECT
+DOMAIN-KEYWORD,testipv6,DIRECT
+DOMAIN-KEYWORD,kuxueyun,DIRECT
+GEOSITE,category-public-tracker,DIRECT
+DOMAIN-SUFFIX,microsoft.com,DIRECT
+DOMAIN-SUFFIX,apple.com,DIRECT
+DOMAIN,gateway.icloud.com,DIRECT
+DOMAIN,metrics.icloud.com,DIRECT
+DOMAIN-SUFFIX,dbankcdn.com,DIRECT
+DOMAIN-SUFFIX,dbankcloud.cn,DIRECT
+DOMAIN-SUFFIX,vsallcity.awsdns-cn-north-1.com.cn,DIRECT
+
+## 国内流媒体与应用直连
+DOMAIN-SUFFIX,bilibili.com,DIRECT
+DOMAIN-SUFFIX,bilivideo.com,DIRECT
+DOMAIN-SUFFIX,douyin.com,DIRECT
+DOMAIN-SUFFIX,douyincdn.com,DIRECT
+DOMAIN-SUFFIX,huya.com,DIRECT
+DOMAIN-SUFFIX,iqiyi.com,DIRECT
+DOMAIN-SUFFIX,qq.com,DIRECT
+DOMAIN-SUFFIX,tencent.com,DIRECT
+DOMAIN-SUFFIX,alicdn.com,DIRECT
+DOMAIN-SUFFIX,taobao.com,DIRECT
+DOMAIN-SUFFIX,jd.com,DIRECT
+DOMAIN-SUFFIX,163.com,DIRECT
+DOMAIN-SUFFIX,126.net,DIRECT
+DOMAIN-SUFFIX,mgtv.com,DIRECT
+DOMAIN-SUFFIX,zhihu.com,DIRECT
+DOMAIN-SUFFIX,xhscdn.com,DIRECT
+
+## 下载工具进程直连
+PROCESS-NAME,aria2c,DIRECT
+PROCESS-NAME,BitComet,DIRECT
+PROCESS-NAME,fdm,DIRECT
+PROCESS-NAME,NetTransport,DIRECT
+PROCESS-NAME,qbittorrent,DIRECT
+PROCESS-NAME,Thunder,DIRECT
+PROCESS-NAME,transmission-daemon,DIRECT
+PROCESS-NAME,transmission-qt,DIRECT
+PROCESS-NAME,uTorrent,DIRECT
+PROCESS-NAME,WebTorrent,DIRECT
+PROCESS-NAME,Folx,DIRECT
+PROCESS-NAME,v2ray,DIRECT
+PROCESS-NAME,ss-local,DIRECT
+PROCESS-NAME,ssr-local,DIRECT
+PROCESS-NAME,ss-redir,DIRECT
+PROCESS-NAME,trojan-go,DIRECT
+PROCESS-NAME,xray,DIRECT
+PROCESS-NAME,hysteria,DIRECT
+PROCESS-NAME,singbox,DIRECT
+PROCESS-NAME,UUBooster,DIRECT
+
+## 局域网与GeoIP
+GEOIP,CN,DIRECT,no-resolve
+MATCH,Proxy
+"""
+
+# 全局设置默认值 (侧边栏初始值)
+DEFAULT_GLOBAL_CONFIG = {
+    # 基础
+    "port": 7890,
+
+    "socks_port": 7891,
+    "mixed_port": 7893,
+    "allow_lan": True,
+    "bind_address": "*",
+    "mode": "rule",
+    "log_level": "info",
+    "ipv6_support": True,
+    "external_controller": "0.0.0.0:9090",
+    "secret": "password",  # 设置默认密码为"password"
+    # 性能与网络
+    "keep_alive_interval": 15,
+    "tcp_concurrent": True,
+    "unified_delay": True,
+    "find_process_mode": "strict",
+    "geodata_mode": True,
+    "geodata_loader": "standard",
+    # TUN
+    "enable_tun": False,
+    "tun_stack": "mixed", # 修改为 mixed
+    "tun_device": "utun",
+    "tun_auto_route": True,
+    "tun_auto_detect_interface": True,
+    "tun_dns_hijack": True,
+    # DNS (参考 Config)
+    "enable_dns": True,
+    "dns_listen": "0.0.0.0:7874", # 修改为 7874
+    "dns_ipv6": True,
+    "enhanced_mode": "fake-ip",
+    "fake_ip_range": "198.18.0.1/16",
+    "default_nameserver": "223.5.5.5\n119.29.29.29",
+    "nameserver": "https://dns.alidns.com/dns-query\nhttps://doh.pub/dns-query",
+    "fallback": "https://1.1.1.1/dns-query\ntcp://8.8.8.8",
+    # 嗅探 (默认开启)
+    "enable_sniffer": True, 
+    "sniff_override_dest": True,
+    # 策略组
+    "compact_groups": False,
+    # 按名称识别节点地区，生成地区测速组并由应用分组引用 (见 region.py)
+    "region_groups": False,
+    # 自动测速组排除延迟表中不可达的节点 (见 prober.py)
+    "skip_unreachable": False,
+    # 每台路由器的健康检查预算 (次/分钟，0 为不限制) 与单个测速组的节点上限 (见 healthcheck.py)
+    "healthcheck_budget": 0,
+    "healthcheck_max_fanout": DEFAULT_MAX_FANOUT,
+    # 移除被前面规则完全遮蔽的规则
+    "drop_shadowed_rules": False,
+    # 合并相邻的、目标相同的 IP-CIDR 规则为最少的网段 (无损)
+    "aggregate_cidr": False,
+    # 将连续的 DOMAIN / DOMAIN-SUFFIX / IP-CIDR 规则编译为规则集文件
+    "compile_rules": False,
+    # lhie1 规则集改为从本服务的离线镜像 (api.py /ruleset/) 拉取
+    "mirror_rules": False,
+    "mirror_url": os.environ.get("HOST_URL", "http://localhost:8000"),
+    # 按转换计划将 classical 规则集拆分为 domain / ipcidr / classical (见 rule_convert.py)
+    "convert_rules": False,
+    # 规则
+    "custom_rules": DEFAULT_DIRECT_RULES # 注入默认规则
+}
+
+RULE_TYPE_LHIE1 = "lhie1规则"
+RULE_TYPE_CUSTOM = "自定义规则"
+
+# Google 特殊域名代理 (防止 DNS 泄露)
+GOOGLE_LEAK_RULES = [
+    "DOMAIN-SUFFIX,xn--ngstr-lra8j.com,Proxy",
+    "DOMAIN-SUFFIX,services.googleapis.cn,Proxy"
+]
+
+
+# ==========================================
+# 配置片段构建
+# ==========================================
+
+def text_to_list(text):
+    return [x.strip() for x in text.split('\n') if x.strip()]
+
+
+def parse_nameserver_policy(text):
+    """解析 'key: value' 形式的多行 Nameserver Policy"""
+    policy_dict = {}
+    for line in (text or "").split('\n'):
+        if ':' in line:
+            # 简单处理：key: value
+            k, v = line.split(':', 1)
+            policy_dict[k.strip()] = v.strip()
+    return policy_dict
+
+
+def build_general_section(gc):
+    return {
+        "port": gc["port"],
+        "socks-port": gc["socks_port"],
+        "mixed-port": gc["mixed_port"],
+        "allow-lan": gc["allow_lan"],
+        "bind-address": gc["bind_address"],
+        "mode": gc["mode"],
+        "log-level": gc["log_level"],
+        "ipv6": gc["ipv6_support"],
+        "external-controller": gc["external_controller"],
+        "find-process-mode": gc["find_process_mode"]
+    }
+
+
+def build_tun_section(gc):
+    return {
+        "enable": True,
+        "stack": gc["tun_stack"],
+        "device": gc["tun_device"],
+        "auto-route": gc["tun_auto_route"],
+        "auto-detect-interface": gc["tun_auto_detect_interface"],
+        "dns-hijack": ["any:53"] if gc["tun_dns_hijack"] else []
+    }
+
+
+def build_dns_section(gc):
+    dns = {
+        "enable": True,
+        "listen": gc["dns_listen"],
+        "ipv6": gc["dns_ipv6"],
+        "enhanced-mode": gc["enhanced_mode"],
+        "fake-ip-range": gc["fake_ip_range"],
+        "fake-ip-filter": ["*.lan", "*.local", "time.windows.com"] + FAKE_IP_FILTER_LIST,
+        "default-nameserver": text_to_list(gc["default_nameserver"]),
+        "nameserver": text_to_list(gc["nameserver"]),
+        "fallback": text_to_list(gc["fallback"]),
+        "fallback-filter": {"geoip": True, "geoip-code": "CN", "ipcidr": ["240.0.0.0/4"]}
+    }
+    policy_dict = parse_nameserver_policy(gc.get("nameserver_policy", ""))
+    if policy_dict:
+        dns["nameserver-policy"] = policy_dict
+    return dns
+
+
+def build_sniffer_section():
+    return {
+        "enable": True,
+        "sniff": {
+            "TLS": {"ports": [443]},
+            "HTTP": {"ports": [80], "override-destination": True}
+        },
+        "force-domain": SNIFFER_FORCE_DOMAIN,
+        "skip-domain": SNIFFER_SKIP_DOMAIN
+    }
+
+
+def build_preset_rules(rule_type, mirror_url=None):
+    """返回 (rule-providers, rules) 预设规则；传入 mirror_url 时 lhie1 规则集从该服务的 /ruleset/ 拉取"""
+    if rule_type == RULE_TYPE_LHIE1:
+        providers = {}
+        rule_list = []
+        for name, (suffix, target) in LHIE1_PROVIDERS_MAP.items():
+            # 1. Add Provider
+            real_suffix = suffix if suffix else name
+            if mirror_url:
+                url = f"{mirror_url.rstrip('/')}/ruleset/{lhie1_filename(name)}"
+            else:
+                url = f"{LHIE1_BASE_URL}/{real_suffix}.yaml"
+            providers[name] = {
+                "type": "http",
+                "behavior": "classical",
+                "url": url,
+                "path": f"./ruleset/{lhie1_filename(name)}",
+                "interval": 86400
+            }
+            # 2. Add Rule
+            rule_list.append(f"RULE-SET,{name},{target}")
+
+        rule_list = GOOGLE_LEAK_RULES + rule_list
+
+        # 添加通用规则
+        rule_list.extend([
+            "GEOIP,CN,Domestic,no-resolve",
+            "MATCH,Others"
+        ])
+        return providers, rule_list
+
+    if rule_type == RULE_TYPE_CUSTOM:
+        return {}, GOOGLE_LEAK_RULES + [
+            "DOMAIN-SUFFIX,google.com,Proxy",
+            "DOMAIN-SUFFIX,youtube.com,Proxy",
+            "GEOIP,CN,DIRECT,no-resolve",
+            "MATCH,Proxy"
+        ]
+
+    return {}, GOOGLE_LEAK_RULES + [
+        "GEOIP,CN,DIRECT,no-resolve",
+        "MATCH,Proxy"
+    ]
+
+
+def build_custom_providers(custom_rule_providers):
+    """返回 (rule-providers, 优先规则, 追加规则)"""
+    providers = {}
+    prepend = []
+    append = []
+    for name, config in custom_rule_providers.items():
+        provider = {
+            "type": config["type"],
+            "behavior": config["behavior"],
+            "path": config["path"],
+            "interval": config["interval"]
+        }
+        if config["type"] == "http":
+            provider["url"] = config["url"]
+        if config["format"]:
+            provider["format"] = config["format"]
+        providers[name] = provider
+
+        # 生成对应的规则
+        target_group = config.get('target', 'Proxy')
+        new_rule = f"RULE-SET,{name},{target_group}"
+        if config.get("order") == "优先 (覆盖)":
+            prepend.append(new_rule)
+        else:
+            append.append(new_rule)
+    return providers, prepend, append
+
+
+def split_rules(rules):
+    """分离普通规则和兜底规则(MATCH)"""
+    normal = []
+    match = []
+    for r in rules:
+        if r.startswith("MATCH,"):
+            match.append(r)
+        else:
+            normal.append(r)
+    return normal, match
+
+
+def assemble_rules(custom_rules, preset_rules, prepend, append):
+    # 合并顺序:
+    # 1. 自定义单条规则 (最优先)
+    # 2. 规则集 (优先覆盖)
+    # 3. 预设规则 (lhie1) [除了最后的 MATCH]
+    # 4. 规则集 (默认追加)
+    # 5. 兜底 MATCH (如果预设里有)
+    preset_normal, preset_match = split_rules(preset_rules)
+
+    final_rules = []
+    final_rules.extend(custom_rules)
+    final_rules.extend(prepend)
+    final_rules.extend(preset_normal)
+    final_rules.extend(append)
+    final_rules.extend(preset_match)
+
+    # 如果没有兜底，添加默认兜底
+    if not any(r.startswith("MATCH,") for r in final_rules):
+        final_rules.append("MATCH,Proxy")
+    return final_rules
+
+
+# ==========================================
+# 配置构建入口
+# ==========================================
+
+def build_config(global_config, proxies, custom_rules, custom_rule_providers, target_mode,
+                 rule_type=RULE_TYPE_LHIE1, rule_plan=None, latency_table=None, rule_files=None):
+    """
+    根据全局设置、节点、自定义规则与规则集构建完整的 Clash Meta 配置。
+    纯函数：不读取 Streamlit 状态，不修改任何入参，不写入文件。
+    开启规则编译时，生成的规则集文件 {文件名: 内容} 放入 rule_files，
+    由生成 / 发布配置的调用方通过 rule_compiler.write_rule_files() 写入 ruleset/。
+    rule_plan 为 rule_convert.load_plan() 读取的转换计划，开启规则集转换时使用。
+    latency_table 为 prober.load_table() 读取的延迟表，开启排除不可达节点时使用，
+    设置了健康检查预算时也用于挑选保留的节点。
+    OpenClash 模式下省略端口、TUN、DNS 等由插件接管的基础设置。
+    """
+    gc = global_config
+    is_desktop = target_mode != TARGET_OPENCLASH
+
+    # 节点列表浅拷贝，避免后续对 session 列表的增删影响已缓存的结果
+    proxies = list(proxies)
+    config = {}
+
+    if is_desktop:
+        general = build_general_section(gc)
+        # 兼容不同Clash版本的字段结构，这里我们混合输出，Clash Meta会自动识别一级key
+        config["global"] = dict(general)
+        # 直接展开到根节点
+        config.update(general)
+
+    config["proxies"] = proxies
+    unreachable = unreachable_names(proxies, latency_table) if gc.get("skip_unreachable", False) else None
+    config["proxy-groups"] = generate_proxy_groups(proxies, compact=gc.get("compact_groups", False),
+                                                   unreachable=unreachable, regions=gc.get("region_groups", False))
+    if gc.get("healthcheck_budget", 0):
+        config["proxy-groups"], _ = apply_budget(config["proxy-groups"], proxies, gc["healthcheck_budget"],
+                                                 max_fanout=gc.get("healthcheck_max_fanout", DEFAULT_MAX_FANOUT),
+                                                 latency_table=latency_table)
+
+    if is_desktop:
+        if gc["enable_tun"]:
+            config["tun"] = build_tun_section(gc)
+        if gc["enable_dns"]:
+            config["dns"] = build_dns_section(gc)
+        if gc["secret"]:
+            config["secret"] = gc["secret"]
+
+    # Meta Core Features
+    config["tcp-concurrent"] = gc["tcp_concurrent"]
+    config["unified-delay"] = gc["unified_delay"]
+    config["geodata-mode"] = gc["geodata_mode"]
+    config["geodata-loader"] = gc["geodata_loader"]
+    if gc["enable_sniffer"]:
+        config["sniffer"] = build_sniffer_section()
+
+    # 规则 (Rules)
+    mirror_url = gc.get("mirror_url") if gc.get("mirror_rules", False) else None
+    rule_providers, preset_rules = build_preset_rules(rule_type, mirror_url=mirror_url)
+    custom_providers, prepend, append = build_custom_providers(custom_rule_providers)
+    rule_providers.update(custom_providers)
+
+    rules = assemble_rules(custom_rules, preset_rules, prepend, append)
+    if gc.get("convert_rules", False) and rule_plan:
+        rule_providers, rules = apply_plan(rule_providers, rules, rule_plan, mirror_url=mirror_url)
+    if gc.get("drop_shadowed_rules", False):
+        rules = drop_shadowed(rules)
+    if gc.get("aggregate_cidr", False):
+        rules, _, _ = aggregate_rules(rules)
+    if gc.get("compile_rules", False):
+        # 规则集文件按内容寻址，重复写入是幂等的
+        rules, compiled_providers, files = compile_rules(rules, base_url=mirror_url)
+        if rule_files is not None:
+            rule_files.update(files)
+        rule_providers.update(compiled_providers)
+
+    if rule_providers:
+        config["rule-providers"] = rule_providers
+    config["rules"] = rules
+    return config
+
+
+# ==========================================
+# 内容哈希缓存
+# ==========================================
+_BUILD_CACHE = OrderedDict()
+_BUILD_CACHE_SIZE = 8
+
+
+def content_hash(*parts):
+    """
+    计算输入数据的内容哈希 (用作缓存键)。
+    使用 pickle 序列化，比 json(sort_keys) 快一个数量级；
+    键顺序不同的等价字典只会造成一次缓存未命中，不会产生错误结果。
+    """
+    h = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        h.update(pickle.dumps(part, protocol=pickle.HIGHEST_PROTOCOL))
+    return h.hexdigest()
+
+
+def build_config_cached(global_config, proxies, custom_rules, custom_rule_providers, target_mode,
+                        rule_type=RULE_TYPE_LHIE1, rule_plan=None, latency_table=None, rule_files=None,
+                        cache_key=None):
+    """
+    build_config 的缓存版本。输入不变时直接返回上次的结果对象，调用方不得修改返回值。
+    cache_key 为调用方提供的版本标识，须能区分 proxies、rule_plan 与 latency_table 的内容
+    (如 NodeStore.cache_key() 与转换计划、延迟表的版本号)；提供时只对设置与自定义规则等小体积输入计算哈希，
+    重新运行时不必遍历全部节点。未提供时按全部输入的内容哈希。
+    proxies 也可以是 NodeStore，只在未命中缓存时读取其节点列表。
+    """
+    if isinstance(proxies, NodeStore) and cache_key is None:
+        proxies = proxies.proxies
+    if cache_key is None:
+        key = content_hash(global_config, proxies, custom_rules, custom_rule_providers, target_mode, rule_type,
+                           rule_plan, latency_table)
+    else:
+        key = content_hash(cache_key, global_config, custom_rules, custom_rule_providers, target_mode, rule_type)
+    cached = _BUILD_CACHE.get(key)
+    if cached is not None:
+        _BUILD_CACHE.move_to_end(key)
+        config, files = cached
+    else:
+        files = {}
+        if isinstance(proxies, NodeStore):
+            proxies = proxies.proxies
+        config = build_config(global_config, proxies, custom_rules, custom_rule_providers, target_mode,
+                              rule_type=rule_type, rule_plan=rule_plan, latency_table=latency_table, rule_files=files)
+        _BUILD_CACHE[key] = (config, files)
+        while len(_BUILD_CACHE) > _BUILD_CACHE_SIZE:
+            _BUILD_CACHE.popitem(last=False)
+    if rule_files is not None:
+        rule_files.update(files)
+    return config
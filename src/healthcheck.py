@@ -0,0 +1,180 @@
+import math
+import re
+
+from prober import STATUS_OK, node_status, unreachable_names
+
+# ==========================================
+# 健康检查负载规划
+# ==========================================
+# url-test / fallback / load-balance 组每隔 interval 秒对每个成员发起一次探测，
+# 路由器的探测频率 = Σ 成员数 × 60 / interval (次/分钟)，节点多时会挤占正常流量。
+# - probe_load() 统计生成的配置会产生的探测频率：
+#     最坏情况: 全部测速组同时在用
+#     默认选择: 测速组设置了 lazy 时，只有按各 select 组的默认选项实际会走到的组才会探测
+# - apply_budget() 将探测频率控制在每台路由器的预算内：
+#     1. 显式列出成员的测速组只保留 max_fanout 个节点 (有延迟表时优先保留可达且延迟最低的节点)
+#     2. 全部测速组开启 lazy，未被使用的组不探测
+#     3. 最坏情况仍超出预算时按比例统一延长 interval (不超过 MAX_INTERVAL)
+# include-all-proxies 组的成员由内核按 filter / exclude-filter 筛选，这里用同样的正则估算成员数，无法截断。
+
+HEALTHCHECK_TYPES = ("url-test", "fallback", "load-balance")
+DEFAULT_MAX_FANOUT = 64     # 单个测速组最多显式列出的节点数
+MAX_INTERVAL = 3600         # 延长 interval 的上限 (秒)
+
+
+def _compile_filters(pattern):
+    """Clash Meta 的 filter 以反引号分隔多个正则；无法用 Python 解析的正则返回 None (视为不筛选)"""
+    if not pattern:
+        return []
+    try:
+        return [re.compile(p) for p in pattern.split("`") if p]
+    except re.error:
+        return None
+
+
+def group_members(group, proxy_names):
+    """
+    估算策略组的成员 (节点与策略组名称，去重保序)。
+    include-all-proxies 时按 filter / exclude-filter 从 proxy_names 中筛选。
+    """
+    members = list(dict.fromkeys(group.get("proxies", [])))
+    if group.get("include-all-proxies") or group.get("include-all"):
+        includes = _compile_filters(group.get("filter"))
+        excludes = _compile_filters(group.get("exclude-filter")) or []
+        seen = set(members)
+        for name in proxy_names:
+            if name in seen:
+                continue
+            if includes and not any(r.search(name) for r in includes):
+                continue
+            if any(r.search(name) for r in excludes):
+                continue
+            members.append(name)
+    return members
+
+
+def _rule_targets(rules):
+    targets = []
+    for rule in rules or []:
+        parts = [p.strip() for p in rule.split(",")]
+        if len(parts) < 2:
+            continue
+        # MATCH,目标 / 类型,值,目标[,no-resolve]
+        target = parts[1] if parts[0] == "MATCH" else (parts[2] if len(parts) > 2 else None)
+        if target:
+            targets.append(target)
+    return targets
+
+
+def _active_groups(groups, members, rules):
+    """按 select 组的默认选项 (第一个成员)，从规则目标出发实际会用到的策略组"""
+    by_name = {g["name"]: g for g in groups}
+    pending = [t for t in _rule_targets(rules) if t in by_name] or ["Proxy"]
+    active = set()
+    while pending:
+        name = pending.pop()
+        if name in active or name not in by_name:
+            continue
+        active.add(name)
+        group = by_name[name]
+        group_refs = [m for m in members[name] if m in by_name]
+        if group["type"] == "select":
+            if members[name] and members[name][0] in by_name:
+                pending.append(members[name][0])
+        else:
+            # 测速组会探测其中的每个成员，被引用的组也视为在用
+            pending.extend(group_refs)
+    return active
+
+
+def probe_load(config):
+    """
+    统计配置会产生的健康检查频率，返回
+    {"groups": [{name, type, members, interval, lazy, active, rate}], "worst": 次/分钟, "expected": 次/分钟}。
+    """
+    groups = config.get("proxy-groups") or []
+    proxy_names = [p["name"] for p in config.get("proxies") or []]
+    members = {g["name"]: group_members(g, proxy_names) for g in groups}
+    active = _active_groups(groups, members, config.get("rules"))
+
+    rows = []
+    worst = expected = 0.0
+    for group in groups:
+        if group.get("type") not in HEALTHCHECK_TYPES or not group.get("url"):
+            continue
+        interval = int(group.get("interval") or 0)
+        if interval <= 0:
+            continue
+        rate = len(members[group["name"]]) * 60 / interval
+        # 未显式设置时 Clash Meta 默认 lazy
+        lazy = group.get("lazy", True)
+        is_active = group["name"] in active
+        worst += rate
+        if is_active or not lazy:
+            expected += rate
+        rows.append({
+            "name": group["name"],
+            "type": group["type"],
+            "members": len(members[group["name"]]),
+            "interval": interval,
+            "lazy": lazy,
+            "active": is_active,
+            "rate": round(rate, 2),
+        })
+    return {"groups": rows, "worst": round(worst, 2), "expected": round(expected, 2)}
+
+
+def _rank_nodes(names, proxies_by_name, latency_table):
+    """按延迟表排序：可达的按握手耗时升序，其次未探测的，不可达的放最后；同级保持原顺序"""
+    if not latency_table:
+        return names
+    dead = unreachable_names([proxies_by_name[n] for n in names], latency_table)
+
+    def key(item):
+        index, name = item
+        entry = node_status(proxies_by_name[name], latency_table)
+        if entry and entry["status"] == STATUS_OK:
+            return 0, (entry.get("tcp_ms") or 0) + (entry.get("tls_ms") or 0), index
+        return (2 if name in dead else 1), 0, index
+
+    return [name for _, name in sorted(enumerate(names), key=key)]
+
+
+def apply_budget(groups, proxies, budget, max_fanout=DEFAULT_MAX_FANOUT, latency_table=None):
+    """
+    按每分钟 budget 次的探测预算调整策略组，返回 (新的策略组列表, 调整说明列表)。
+    不修改入参，只复制被调整的组。budget <= 0 时不做任何调整。
+    """
+    if not budget or budget <= 0:
+        return groups, []
+    proxies_by_name = {p["name"]: p for p in proxies}
+    changes = []
+    planned = []
+
+    for group in groups:
+        if group.get("type") not in HEALTHCHECK_TYPES or not group.get("url"):
+            planned.append(group)
+            continue
+        group = dict(group)
+        group["lazy"] = True
+        nodes = [m for m in group.get("proxies", []) if m in proxies_by_name]
+        if max_fanout and len(nodes) > max_fanout and not (group.get("include-all-proxies") or group.get("include-all")):
+            keep = set(_rank_nodes(nodes, proxies_by_name, latency_table)[:max_fanout])
+            group["proxies"] = [m for m in group["proxies"] if m not in proxies_by_name or m in keep]
+            changes.append(f"{group['name']}: 成员节点 {len(nodes)} -> {max_fanout}")
+        planned.append(group)
+
+    load = probe_load({"proxies": proxies, "proxy-groups": planned})
+    if load["worst"] > budget:
+        factor = load["worst"] / budget
+        for i, group in enumerate(planned):
+            if group.get("type") not in HEALTHCHECK_TYPES or not group.get("url") or not group.get("interval"):
+                continue
+            interval = min(MAX_INTERVAL, max(group["interval"], math.ceil(group["interval"] * factor)))
+            if interval != group["interval"]:
+                changes.append(f"{group['name']}: interval {group['interval']}s -> {interval}s")
+                planned[i] = dict(group, interval=interval)
+        load = probe_load({"proxies": proxies, "proxy-groups": planned})
+        if load["worst"] > budget:
+            changes.append(f"interval 已达上限 {MAX_INTERVAL}s，最坏情况仍为 {load['worst']} 次/分钟，超出预算 {budget}")
+    return planned, changes
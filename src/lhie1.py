@@ -0,0 +1,80 @@
+# ==========================================
+# lhie1 (dler-io) 规则集
+# ==========================================
+# 供配置生成 (config_builder)、离线镜像 (rule_mirror) 与规则集转换 (rule_convert) 共用。
+
+LHIE1_BASE_URL = "https://testingcf.jsdelivr.net/gh/dler-io/Rules@main/Clash/Provider"
+
+# 定义规则集与Target策略组的映射关系
+# Key: Provider Name (也是文件名的一部分)
+# Value: (Path Suffix, Target Group)
+# Path Suffix 如果为 None，则默认与 Key 相同
+LHIE1_PROVIDERS_MAP = {
+    "AdBlock": ("AdBlock", "AdBlock"),
+    "HTTPDNS": ("HTTPDNS", "HTTPDNS"),
+    "Special": ("Special", "DIRECT"),
+    "PROXY": ("Proxy", "Proxy"),
+    "Domestic": ("Domestic", "Domestic"),
+    "Domestic IPs": ("Domestic%20IPs", "Domestic"),
+    "LAN": ("LAN", "DIRECT"),
+    "Netflix": ("Media/Netflix", "Netflix"),
+    "Spotify": ("Media/Spotify", "Spotify"),
+    "YouTube": ("Media/YouTube", "Youtube"), # 注意 Group 是 Youtube
+    "Max": ("Media/Max", "HBO Max"),
+    "Bilibili": ("Media/Bilibili", "Bilibili"),
+    "IQ": ("Media/IQ", "Asian TV"),
+    "IQIYI": ("Media/IQIYI", "Asian TV"),
+    "Letv": ("Media/Letv", "Asian TV"),
+    "Netease Music": ("Media/Netease%20Music", "Asian TV"),
+    "Tencent Video": ("Media/Tencent%20Video", "Asian TV"),
+    "Youku": ("Media/Youku", "Asian TV"),
+    "WeTV": ("Media/WeTV", "Global TV"),
+    "ABC": ("Media/ABC", "Global TV"),
+    "Abema TV": ("Media/Abema%20TV", "Asian TV"),
+    "Amazon": ("Media/Amazon", "Global TV"),
+    "Apple Music": ("Media/Apple%20Music", "Apple"),
+    "Apple News": ("Media/Apple%20News", "Apple"),
+    "Apple TV": ("Media/Apple%20TV", "Apple TV"),
+    "Bahamut": ("Media/Bahamut", "Bahamut"),
+    "BBC iPlayer": ("Media/BBC%20iPlayer", "Global TV"),
+    "DAZN": ("Media/DAZN", "DAZN"),
+    "Discovery Plus": ("Media/Discovery%20Plus", "Discovery Plus"),
+    "Disney Plus": ("Media/Disney%20Plus", "Disney Plus"),
+    "DMM": ("Media/DMM", "Asian TV"),
+    "encoreTVB": ("Media/encoreTVB", "Global TV"),
+    "F1 TV": ("Media/F1%20TV", "Global TV"),
+    "Fox Now": ("Media/Fox%20Now", "Global TV"),
+    "Fox+": ("Media/Fox%2B", "Asian TV"),
+    "Hulu Japan": ("Media/Hulu%20Japan", "Asian TV"),
+    "Hulu": ("Media/Hulu", "Global TV"),
+    "Japonx": ("Media/Japonx", "Asian TV"),
+    "JOOX": ("Media/JOOX", "Asian TV"),
+    "KKBOX": ("Media/KKBOX", "Asian TV"),
+    "KKTV": ("Media/KKTV", "Asian TV"),
+    "Line TV": ("Media/Line%20TV", "Asian TV"),
+    "myTV SUPER": ("Media/myTV%20SUPER", "Asian TV"),
+    "Niconico": ("Media/Niconico", "Asian TV"),
+    "Pandora": ("Media/Pandora", "Global TV"),
+    "PBS": ("Media/PBS", "Global TV"),
+    "Pornhub": ("Media/Pornhub", "Pornhub"),
+    "Soundcloud": ("Media/Soundcloud", "Global TV"),
+    "ViuTV": ("Media/ViuTV", "Asian TV"),
+    "Telegram": ("Telegram", "Telegram"),
+    "Crypto": ("Crypto", "Crypto"),
+    "Discord": ("Discord", "Discord"),
+    "Steam": ("Steam", "Steam"),
+    "TikTok": ("TikTok", "TikTok"),
+    "Speedtest": ("Speedtest", "Speedtest"),
+    "PayPal": ("PayPal", "PayPal"),
+    "Microsoft": ("Microsoft", "Microsoft"),
+    "AI Suite": ("AI%20Suite", "AI Suite"),
+    "Apple": ("Apple", "Apple"),
+    "Google FCM": ("Google%20FCM", "Google FCM"),
+    "Scholar": ("Scholar", "Scholar"),
+    "miHoYo": (None, "miHoYo") # URL in root
+}
+
+
+def lhie1_filename(name):
+    """lhie1 规则集的本地文件名 (同时用于镜像目录与 /ruleset/ 地址)"""
+    return f"{name.replace(' ', '_')}.yaml"
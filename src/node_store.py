@@ -0,0 +1,230 @@
+import itertools
+
+# ==========================================
+# 节点存储：指纹去重 + 名称索引
+# ==========================================
+# 以节点名称为主键 (dict 保持插入顺序)，另维护一个指纹索引用于去重。
+# 插入、删除、按名称/指纹查找均为 O(1)；批量导入为 O(N)。
+# 搜索索引按字段记录 {小写取值: [节点位置]}，首次搜索时建立，节点变更时失效；
+# 同一服务器 / 类型 / 来源的节点共用一个取值，子串匹配只需扫描不同的取值。
+
+# 不同协议中充当"凭据"的字段，按优先级取第一个存在的
+CREDENTIAL_KEYS = ("uuid", "password", "private-key", "auth-str", "auth", "psk", "username")
+SEARCH_FIELDS = ("name", "type", "server", "tag")   # 可搜索的字段，查询中可用 "字段:文本" 限定
+
+_store_ids = itertools.count(1)
+
+
+def fingerprint(proxy):
+    """
+    节点的规范指纹: (type, server, port, credential)。
+    名称、备注、传输细节不同但指向同一服务端账号的节点视为重复。
+    """
+    credential = tuple(str(proxy[k]) for k in CREDENTIAL_KEYS if k in proxy)
+    return (
+        str(proxy.get("type", "")).lower(),
+        str(proxy.get("server", "")).strip().lower(),
+        str(proxy.get("port", "")),
+        credential,
+    )
+
+
+class NodeStore:
+    def __init__(self, proxies=None):
+        self._nodes = {}        # name -> proxy
+        self._by_fp = {}        # fingerprint -> name
+        self._name_seq = {}     # 基础名称 -> 下一个待尝试的序号 (用于重命名)
+        self._tags = {}         # name -> 来源标签 (如订阅地址)
+        self._list = None       # proxies 列表缓存，变更时失效
+        self._index = None      # 搜索索引，变更时失效
+        self._id = next(_store_ids)
+        self._revision = 0      # 每次变更递增
+        if proxies:
+            self.add_many(proxies)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __bool__(self):
+        return bool(self._nodes)
+
+    def __contains__(self, name):
+        return name in self._nodes
+
+    def __iter__(self):
+        return iter(self._nodes.values())
+
+    @property
+    def proxies(self):
+        """按添加顺序返回节点列表 (只读视图，调用方不得修改)"""
+        if self._list is None:
+            self._list = list(self._nodes.values())
+        return self._list
+
+    def _changed(self):
+        self._list = None
+        self._index = None
+        self._revision += 1
+
+    def cache_key(self):
+        """节点内容的版本标识 (每次变更都会改变)，用作构建缓存的键，代替对全部节点计算内容哈希"""
+        return self._id, self._revision
+
+    def names(self):
+        return list(self._nodes)
+
+    def get(self, name):
+        return self._nodes.get(name)
+
+    def tag_of(self, name):
+        return self._tags.get(name)
+
+    def find_duplicate(self, proxy):
+        """返回与该节点指纹相同的已有节点名称，不存在时返回 None"""
+        return self._by_fp.get(fingerprint(proxy))
+
+    def _unique_name(self, name):
+        if name not in self._nodes:
+            return name
+        # 从上次记录的序号继续尝试，保证批量重命名整体为 O(N)
+        seq = self._name_seq.get(name, 2)
+        while f"{name} {seq}" in self._nodes:
+            seq += 1
+        self._name_seq[name] = seq + 1
+        return f"{name} {seq}"
+
+    def add(self, proxy, tag=None):
+        """
+        添加节点。指纹重复时返回 None 并跳过；
+        名称冲突 (指纹不同) 时自动重命名为 "名称 2"、"名称 3"...，返回最终名称。
+        tag 用于记录节点来源。
+        """
+        fp = fingerprint(proxy)
+        if fp in self._by_fp:
+            return None
+        name = self._unique_name(str(proxy.get("name", "")) or f"{proxy.get('type', 'node')}-{proxy.get('server', '')}")
+        if name != proxy.get("name"):
+            proxy = dict(proxy, name=name)
+        self._nodes[name] = proxy
+        self._by_fp[fp] = name
+        if tag:
+            self._tags[name] = tag
+        self._changed()
+        return name
+
+    def add_many(self, proxies, tag=None):
+        """批量添加，返回 (新增名称列表, 重复跳过的节点列表)"""
+        added = []
+        skipped = []
+        for proxy in proxies:
+            name = self.add(proxy, tag=tag)
+            if name is None:
+                skipped.append(proxy)
+            else:
+                added.append(name)
+        return added, skipped
+
+    def remove(self, name):
+        proxy = self._nodes.pop(name, None)
+        if proxy is None:
+            return None
+        fp = fingerprint(proxy)
+        if self._by_fp.get(fp) == name:
+            del self._by_fp[fp]
+        self._tags.pop(name, None)
+        self._changed()
+        return proxy
+
+    def remove_many(self, names):
+        """批量删除，返回被删除的节点列表"""
+        removed = []
+        for name in names:
+            proxy = self.remove(name)
+            if proxy is not None:
+                removed.append(proxy)
+        return removed
+
+    def replace(self, name, proxy):
+        """
+        用新配置替换指定节点 (保持原有位置)。
+        新指纹与其他节点重复、或新名称被占用时抛出 ValueError。
+        """
+        if name not in self._nodes:
+            raise KeyError(name)
+        new_name = proxy.get("name", name)
+        if new_name != name and new_name in self._nodes:
+            raise ValueError(f"节点名称 '{new_name}' 已存在")
+        fp = fingerprint(proxy)
+        owner = self._by_fp.get(fp)
+        if owner is not None and owner != name:
+            raise ValueError(f"与已有节点 '{owner}' 重复")
+
+        old_fp = fingerprint(self._nodes[name])
+        if self._by_fp.get(old_fp) == name:
+            del self._by_fp[old_fp]
+        self._by_fp[fp] = new_name
+
+        if new_name == name:
+            self._nodes[name] = proxy
+        else:
+            if name in self._tags:
+                self._tags[new_name] = self._tags.pop(name)
+            # 改名需要重建字典以保持位置不变 (仅编辑单个节点时发生)
+            self._nodes = {
+                (new_name if k == name else k): (proxy if k == name else v)
+                for k, v in self._nodes.items()
+            }
+        self._changed()
+
+    def clear(self):
+        self._nodes.clear()
+        self._by_fp.clear()
+        self._name_seq.clear()
+        self._tags.clear()
+        self._changed()
+
+    def _search_index(self):
+        if self._index is None:
+            names = list(self._nodes)
+            fields = {field: {} for field in SEARCH_FIELDS}
+            for position, (name, proxy) in enumerate(self._nodes.items()):
+                values = (name, proxy.get("type"), proxy.get("server"), self._tags.get(name))
+                for field, value in zip(SEARCH_FIELDS, values):
+                    if value is not None and value != "":
+                        fields[field].setdefault(str(value).lower(), []).append(position)
+            self._index = (names, fields, {})
+        return self._index
+
+    def search(self, query):
+        """
+        按名称、类型、服务器与来源标签搜索，返回匹配的节点名称列表 (保持添加顺序)。
+        query 以空白分隔多个条件，须全部满足；"字段:文本" 只在该字段中匹配 (如 type:vless)，
+        其余条件在全部字段中按子串匹配，均不区分大小写。query 为空时返回全部节点。
+        """
+        terms = tuple(query.lower().split()) if query else ()
+        if not terms:
+            # 无需建立索引 (按需读取节点的子类不必解码全部节点)
+            return self.names()
+        names, fields, results = self._search_index()
+        if terms in results:
+            return results[terms]
+        matched = None
+        for term in terms:
+            field, sep, text = term.partition(":")
+            if sep and field in fields:
+                scopes = [fields[field]]
+            else:
+                scopes, text = fields.values(), term
+            hits = set()
+            for values in scopes:
+                for value, positions in values.items():
+                    if text in value:
+                        hits.update(positions)
+            matched = hits if matched is None else matched & hits
+            if not matched:
+                break
+        result = [names[i] for i in sorted(matched)]
+        # 只保留最近一次查询的结果，翻页与重新运行时直接复用
+        results.clear()
+        results[terms] = result
+        return result
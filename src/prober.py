@@ -0,0 +1,254 @@
+import asyncio
+import json
+import os
+import socket
+import ssl
+import sys
+import threading
+import time
+
+# ==========================================
+# 节点连通性与延迟探测
+# ==========================================
+# 对每个节点的 server:port 并发测量 DNS 解析、TCP 连接与 TLS 握手耗时，结果写入延迟表
+# data/latency.json，生成配置时可据此将不可达的节点排除在 "Auto - UrlTest" 之外，
+# 路由器不再把健康检查预算浪费在失效节点上。
+# - 信号量限制并发连接数，每个阶段单独设置超时，单个失效节点最多占用 timeout 秒
+# - 相同的 server:port (及 SNI) 只探测一次，相同主机名只解析一次
+# - 基于 UDP 的协议 (Hysteria / TUIC / WireGuard) 无法用 TCP 探测，标记为 skipped，不会被排除
+# - 只测量握手是否完成，不校验证书 (节点常使用自签证书、skip-cert-verify 或 Reality)
+
+DATA_DIR = os.environ.get("CLASH_GEN_DATA_DIR", "data")
+LATENCY_PATH = os.path.join(DATA_DIR, "latency.json")
+DEFAULT_CONCURRENCY = 64
+DEFAULT_TIMEOUT = 3.0
+
+STATUS_OK = "ok"
+STATUS_UNREACHABLE = "unreachable"   # 解析失败、连接被拒绝或超时
+STATUS_TLS_ERROR = "tls_error"       # TCP 可达但 TLS 握手失败
+STATUS_SKIPPED = "skipped"           # 基于 UDP 的协议，未探测
+
+UDP_TYPES = {"hysteria", "hysteria2", "tuic", "wireguard"}
+TLS_TYPES = {"trojan", "anytls"}     # 协议本身即基于 TLS，其余类型看 tls 字段
+DEAD_STATUSES = {STATUS_UNREACHABLE, STATUS_TLS_ERROR}
+
+
+def _tls_sni(proxy):
+    """节点使用 TLS 时返回握手使用的 SNI，否则返回 None"""
+    if proxy.get("type") not in TLS_TYPES and not proxy.get("tls"):
+        return None
+    return proxy.get("sni") or proxy.get("servername") or str(proxy["server"])
+
+
+def endpoint_key(proxy):
+    """延迟表的键：server:port，TLS 节点附加 SNI；UDP 协议或缺少地址时返回 None"""
+    if proxy.get("type") in UDP_TYPES or not proxy.get("server") or not proxy.get("port"):
+        return None
+    server = str(proxy["server"])
+    host = f"[{server}]" if ":" in server else server
+    sni = _tls_sni(proxy)
+    return f"{host}:{proxy['port']}" + (f"#{sni}" if sni else "")
+
+
+def _tls_context():
+    ctx = ssl.create_default_context()
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+    return ctx
+
+
+def _ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def _error_text(e):
+    if isinstance(e, asyncio.TimeoutError):
+        return "超时"
+    return str(e) or type(e).__name__
+
+
+async def _resolve(host, port, resolved):
+    """解析主机名，同一主机的并发请求共用一次解析"""
+    task = resolved.get(host)
+    if task is None:
+        loop = asyncio.get_running_loop()
+        task = resolved[host] = asyncio.ensure_future(
+            loop.getaddrinfo(host, port, type=socket.SOCK_STREAM))
+    return await task
+
+
+async def _probe_endpoint(host, port, sni, timeout, ctx, resolved):
+    entry = {"status": STATUS_UNREACHABLE, "dns_ms": None, "tcp_ms": None, "tls_ms": None, "error": None}
+    try:
+        start = time.perf_counter()
+        infos = await asyncio.wait_for(asyncio.shield(_resolve(host, port, resolved)), timeout)
+        entry["dns_ms"] = _ms(start)
+    except (OSError, asyncio.TimeoutError) as e:
+        entry["error"] = f"DNS 解析失败: {_error_text(e)}"
+        return entry
+
+    family, _, _, _, sockaddr = infos[0]
+    writer = None
+    try:
+        start = time.perf_counter()
+        _, writer = await asyncio.wait_for(asyncio.open_connection(sockaddr[0], port, family=family), timeout)
+        entry["tcp_ms"] = _ms(start)
+    except (OSError, asyncio.TimeoutError) as e:
+        entry["error"] = f"TCP 连接失败: {_error_text(e)}"
+        return entry
+
+    try:
+        if sni is not None:
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(writer.start_tls(ctx, server_hostname=sni), timeout)
+            except (OSError, ssl.SSLError, asyncio.TimeoutError) as e:
+                entry["status"] = STATUS_TLS_ERROR
+                entry["error"] = f"TLS 握手失败: {_error_text(e)}"
+                return entry
+            entry["tls_ms"] = _ms(start)
+        entry["status"] = STATUS_OK
+        return entry
+    finally:
+        writer.close()
+        try:
+            await asyncio.wait_for(writer.wait_closed(), timeout)
+        except (OSError, ssl.SSLError, asyncio.TimeoutError):
+            pass
+
+
+async def probe_endpoints(endpoints, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT):
+    """
+    并发探测 {键: (host, port, sni)}，返回 {键: 结果}。
+    同时进行的连接数不超过 concurrency，每个阶段 (解析 / 连接 / 握手) 超过 timeout 秒视为失败。
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    ctx = _tls_context()
+    resolved = {}
+
+    async def run(key, host, port, sni):
+        async with semaphore:
+            entry = await _probe_endpoint(host, port, sni, timeout, ctx, resolved)
+        entry["checked_at"] = int(time.time())
+        return key, entry
+
+    try:
+        results = await asyncio.gather(*(run(key, *target) for key, target in endpoints.items()))
+    finally:
+        for task in resolved.values():
+            task.cancel()
+    return dict(results)
+
+
+def _endpoints(proxies):
+    endpoints = {}
+    for proxy in proxies:
+        key = endpoint_key(proxy)
+        if key and key not in endpoints:
+            endpoints[key] = (str(proxy["server"]), int(proxy["port"]), _tls_sni(proxy))
+    return endpoints
+
+
+def probe_proxies(proxies, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT):
+    """
+    探测节点列表，返回延迟表 {"probed_at": 时间戳, "endpoints": {键: 结果}}。
+    结果包含 status、dns_ms、tcp_ms、tls_ms (毫秒，未测量时为 None) 与 error。
+    同步函数，可在 Streamlit 等没有事件循环的线程中直接调用。
+    """
+    endpoints = _endpoints(proxies)
+    results = asyncio.run(probe_endpoints(endpoints, concurrency, timeout)) if endpoints else {}
+    return {"probed_at": int(time.time()), "endpoints": results}
+
+
+def node_status(proxy, table):
+    """节点在延迟表中的结果；UDP 协议返回 skipped 结果，未探测过时返回 None"""
+    key = endpoint_key(proxy)
+    if key is None:
+        return {"status": STATUS_SKIPPED}
+    return (table or {}).get("endpoints", {}).get(key)
+
+
+def unreachable_names(proxies, table):
+    """延迟表中判定为不可达的节点名称集合 (未探测过的节点与 UDP 协议节点视为可达)"""
+    dead = set()
+    if not table:
+        return dead
+    for proxy in proxies:
+        entry = node_status(proxy, table)
+        if entry and entry["status"] in DEAD_STATUSES:
+            dead.add(proxy["name"])
+    return dead
+
+
+def save_table(table, path=LATENCY_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(table, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_table(path=LATENCY_PATH):
+    """读取延迟表，不存在时返回 None"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def table_version(path=LATENCY_PATH):
+    """延迟表的修改时间，用于判断预渲染的订阅是否过期；不存在时返回 None"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def summarize(proxies, table):
+    """按状态统计节点数量，返回 {状态: 数量}，未探测过的节点计入 None"""
+    counts = {}
+    for proxy in proxies:
+        entry = node_status(proxy, table)
+        status = entry["status"] if entry else None
+        counts[status] = counts.get(status, 0) + 1
+    return counts
+
+
+def main(argv=None):
+    import argparse
+
+    import yaml_io
+
+    parser = argparse.ArgumentParser(description="探测配置文件中全部节点的连通性与握手延迟")
+    parser.add_argument("config", help="包含 proxies 的 YAML 配置文件")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="每个阶段的超时 (秒)")
+    parser.add_argument("--save", action="store_true", help=f"写入 {LATENCY_PATH}")
+    args = parser.parse_args(argv)
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        proxies = (yaml_io.load(f.read()) or {}).get("proxies") or []
+
+    start = time.monotonic()
+    table = probe_proxies(proxies, concurrency=args.concurrency, timeout=args.timeout)
+    for proxy in proxies:
+        entry = node_status(proxy, table)
+        if entry["status"] == STATUS_OK:
+            tls = f" / TLS {entry['tls_ms']}ms" if entry["tls_ms"] is not None else ""
+            print(f"✅ {proxy['name']}: TCP {entry['tcp_ms']}ms{tls}")
+        elif entry["status"] == STATUS_SKIPPED:
+            print(f"➖ {proxy['name']}: {proxy['type']} 基于 UDP，未探测")
+        else:
+            print(f"❌ {proxy['name']}: {entry['error']}")
+    counts = summarize(proxies, table)
+    print(f"探测完成: {len(proxies)} 个节点，{len(table['endpoints'])} 个地址，"
+          f"可达 {counts.get(STATUS_OK, 0)}，不可达 {sum(counts.get(s, 0) for s in DEAD_STATUSES)}，"
+          f"耗时 {time.monotonic() - start:.1f}s")
+    if args.save:
+        save_table(table)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+import json
+import os
+import re
+import secrets
+import threading
+import time
+
+from workspace_store import get_default_store
+
+# ==========================================
+# 订阅配置档案 (Profile)
+# ==========================================
+# Web UI 中"保存为订阅"时，将生成配置所需的全部输入保存为 data/profiles/<token>.json，
+# API 的 /sub/<token> 据此渲染配置。token 即访问凭证，只允许 URL 安全字符，防止路径穿越。
+# token 也可以关联到工作区 (见 workspace_store.py)，此时 API 直接读取工作区数据库，
+# 在 Web UI 中的修改无需再次保存即可生效。快照文件优先于关联。
+
+DATA_DIR = os.environ.get("CLASH_GEN_DATA_DIR", "data")
+PROFILE_DIR = os.path.join(DATA_DIR, "profiles")
+
+_TOKEN_RE = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+PROFILE_KEYS = ("global_config", "proxies", "custom_rules", "custom_rule_providers", "target_mode", "rule_type")
+
+
+def new_token():
+    return secrets.token_urlsafe(16)
+
+
+def valid_token(token):
+    return bool(token) and _TOKEN_RE.match(token) is not None
+
+
+def _path(token, profile_dir=PROFILE_DIR):
+    if not valid_token(token):
+        raise ValueError(f"无效的 token: {token}")
+    return os.path.join(profile_dir, f"{token}.json")
+
+
+def save_profile(token, profile, profile_dir=PROFILE_DIR):
+    """原子写入档案 (profile 需包含 PROFILE_KEYS 中的全部字段)"""
+    missing = [k for k in PROFILE_KEYS if k not in profile]
+    if missing:
+        raise ValueError(f"档案缺少字段: {', '.join(missing)}")
+    os.makedirs(profile_dir, exist_ok=True)
+    path = _path(token, profile_dir)
+    data = dict(profile, saved_at=int(time.time()))
+    tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    get_default_store().unlink(token)
+
+
+def link_profile(token, workspace, profile_dir=PROFILE_DIR):
+    """将 token 关联到工作区 (删除同名的快照文件)"""
+    path = _path(token, profile_dir)
+    get_default_store().link(token, workspace)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _linked_profile(token):
+    from config_builder import DEFAULT_GLOBAL_CONFIG
+
+    store = get_default_store()
+    workspace = store.linked_workspace(token)
+    if workspace is None:
+        return None
+    return store.load_profile(workspace, defaults=DEFAULT_GLOBAL_CONFIG)
+
+
+def load_profile(token, profile_dir=PROFILE_DIR):
+    """读取档案 (快照文件或关联的工作区)，不存在时返回 None"""
+    try:
+        with open(_path(token, profile_dir), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except ValueError:
+        return None
+    except OSError:
+        return _linked_profile(token) if valid_token(token) else None
+
+
+def profile_version(token, profile_dir=PROFILE_DIR):
+    """
+    档案的版本标识：快照文件为 (修改时间, 大小)，只做一次 stat；
+    关联的工作区为 (工作区名称, 版本号)。不存在时返回 None
+    """
+    try:
+        st = os.stat(_path(token, profile_dir))
+    except ValueError:
+        return None
+    except OSError:
+        store = get_default_store()
+        workspace = store.linked_workspace(token)
+        version = store.version(workspace) if workspace else None
+        return None if version is None else (workspace, version)
+    return st.st_mtime_ns, st.st_size
+
+
+def delete_profile(token, profile_dir=PROFILE_DIR):
+    try:
+        path = _path(token, profile_dir)
+    except ValueError:
+        return False
+    linked = get_default_store().linked_workspace(token) is not None
+    get_default_store().unlink(token)
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return linked
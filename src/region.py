@@ -0,0 +1,201 @@
+import re
+import sys
+import time
+
+# ==========================================
+# 节点地区识别
+# ==========================================
+# 全部地区的关键词 (中文名、城市、国旗、英文名与代码) 合并为一棵前缀树，编译成单个正则，
+# 每个节点名称只扫描一次，取最靠左的关键词所属地区；结果按名称缓存，重复生成时只查字典。
+# - 匹配前统一转为小写，英文关键词不区分大小写
+# - 英文关键词需独立成词：左侧不能是字母或数字 ("100GB" 不会识别为英国)，右侧不能是字母 ("HK01" 可以识别)；
+#   左侧为 "数字 + 空白" 时视为数量单位 ("剩余流量 50 GB" 等流量信息节点不会识别为英国)
+# - 中文关键词与国旗直接按子串匹配
+# 精简模式下策略组改用 region_filter() 生成的 filter 正则由内核筛选，
+# 同时包含多个地区关键词的节点会同时出现在多个地区组中。
+
+# (代码, 策略组名称, 关键词)，顺序即策略组的输出顺序；英文关键词中的空格表示可省略的空白、"-" 或 "_"
+REGIONS = [
+    ("HK", "Hong Kong", ["香港", "港", "🇭🇰", "HK", "HKG", "Hong Kong"]),
+    ("TW", "Taiwan", ["台湾", "台灣", "臺灣", "台北", "新北", "彰化", "🇹🇼", "TW", "TWN", "Taiwan", "Taipei"]),
+    ("JP", "Japan", ["日本", "东京", "東京", "大阪", "埼玉", "🇯🇵", "JP", "JPN", "Japan", "Tokyo", "Osaka"]),
+    ("SG", "Singapore", ["新加坡", "狮城", "獅城", "🇸🇬", "SG", "SGP", "Singapore"]),
+    ("KR", "Korea", ["韩国", "韓國", "首尔", "首爾", "春川", "🇰🇷", "KR", "KOR", "Korea", "Seoul"]),
+    ("US", "United States", ["美国", "美國", "洛杉矶", "圣何塞", "硅谷", "西雅图", "芝加哥", "纽约", "达拉斯", "凤凰城",
+                             "🇺🇸", "US", "USA", "United States", "America", "Los Angeles", "San Jose", "Silicon Valley",
+                             "Seattle", "Chicago", "New York", "Dallas"]),
+    ("UK", "United Kingdom", ["英国", "英國", "伦敦", "🇬🇧", "UK", "GB", "GBR", "United Kingdom", "Britain", "London"]),
+    ("DE", "Germany", ["德国", "德國", "法兰克福", "🇩🇪", "DE", "DEU", "Germany", "Frankfurt"]),
+    ("FR", "France", ["法国", "法國", "巴黎", "🇫🇷", "FR", "FRA", "France", "Paris"]),
+    ("NL", "Netherlands", ["荷兰", "荷蘭", "阿姆斯特丹", "🇳🇱", "NL", "NLD", "Netherlands", "Amsterdam"]),
+    ("CA", "Canada", ["加拿大", "多伦多", "温哥华", "🇨🇦", "CA", "CAN", "Canada", "Toronto", "Vancouver"]),
+    ("AU", "Australia", ["澳大利亚", "澳洲", "悉尼", "🇦🇺", "AU", "AUS", "Australia", "Sydney"]),
+    ("RU", "Russia", ["俄罗斯", "俄羅斯", "莫斯科", "🇷🇺", "RU", "RUS", "Russia", "Moscow"]),
+    ("IN", "India", ["印度", "孟买", "🇮🇳", "IND", "India", "Mumbai"]),
+    ("TR", "Turkey", ["土耳其", "伊斯坦布尔", "🇹🇷", "TR", "TUR", "Turkey", "Istanbul"]),
+]
+
+REGION_NAMES = {code: name for code, name, _ in REGIONS}
+CACHE_SIZE = 200000     # 名称 -> 地区缓存的最大条目数
+
+_TOKEN_END = object()   # 前缀树中标记关键词结束
+_SEPARATOR = r"[\s_-]?"
+_SEPARATOR_RE = re.compile(_SEPARATOR)
+
+
+def _token_key(token):
+    return _SEPARATOR_RE.sub("", token.lower())
+
+
+def _trie(tokens):
+    root = {}
+    for token in tokens:
+        node = root
+        for char in token.lower():
+            node = node.setdefault(char, {})
+        node[_TOKEN_END] = True
+    return root
+
+
+def _trie_pattern(node, word):
+    """将前缀树展开为正则；同一位置的分支只按首字符分派，避免逐个尝试全部关键词"""
+    tail = "(?![a-z])" if word else ""
+    branches = []
+    for char in sorted(c for c in node if c is not _TOKEN_END):
+        step = _SEPARATOR if char == " " else re.escape(char)
+        branches.append(step + _trie_pattern(node[char], word))
+    if not branches:
+        return tail
+    if _TOKEN_END in node:
+        # 较长的关键词优先，均不匹配时在此结束
+        branches.append(tail)
+    return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+
+def _compile(regions):
+    lookup = {}
+    tokens = []
+    for code, _, keywords in regions:
+        for token in keywords:
+            # 以原样 (小写) 与去掉分隔符两种形式登记，常见写法匹配后可直接查表
+            lookup.setdefault(token.lower(), code)
+            lookup.setdefault(_token_key(token), code)
+            tokens.append(token)
+    root = _trie(tokens)
+    # 顶层每个分支都以字面字符开头，正则引擎可直接跳过不可能开始匹配的位置
+    pattern = "|".join(
+        re.escape(char) + _trie_pattern(node, char.isascii())
+        for char, node in sorted(root.items())
+    )
+    return re.compile(pattern), lookup
+
+
+_PATTERN, _LOOKUP = _compile(REGIONS)
+_cache = {}
+
+
+def _word_start(text, start):
+    """英文关键词的左边界：前一个字符不能是字母或数字，也不能是 "数字 + 空白" 中的空白"""
+    if start == 0:
+        return True
+    prev = text[start - 1]
+    if prev.isalnum():
+        return False
+    return not (prev.isspace() and start > 1 and text[start - 2].isdigit())
+
+
+def _classify(text):
+    search = _PATTERN.search
+    match = search(text)
+    while match:
+        start = match.start()
+        # 英文关键词左侧必须是词边界
+        if not text[start].isascii() or _word_start(text, start):
+            token = match.group()
+            region = _LOOKUP.get(token)
+            return region if region is not None else _LOOKUP[_token_key(token)]
+        match = search(text, start + 1)
+    return None
+
+
+def classify_name(name):
+    """返回节点名称所属地区的代码，无法识别时返回 None"""
+    return classify([name])[0]
+
+
+def classify(names):
+    """批量识别，返回与 names 等长的地区代码列表"""
+    cache = _cache
+    if len(cache) >= CACHE_SIZE:
+        cache.clear()
+    result = []
+    append = result.append
+    for name in names:
+        region = cache.get(name, False)
+        if region is False:
+            region = cache[name] = _classify(name.lower())
+        append(region)
+    return result
+
+
+def group_by_region(proxies):
+    """
+    按地区分组节点，返回 (regions, others)：
+    regions 为 [(代码, 节点列表)]，按 REGIONS 顺序排列且只包含有节点的地区；others 为无法识别的节点。
+    """
+    buckets = {code: [] for code, _, _ in REGIONS}
+    others = []
+    for proxy, region in zip(proxies, classify(p["name"] for p in proxies)):
+        if region is None:
+            others.append(proxy)
+        else:
+            buckets[region].append(proxy)
+    return [(code, buckets[code]) for code, _, _ in REGIONS if buckets[code]], others
+
+
+def region_filter(codes):
+    """
+    供 Clash Meta filter / exclude-filter 使用的正则，匹配属于 codes 中任一地区的节点名称。
+    内核的正则 (regexp2) 支持逆序环视，边界规则与 classify_name 一致。
+    """
+    words = []
+    texts = []
+    for code, _, keywords in REGIONS:
+        if code not in codes:
+            continue
+        for token in keywords:
+            if token.isascii():
+                words.append(_SEPARATOR.join(re.escape(part) for part in token.lower().split()))
+            else:
+                texts.append(re.escape(token))
+    branches = texts + ([r"(?<![a-z0-9])(?<!\d\s)(?:" + "|".join(words) + r")(?![a-z])"] if words else [])
+    return "(?i)(?:" + "|".join(branches) + ")"
+
+
+def clear_cache():
+    _cache.clear()
+
+
+def main(argv=None):
+    import argparse
+
+    import yaml_io
+
+    parser = argparse.ArgumentParser(description="按名称识别配置文件中节点的地区")
+    parser.add_argument("config", help="包含 proxies 的 YAML 配置文件")
+    args = parser.parse_args(argv)
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        proxies = (yaml_io.load(f.read()) or {}).get("proxies") or []
+    start = time.perf_counter()
+    regions, others = group_by_region(proxies)
+    elapsed = time.perf_counter() - start
+    for code, members in regions:
+        print(f"{REGION_NAMES[code]:<16}{len(members):>8}")
+    print(f"{'(未识别)':<16}{len(others):>8}")
+    print(f"识别 {len(proxies)} 个节点，耗时 {elapsed * 1000:.1f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
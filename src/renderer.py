@@ -0,0 +1,111 @@
+import threading
+from collections import OrderedDict
+
+import yaml_io
+from config_builder import TARGET_DESKTOP, TARGET_OPENCLASH, build_config, content_hash
+from prober import load_table
+from rule_compiler import write_rule_files
+from rule_convert import load_plan
+
+# ==========================================
+# 配置渲染
+# ==========================================
+# Web UI 的下载与 API 的 /sub/<token> (经 artifacts 预渲染) 共用同一渲染函数，保证输出逐字节一致。
+#
+# 分段缓存：顶层各段 (proxies、proxy-groups、rules、dns ...) 分别序列化，按 (键, 内容) 哈希缓存，
+# 最终文本由各段拼接而成 (块风格下与整体序列化逐字节一致)。
+# 桌面版 / OpenClash 等变体之间只有端口、TUN、DNS 等小段不同，
+# 已渲染过的档案再生成其他变体时不会重新序列化节点列表。
+# proxies / proxy-groups 进一步按单个节点 / 策略组缓存片段，编辑或新增一个节点只需序列化这一个节点。
+# (同一对象在多个节点间共享时，整体序列化会输出锚点 &id001，片段拼接则各自展开，两者解析结果相同)
+
+CONFIG_HEADER = "# Generator: Clash-Config-Gen\n"
+SEGMENT_CACHE_CHARS = 64 * 1024 * 1024     # 分段缓存容量 (按字符数计)
+FRAGMENT_KEYS = ("proxies", "proxy-groups")  # 按列表元素分片缓存的段
+
+# 变体名称 -> 生成模式 (API 通过 ?target= 或 User-Agent 选择)
+VARIANTS = {
+    "desktop": TARGET_DESKTOP,
+    "openclash": TARGET_OPENCLASH,
+}
+
+_segments = OrderedDict()   # 内容哈希 -> 已序列化的段 / 片段
+_segment_chars = 0
+_segment_lock = threading.Lock()
+
+
+def _cached_dump(digest, data):
+    global _segment_chars
+    with _segment_lock:
+        text = _segments.get(digest)
+        if text is not None:
+            _segments.move_to_end(digest)
+            return text
+    text = yaml_io.dump(data)
+    with _segment_lock:
+        if digest not in _segments:
+            _segments[digest] = text
+            _segment_chars += len(text)
+            # 至少保留最新的一段，即使它本身超过上限
+            while _segment_chars > SEGMENT_CACHE_CHARS and len(_segments) > 1:
+                _, old = _segments.popitem(last=False)
+                _segment_chars -= len(old)
+    return text
+
+
+def _render_segment(key, value):
+    if key in FRAGMENT_KEYS and value and all(isinstance(item, dict) for item in value):
+        # 块风格下映射中的列表不缩进，"键:\n" 加上各元素单独序列化的 "- ..." 片段即为完整的段
+        return f"{key}:\n" + "".join(_cached_dump(content_hash(item), [item]) for item in value)
+    return _cached_dump(content_hash(key, value), {key: value})
+
+
+def clear_cache():
+    global _segment_chars
+    with _segment_lock:
+        _segments.clear()
+        _segment_chars = 0
+
+
+def render_config(config):
+    """将配置字典渲染为最终的 YAML 文本"""
+    return CONFIG_HEADER + "".join(_render_segment(key, value) for key, value in config.items())
+
+
+def profile_inputs(global_config):
+    """档案渲染时依赖的外部数据：(是否使用转换计划, 是否使用延迟表)"""
+    return global_config.get("convert_rules", False), global_config.get("skip_unreachable", False)
+
+
+def build_profile_config(profile, variant=None):
+    """
+    根据保存的档案构建配置字典；variant 为 VARIANTS 中的名称，为空时使用档案保存的生成模式。
+    开启规则编译时同时写入配置引用的规则集文件。
+    """
+    gc = profile["global_config"]
+    uses_plan, uses_table = profile_inputs(gc)
+    rule_files = {}
+    config = build_config(
+        gc,
+        profile["proxies"],
+        profile["custom_rules"],
+        profile["custom_rule_providers"],
+        VARIANTS[variant] if variant else profile["target_mode"],
+        rule_type=profile["rule_type"],
+        rule_plan=load_plan() if uses_plan else None,
+        latency_table=load_table() if uses_table else None,
+        rule_files=rule_files,
+    )
+    write_rule_files(rule_files)
+    return config
+
+
+def render_profile(profile, variant=None):
+    return render_config(build_profile_config(profile, variant)).encode("utf-8")
+
+
+def variant_from_user_agent(user_agent):
+    """根据 User-Agent 推断变体：OpenClash 返回 openclash，其他客户端使用档案默认设置 (None)"""
+    if user_agent and "openclash" in user_agent.lower():
+        return "openclash"
+    return None
@@ -0,0 +1,163 @@
+from cidr import parse_cidr
+from validator import LOGIC_RULE_TYPES, parse_rule
+
+# ==========================================
+# 被遮蔽规则分析
+# ==========================================
+# 规则自上而下匹配，前面的规则已经覆盖了后面规则能匹配的全部流量时，后者永远不会生效。
+# 只需顺序扫描一次，每条规则只查询已建立的索引，整体为 O(规则数)：
+#   DOMAIN / DOMAIN-SUFFIX  - 按标签倒序的域名字典树 (com -> google -> www)，
+#                             沿路径遇到 DOMAIN-SUFFIX 标记即被覆盖
+#   IP-CIDR / IP-CIDR6      - 按前缀长度分组的网段表，逐个已出现的前缀长度查询覆盖网段
+#   其他类型                - (类型, 内容) 完全相同视为重复
+#   MATCH                   - 之后的所有规则
+# DOMAIN-KEYWORD / DOMAIN-REGEX / 逻辑规则 / 规则集的内容无法静态比较，仅检测完全重复。
+#
+# no-resolve 语义：不带 no-resolve 的 IP 类规则会对域名请求发起 DNS 解析，之后的规则都能拿到 IP。
+# 因此带 no-resolve 的网段只能覆盖同样带 no-resolve、且两者之间没有发生解析的后续规则。
+
+DOMAIN_TYPES = frozenset(("DOMAIN", "DOMAIN-SUFFIX"))
+CIDR_TYPES = frozenset(("IP-CIDR", "IP-CIDR6"))
+# 不带 no-resolve 时会触发 DNS 解析的规则类型 (规则集与逻辑规则内容未知，保守地视为会解析)
+RESOLVING_TYPES = frozenset(("IP-CIDR", "IP-CIDR6", "IP-SUFFIX", "IP-ASN", "GEOIP", "RULE-SET")) | LOGIC_RULE_TYPES
+
+_SUFFIX_MARK = ""   # 字典树节点中记录 DOMAIN-SUFFIX 规则序号的键 (域名标签不会为空)
+
+
+def _rule_options(rule, rule_type):
+    """返回目标策略之后的附加参数 (如 no-resolve)"""
+    if rule_type in LOGIC_RULE_TYPES or rule_type == "SUB-RULE":
+        tail = rule[rule.rfind(")") + 1:]
+        return {p.strip() for p in tail.split(",")[2:]}
+    return {p.strip() for p in rule.split(",")[3:]}
+
+
+class _Entry:
+    """索引中的一条已生效规则"""
+    __slots__ = ("index", "no_resolve", "epoch")
+
+    def __init__(self, index, no_resolve, epoch):
+        self.index = index
+        self.no_resolve = no_resolve
+        self.epoch = epoch
+
+    def covers(self, no_resolve, epoch):
+        """该规则能否覆盖一条 (no_resolve, 当前解析代数) 的后续规则"""
+        return not self.no_resolve or (no_resolve and self.epoch == epoch)
+
+    def stronger_than(self, other):
+        return (other.no_resolve and not self.no_resolve) or \
+            (self.no_resolve == other.no_resolve and self.epoch > other.epoch)
+
+
+class _CidrTable:
+    """按前缀长度分组的网段表: {前缀长度: {网络号: _Entry}}"""
+
+    def __init__(self):
+        self.by_len = {}
+        self.lengths = []   # 已出现的前缀长度 (升序)
+
+    def find_cover(self, bits, net, plen, no_resolve, epoch):
+        for length in self.lengths:
+            if length > plen:
+                break
+            entry = self.by_len[length].get(net >> (plen - length))
+            if entry is not None and entry.covers(no_resolve, epoch):
+                return entry
+        return None
+
+    def add(self, net, plen, entry):
+        table = self.by_len.get(plen)
+        if table is None:
+            table = self.by_len[plen] = {}
+            self.lengths = sorted(self.by_len)
+        old = table.get(net)
+        if old is None or entry.stronger_than(old):
+            table[net] = entry
+
+
+def analyze_rules(rules):
+    """
+    找出被前面规则完全遮蔽的规则。
+    返回 [(规则序号, 遮蔽它的规则序号)]，按规则顺序排列；格式错误的规则会被跳过。
+    """
+    shadowed = []
+    domain_trie = {}
+    exact_domains = {}
+    cidr_tables = {32: _CidrTable(), 128: _CidrTable()}
+    seen = {}           # (类型, 内容) -> _Entry
+    epoch = 0           # 每出现一条可能触发 DNS 解析的规则加 1
+    match_index = None
+
+    for index, rule in enumerate(rules):
+        if match_index is not None:
+            shadowed.append((index, match_index))
+            continue
+        try:
+            rule_type, payload, _ = parse_rule(rule)
+        except ValueError:
+            continue
+        if rule_type == "MATCH":
+            match_index = index
+            continue
+
+        no_resolve = "no-resolve" in _rule_options(rule, rule_type)
+        cover = None
+
+        if rule_type in DOMAIN_TYPES:
+            domain = payload.strip().strip(".").lower()
+            labels = domain.split(".")[::-1]
+            node = domain_trie
+            for label in labels:
+                node = node.get(label)
+                if node is None:
+                    break
+                if _SUFFIX_MARK in node:
+                    cover = node[_SUFFIX_MARK]
+                    break
+            if cover is None and rule_type == "DOMAIN":
+                cover = exact_domains.get(domain)
+            if cover is None:
+                if rule_type == "DOMAIN":
+                    exact_domains[domain] = index
+                else:
+                    node = domain_trie
+                    for label in labels:
+                        node = node.setdefault(label, {})
+                    node[_SUFFIX_MARK] = index
+            else:
+                shadowed.append((index, cover))
+            continue
+
+        if rule_type in CIDR_TYPES:
+            try:
+                bits, network, plen = parse_cidr(payload)
+            except ValueError:
+                continue
+            net = network >> (bits - plen)
+            table = cidr_tables[bits]
+            entry = table.find_cover(bits, net, plen, no_resolve, epoch)
+            if entry is not None:
+                shadowed.append((index, entry.index))
+            else:
+                table.add(net, plen, _Entry(index, no_resolve, epoch))
+        else:
+            key = (rule_type, payload.strip())
+            entry = seen.get(key)
+            if entry is not None and entry.covers(no_resolve, epoch):
+                shadowed.append((index, entry.index))
+            elif entry is None or _Entry(index, no_resolve, epoch).stronger_than(entry):
+                seen[key] = _Entry(index, no_resolve, epoch)
+
+        if rule_type in RESOLVING_TYPES and not no_resolve:
+            epoch += 1
+
+    return shadowed
+
+
+def drop_shadowed(rules, shadowed=None):
+    """返回去掉被遮蔽规则后的新列表"""
+    if shadowed is None:
+        shadowed = analyze_rules(rules)
+    dead = {index for index, _ in shadowed}
+    return [rule for index, rule in enumerate(rules) if index not in dead]
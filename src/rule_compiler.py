@@ -0,0 +1,114 @@
+import hashlib
+import os
+import threading
+
+import yaml_io
+from validator import parse_rule
+
+# ==========================================
+# 规则编译：连续的单条规则 -> 规则集文件
+# ==========================================
+# 内核逐条匹配单条规则；而 domain / ipcidr 类型的规则集在内核中是字典树 / 集合查找。
+# 将目标策略相同的连续 DOMAIN / DOMAIN-SUFFIX / IP-CIDR 规则合并为一个规则集文件，
+# 原位置替换为一条 RULE-SET 规则。只合并相邻规则，因此匹配顺序与结果不变。
+# 文件名取内容哈希 (custom-<hash>.yaml)，内容不变时不会重复写入。
+# 提供 base_url (本服务的 API 地址) 时规则集为 http 类型，由 API 的 /ruleset/<文件名> 提供，
+# 通过 /sub/<token> 下发的配置在路由器上同样可用；否则为 file 类型，须自行将 ruleset/ 复制到客户端。
+
+RULESET_DIR = "ruleset"
+MIN_GROUP_SIZE = 8      # 少于该数量的连续规则保持原样
+
+# 规则类型 -> (规则集 behavior, 载荷格式)
+COMPILABLE_TYPES = {
+    "DOMAIN": ("domain", "{}"),
+    "DOMAIN-SUFFIX": ("domain", "+.{}"),
+    "IP-CIDR": ("ipcidr", "{}"),
+    "IP-CIDR6": ("ipcidr", "{}"),
+}
+
+
+def _group_key(rule):
+    """返回 (目标策略, behavior, no-resolve, 载荷)，不可合并的规则返回 None"""
+    try:
+        rule_type, payload, target = parse_rule(rule)
+    except ValueError:
+        return None
+    spec = COMPILABLE_TYPES.get(rule_type)
+    if spec is None or not payload:
+        return None
+    behavior, fmt = spec
+    options = {p.strip() for p in rule.split(",")[3:]}
+    if options - {"no-resolve"}:
+        return None
+    # no-resolve 只对 ipcidr 规则集有意义
+    no_resolve = behavior == "ipcidr" and "no-resolve" in options
+    return target, behavior, no_resolve, fmt.format(payload.strip().lower() if behavior == "domain" else payload.strip())
+
+
+def _render_provider_file(payloads):
+    return yaml_io.dump({"payload": payloads})
+
+
+def compile_rules(rules, min_size=MIN_GROUP_SIZE, ruleset_dir=RULESET_DIR, base_url=None):
+    """
+    编译规则列表。
+    返回 (新规则列表, rule-providers 字典, 待写入文件 {文件名: 内容})。
+    """
+    compiled = []
+    providers = {}
+    files = {}
+    run_key = None
+    run_rules = []
+    run_payloads = []
+
+    def flush():
+        if len(run_rules) < min_size:
+            compiled.extend(run_rules)
+            return
+        target, behavior, no_resolve = run_key
+        # 去重且保持顺序
+        payloads = list(dict.fromkeys(run_payloads))
+        content = _render_provider_file(payloads)
+        name = "custom-" + hashlib.sha256(f"{behavior}\n{content}".encode("utf-8")).hexdigest()[:12]
+        filename = f"{name}.yaml"
+        files[filename] = content
+        provider = {
+            "type": "http" if base_url else "file",
+            "behavior": behavior,
+            "format": "yaml",
+            "path": f"./{ruleset_dir}/{filename}",
+        }
+        if base_url:
+            provider["url"] = f"{base_url.rstrip('/')}/ruleset/{filename}"
+        providers[name] = provider
+        compiled.append(f"RULE-SET,{name},{target}" + (",no-resolve" if no_resolve else ""))
+
+    for rule in rules:
+        key = _group_key(rule)
+        if key is not None and run_key == key[:3]:
+            run_rules.append(rule)
+            run_payloads.append(key[3])
+            continue
+        if run_rules:
+            flush()
+        if key is None:
+            compiled.append(rule)
+            run_key, run_rules, run_payloads = None, [], []
+        else:
+            run_key, run_rules, run_payloads = key[:3], [rule], [key[3]]
+    if run_rules:
+        flush()
+    return compiled, providers, files
+
+
+def write_rule_files(files, ruleset_dir=RULESET_DIR):
+    """写入编译生成的规则集文件 (已存在的同名文件内容必然相同，直接跳过)"""
+    os.makedirs(ruleset_dir, exist_ok=True)
+    for filename, content in files.items():
+        path = os.path.join(ruleset_dir, filename)
+        if os.path.exists(path):
+            continue
+        tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
@@ -0,0 +1,318 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+import yaml_io
+from cidr import aggregate
+from lhie1 import LHIE1_PROVIDERS_MAP, lhie1_filename
+from rule_mirror import MIRROR_DIR, read_manifest
+
+# ==========================================
+# classical 规则集拆分转换
+# ==========================================
+# classical 规则集在内核中逐条匹配；而 domain 规则集是域名字典树、ipcidr 规则集是网段集合，
+# 查找开销与条目数基本无关，内存占用也远小于 classical。
+# 将 classical 规则集的内容拆分为：
+#   DOMAIN / DOMAIN-SUFFIX          -> domain 规则集 (x.com / +.x.com)
+#   IP-CIDR / IP-CIDR6              -> ipcidr 规则集 (聚合为最少网段)
+#   其他 (DOMAIN-KEYWORD、PROCESS-NAME 等) -> 剩余的 classical 规则集
+# 同一规则集内的条目指向同一目标，拆分后依次引用三个规则集，匹配结果不变。
+# 找到 mihomo 可执行文件时 domain / ipcidr 规则集输出为二进制 mrs 格式，否则使用 text 格式。
+#
+# 转换结果记录在 ruleset/converted/manifest.json ("转换计划")：
+#   {源文件: {"source_sha256": ..., "parts": [{"behavior", "format", "file", "no_resolve", "count"}]}}
+# 源文件为相对 ruleset/ 的路径 (镜像的 lhie1 规则集为 mirror/<文件名>)，源内容不变时不会重复转换。
+
+RULESET_DIR = "ruleset"
+CONVERT_DIR = os.path.join(RULESET_DIR, "converted")
+MANIFEST_NAME = "manifest.json"
+MIHOMO_BIN = os.environ.get("MIHOMO_BIN", "mihomo")
+CONVERT_TIMEOUT = 120
+
+DOMAIN_PREFIXES = {"DOMAIN": "{}", "DOMAIN-SUFFIX": "+.{}"}
+CIDR_TYPES = ("IP-CIDR", "IP-CIDR6")
+
+_FORMAT_EXT = {"mrs": "mrs", "text": "txt"}
+
+
+def read_entries(data, fmt="yaml"):
+    """读取规则集文件内容 (bytes)，返回条目列表"""
+    text = data.decode("utf-8-sig")
+    if fmt == "yaml" or "payload:" in text:
+        return [e.strip() for e in yaml_io.load_payload(text) if e.strip()]
+    return [l.strip() for l in text.splitlines() if l.strip() and not l.strip().startswith("#")]
+
+
+def split_classical(entries):
+    """
+    拆分 classical 条目，返回 (domain 条目, ipcidr 条目, ipcidr 是否 no-resolve, 剩余 classical 条目)。
+    no-resolve 与第一条网段不一致的网段保留在 classical 中，以保证 DNS 解析行为不变。
+    """
+    domains = []
+    cidrs = []
+    no_resolve = None
+    classical = []
+    for entry in entries:
+        parts = [p.strip() for p in entry.split(",")]
+        rule_type = parts[0].upper()
+        if rule_type in DOMAIN_PREFIXES and len(parts) == 2 and parts[1]:
+            domains.append(DOMAIN_PREFIXES[rule_type].format(parts[1].lower().strip(".")))
+            continue
+        if rule_type in CIDR_TYPES and 2 <= len(parts) <= 3 and parts[1]:
+            options = parts[2:]
+            if options in ([], ["no-resolve"]):
+                entry_no_resolve = bool(options)
+                if no_resolve is None:
+                    no_resolve = entry_no_resolve
+                if entry_no_resolve == no_resolve:
+                    cidrs.append(parts[1])
+                    continue
+        classical.append(entry)
+
+    domains = list(dict.fromkeys(domains))
+    if cidrs:
+        merged, invalid = aggregate(cidrs)
+        cidrs = merged
+        # 无法解析的网段原样保留，由内核处理
+        classical.extend(f"IP-CIDR,{v}" + (",no-resolve" if no_resolve else "") for v in invalid)
+    return domains, cidrs, bool(no_resolve), classical
+
+
+def find_mihomo():
+    return shutil.which(MIHOMO_BIN)
+
+
+def _to_mrs(mihomo, behavior, text):
+    """调用 mihomo convert-ruleset 生成 mrs 内容，失败时返回 None"""
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "src.txt")
+        dst = os.path.join(tmp, "dst.mrs")
+        with open(src, "w", encoding="utf-8") as f:
+            f.write(text)
+        try:
+            subprocess.run([mihomo, "convert-ruleset", behavior, "text", src, dst], check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=CONVERT_TIMEOUT)
+            with open(dst, "rb") as f:
+                return f.read()
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+
+def _write_part(out_dir, behavior, fmt, content):
+    """按内容寻址写入，返回文件名"""
+    name = hashlib.sha256(behavior.encode("utf-8") + b"\n" + content).hexdigest()[:16]
+    filename = f"{name}.{_FORMAT_EXT[fmt]}"
+    path = os.path.join(out_dir, filename)
+    if not os.path.exists(path):
+        tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    return filename
+
+
+def convert_content(data, fmt="yaml", out_dir=CONVERT_DIR, mihomo=None):
+    """转换一个 classical 规则集文件的内容，返回 parts 列表 (顺序: domain, classical, ipcidr)"""
+    os.makedirs(out_dir, exist_ok=True)
+    domains, cidrs, no_resolve, classical = split_classical(read_entries(data, fmt))
+    parts = []
+    # ipcidr 放在最后：不带 no-resolve 时会触发 DNS 解析，先让域名条目命中可以省去这次解析
+    for behavior, entries in (("domain", domains), ("classical", classical), ("ipcidr", cidrs)):
+        if not entries:
+            continue
+        text = "\n".join(entries) + "\n"
+        content = None
+        fmt_out = "text"
+        if mihomo and behavior != "classical":
+            content = _to_mrs(mihomo, behavior, text)
+            if content is not None:
+                fmt_out = "mrs"
+        if content is None:
+            content = text.encode("utf-8")
+        parts.append({
+            "behavior": behavior,
+            "format": fmt_out,
+            "file": _write_part(out_dir, behavior, fmt_out, content),
+            "no_resolve": behavior == "ipcidr" and no_resolve,
+            "count": len(entries),
+        })
+    return parts
+
+
+def load_plan(out_dir=CONVERT_DIR):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def plan_version(out_dir=CONVERT_DIR):
+    """转换计划的版本标识 (清单修改时间)，没有转换计划时返回 None"""
+    try:
+        return os.stat(os.path.join(out_dir, MANIFEST_NAME)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _write_plan(out_dir, plan):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(plan, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def convert_sources(sources, out_dir=CONVERT_DIR, use_mrs=True):
+    """
+    转换多个源文件并更新转换计划。
+    sources: [(源文件 (相对 ruleset/ 的路径), 格式 yaml/text)]。
+    返回 (转换计划, results 列表 (source, status: converted / unchanged / error, error))。
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    plan = load_plan(out_dir)
+    mihomo = find_mihomo() if use_mrs else None
+    results = []
+    for source, fmt in sources:
+        try:
+            with open(os.path.join(RULESET_DIR, source), "rb") as f:
+                data = f.read()
+        except OSError as e:
+            results.append({"source": source, "status": "error", "error": str(e)})
+            continue
+        digest = hashlib.sha256(data).hexdigest()
+        entry = plan.get(source)
+        if entry and entry["source_sha256"] == digest and (not mihomo or entry.get("mrs")) and \
+                all(os.path.exists(os.path.join(out_dir, p["file"])) for p in entry["parts"]):
+            results.append({"source": source, "status": "unchanged", "error": None})
+            continue
+        try:
+            parts = convert_content(data, fmt, out_dir, mihomo)
+        except (ValueError, UnicodeDecodeError, yaml_io.YAMLError) as e:
+            results.append({"source": source, "status": "error", "error": str(e)})
+            continue
+        plan[source] = {"source_sha256": digest, "mrs": bool(mihomo), "parts": parts}
+        results.append({"source": source, "status": "converted", "error": None})
+    _write_plan(out_dir, plan)
+    return plan, results
+
+
+def mirror_sources(mirror_dir=MIRROR_DIR):
+    """已镜像的 lhie1 规则集 (均为 classical)"""
+    manifest = read_manifest(mirror_dir)
+    rel_dir = os.path.relpath(mirror_dir, RULESET_DIR)
+    return [(f"{rel_dir}/{manifest[name]['file']}", "yaml") for name in LHIE1_PROVIDERS_MAP if name in manifest]
+
+
+def custom_sources(custom_rule_providers):
+    """用户上传的 classical 规则集文件"""
+    sources = []
+    for config in custom_rule_providers.values():
+        path = config.get("path", "")
+        if config.get("type") == "file" and config.get("behavior") == "classical" and path.startswith("./ruleset/"):
+            sources.append((path[len("./ruleset/"):], config.get("format") or "yaml"))
+    return sources
+
+
+def _provider_source(name, provider, mirror_url):
+    """返回规则集对应的转换源文件，无法转换时返回 None"""
+    if provider.get("behavior") != "classical":
+        return None
+    if provider.get("type") == "file":
+        path = provider.get("path", "")
+        return path[len("./ruleset/"):] if path.startswith("./ruleset/") else None
+    # http 规则集只有镜像的 lhie1 规则集可以转换，转换结果同样由镜像服务提供
+    if mirror_url and name in LHIE1_PROVIDERS_MAP and provider.get("url", "").startswith(mirror_url.rstrip("/")):
+        return f"{os.path.relpath(MIRROR_DIR, RULESET_DIR)}/{lhie1_filename(name)}"
+    return None
+
+
+def apply_plan(rule_providers, rules, plan, mirror_url=None):
+    """
+    按转换计划替换 rule-providers 与对应的 RULE-SET 规则，返回 (rule-providers, rules)。
+    拆分出的规则集命名为 <原名>-domain / <原名>-ipcidr / <原名>-classical。
+    被逻辑规则引用的规则集保持原样。
+    """
+    referenced_in_logic = set()
+    for rule in rules:
+        if rule.lstrip().upper().startswith(("AND,", "OR,", "NOT,")):
+            referenced_in_logic.update(p.strip() for p in rule.replace("(", ",").replace(")", ",").split(","))
+
+    replaced = {}
+    providers = {}
+    for name, provider in rule_providers.items():
+        source = None if name in referenced_in_logic else _provider_source(name, provider, mirror_url)
+        entry = plan.get(source) if source else None
+        if not entry or not entry["parts"]:
+            providers[name] = provider
+            continue
+        part_names = []
+        for part in entry["parts"]:
+            part_name = f"{name}-{part['behavior']}"
+            new_provider = {
+                "type": provider["type"],
+                "behavior": part["behavior"],
+                "format": part["format"],
+                "path": f"./{CONVERT_DIR}/{part['file']}",
+            }
+            if provider["type"] == "http":
+                new_provider["url"] = f"{mirror_url.rstrip('/')}/ruleset/converted/{part['file']}"
+            if "interval" in provider:
+                new_provider["interval"] = provider["interval"]
+            providers[part_name] = new_provider
+            part_names.append((part_name, part["no_resolve"]))
+        replaced[name] = part_names
+
+    if not replaced:
+        return rule_providers, rules
+
+    new_rules = []
+    for rule in rules:
+        parts = rule.split(",")
+        if len(parts) >= 3 and parts[0].strip().upper() == "RULE-SET" and parts[1].strip() in replaced:
+            target = parts[2].strip()
+            options = [p.strip() for p in parts[3:] if p.strip()]
+            rule_no_resolve = "no-resolve" in options
+            options = [o for o in options if o != "no-resolve"]
+            for part_name, no_resolve in replaced[parts[1].strip()]:
+                new_rules.append(",".join(["RULE-SET", part_name, target] + options +
+                                          (["no-resolve"] if no_resolve or rule_no_resolve else [])))
+        else:
+            new_rules.append(rule)
+    return providers, new_rules
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="将镜像 / 上传的 classical 规则集拆分为 domain / ipcidr / classical")
+    parser.add_argument("files", nargs="*", help="额外转换的规则集文件 (相对 ruleset/ 的路径)")
+    parser.add_argument("--no-mrs", action="store_true", help="不调用 mihomo 生成 mrs，统一输出 text 格式")
+    args = parser.parse_args(argv)
+
+    sources = mirror_sources() + [(f, "text" if f.endswith((".txt", ".list")) else "yaml") for f in args.files]
+    plan, results = convert_sources(sources, use_mrs=not args.no_mrs)
+    failed = 0
+    for r in results:
+        if r["status"] == "error":
+            failed += 1
+            print(f"❌ {r['source']}: {r['error']}")
+    counts = {"domain": 0, "ipcidr": 0, "classical": 0}
+    for source, _ in sources:
+        for part in plan.get(source, {}).get("parts", []):
+            counts[part["behavior"]] += part["count"]
+    total = sum(counts.values())
+    print(f"转换完成: {len(sources)} 个规则集，失败 {failed}；"
+          f"domain {counts['domain']} / ipcidr {counts['ipcidr']} / classical {counts['classical']} 条"
+          + (f" (仍需逐条匹配 {counts['classical'] / total:.1%})" if total else ""))
+    print("mihomo: " + (find_mihomo() or "未找到，使用 text 格式") if not args.no_mrs else "mihomo: 已禁用 mrs")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from lhie1 import LHIE1_BASE_URL, LHIE1_PROVIDERS_MAP, lhie1_filename
+from subscription import SubscriptionError, create_session, fetch_subscription
+
+# ==========================================
+# lhie1 规则集离线镜像
+# ==========================================
+# 并发下载 LHIE1_PROVIDERS_MAP 中的全部规则集到 ruleset/mirror/，由 api.py 的 /ruleset/<文件名> 提供，
+# 路由器启动时从本地服务拉取，不再依赖 CDN。
+# manifest.json 记录每个文件的来源、sha256、大小与 ETag；再次同步时对哈希校验通过的文件发起条件请求，
+# 未变化 (304) 则跳过，本地文件损坏或丢失时重新完整下载。
+# 下载内容先写临时文件，确认是规则集格式后再原子替换，上游返回错误页面时保留旧文件。
+
+MIRROR_DIR = os.path.join("ruleset", "mirror")
+MANIFEST_NAME = "manifest.json"
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_TIMEOUT = 30
+MAX_RULESET_BYTES = 32 * 1024 * 1024
+
+
+def upstream_url(name, base_url=LHIE1_BASE_URL):
+    suffix, _ = LHIE1_PROVIDERS_MAP[name]
+    return f"{base_url}/{suffix if suffix else name}.yaml"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_manifest(mirror_dir=MIRROR_DIR):
+    try:
+        with open(os.path.join(mirror_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_manifest(mirror_dir, manifest):
+    path = os.path.join(mirror_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _looks_like_ruleset(f):
+    """首个非注释行应为 payload:，用于拦截 CDN 返回的 HTML 错误页等内容"""
+    f.seek(0)
+    for line in f:
+        line = line.strip()
+        if not line or line.startswith(b"#"):
+            continue
+        return line.startswith(b"payload:")
+    return False
+
+
+def verify_entry(mirror_dir, entry):
+    """本地文件存在且哈希与清单一致"""
+    path = os.path.join(mirror_dir, entry["file"])
+    try:
+        return os.path.getsize(path) == entry["size"] and file_sha256(path) == entry["sha256"]
+    except (OSError, KeyError):
+        return False
+
+
+def _mirror_one(session, name, url, mirror_dir, entry, timeout):
+    """同步单个规则集，返回 (新清单条目, 状态, 错误信息)"""
+    filename = lhie1_filename(name)
+    path = os.path.join(mirror_dir, filename)
+    headers = {}
+    # 只有本地文件完好时才能使用条件请求
+    if entry and entry.get("url") == url and verify_entry(mirror_dir, entry):
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    else:
+        entry = None
+
+    fd, tmp_path = tempfile.mkstemp(dir=mirror_dir, prefix=f".{filename}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w+b") as f:
+            size, sha256, resp_headers = fetch_subscription(session, url, f, timeout=timeout,
+                                                            max_bytes=MAX_RULESET_BYTES, headers=headers)
+            if size is None:
+                entry = dict(entry, checked_at=int(time.time()))
+                return entry, "unchanged", None
+            if not _looks_like_ruleset(f):
+                return entry, "error", "内容不是有效的规则集 (缺少 payload)"
+        os.replace(tmp_path, path)
+        new_entry = {
+            "file": filename,
+            "url": url,
+            "sha256": sha256,
+            "size": size,
+            "etag": resp_headers.get("ETag"),
+            "last_modified": resp_headers.get("Last-Modified"),
+            "fetched_at": int(time.time()),
+            "checked_at": int(time.time()),
+        }
+        status = "unchanged" if entry and entry["sha256"] == sha256 else "updated"
+        return new_entry, status, None
+    except SubscriptionError as e:
+        return entry, "error", str(e)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def mirror_providers(names=None, base_url=LHIE1_BASE_URL, mirror_dir=MIRROR_DIR,
+                     max_workers=DEFAULT_MAX_WORKERS, timeout=DEFAULT_TIMEOUT, session=None):
+    """
+    并发同步规则集镜像并更新 manifest.json。
+    返回 results 列表 (name, file, status: updated / unchanged / error, error)，按 LHIE1_PROVIDERS_MAP 顺序排列。
+    同步失败的规则集保留上一次成功的文件与清单条目。
+    """
+    names = list(LHIE1_PROVIDERS_MAP) if names is None else list(names)
+    os.makedirs(mirror_dir, exist_ok=True)
+    manifest = read_manifest(mirror_dir)
+    own_session = session is None
+    if own_session:
+        session = create_session(pool_size=max_workers)
+
+    def run(name):
+        entry, status, error = _mirror_one(session, name, upstream_url(name, base_url), mirror_dir,
+                                           manifest.get(name), timeout)
+        return name, entry, status, error
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(names)))) as pool:
+            outcomes = list(pool.map(run, names))
+    finally:
+        if own_session:
+            session.close()
+
+    results = []
+    for name, entry, status, error in outcomes:
+        if entry:
+            manifest[name] = entry
+        else:
+            # 本地文件已损坏且本次未能重新下载
+            manifest.pop(name, None)
+        results.append({"name": name, "file": lhie1_filename(name), "status": status, "error": error})
+    _write_manifest(mirror_dir, manifest)
+    return results
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="同步 lhie1 规则集到本地镜像目录")
+    parser.add_argument("--base-url", default=LHIE1_BASE_URL, help="上游地址 (默认 jsDelivr)")
+    parser.add_argument("--dir", default=MIRROR_DIR, help="镜像目录")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS)
+    args = parser.parse_args(argv)
+
+    start = time.monotonic()
+    results = mirror_providers(base_url=args.base_url, mirror_dir=args.dir, max_workers=args.workers)
+    failed = 0
+    for r in results:
+        if r["status"] == "error":
+            failed += 1
+            print(f"❌ {r['name']}: {r['error']}")
+    updated = sum(1 for r in results if r["status"] == "updated")
+    print(f"同步完成: {len(results)} 个规则集，更新 {updated}，失败 {failed}，耗时 {time.monotonic() - start:.1f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
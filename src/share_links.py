@@ -0,0 +1,314 @@
+import base64
+import json
+from urllib.parse import unquote, urlparse
+
+# ==========================================
+# 分享链接解析
+# ==========================================
+# 每种协议一个解析函数，通过 @register("scheme") 注册到 PARSERS。
+# 解析函数接收完整链接，返回 Clash 节点字典；格式错误时抛出任意异常，
+# 由 parse_share_link 统一转换为 ValueError。
+
+PARSERS = {}    # scheme -> 解析函数
+
+
+def register(*schemes):
+    def decorator(func):
+        for scheme in schemes:
+            PARSERS[scheme] = func
+        return func
+    return decorator
+
+
+def supported_schemes():
+    return tuple(PARSERS)
+
+
+def _b64decode(data):
+    data = data.strip().replace('-', '+').replace('_', '/')
+    return base64.b64decode(data + '=' * (-len(data) % 4))
+
+
+def _parse_query(query):
+    query_params = {}
+    if query:
+        for param in query.split('&'):
+            key, value = param.split('=', 1) if '=' in param else (param, '')
+            query_params[key] = unquote(value)
+    return query_params
+
+
+def _is_true(value):
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+def _split_link(link, default_port=443):
+    """拆分 scheme://userinfo@host:port?query#fragment，返回 (userinfo, server, port, query, name)"""
+    parsed = urlparse(link)
+    userinfo, _, _ = parsed.netloc.rpartition('@')
+    server = parsed.hostname
+    if not server:
+        raise ValueError("缺少服务器地址")
+    if not userinfo:
+        raise ValueError("缺少认证信息")
+    port = parsed.port or default_port
+    name = unquote(parsed.fragment) if parsed.fragment else ""
+    return unquote(userinfo), server, port, _parse_query(parsed.query), name
+
+
+def _apply_tls(proxy, query, sni_key="sni"):
+    """通用 TLS 参数: sni / alpn / 跳过证书验证 / 客户端指纹"""
+    sni = query.get('sni') or query.get('peer')
+    if sni:
+        proxy[sni_key] = sni
+    if query.get('alpn'):
+        proxy["alpn"] = query['alpn'].split(',')
+    for key in ('skip-cert-verify', 'allowInsecure', 'insecure', 'allow_insecure'):
+        if key in query:
+            proxy["skip-cert-verify"] = _is_true(query[key])
+            break
+    if query.get('fp'):
+        proxy["client-fingerprint"] = query['fp']
+
+
+def _apply_transport(proxy, query):
+    """V2Ray 系传输参数: type=ws/grpc/h2/http"""
+    network = query.get('type') or 'tcp'
+    proxy["network"] = network
+    if network == 'ws':
+        ws_opts = {"path": query.get('path', '/')}
+        if query.get('host'):
+            ws_opts["headers"] = {"Host": query['host']}
+        proxy["ws-opts"] = ws_opts
+    elif network == 'grpc':
+        proxy["grpc-opts"] = {"grpc-service-name": query.get('serviceName', '')}
+    elif network == 'h2':
+        h2_opts = {"path": query.get('path', '/')}
+        if query.get('host'):
+            h2_opts["host"] = query['host'].split(',')
+        proxy["h2-opts"] = h2_opts
+    elif network == 'http':
+        http_opts = {"path": [query.get('path', '/')]}
+        if query.get('host'):
+            http_opts["headers"] = {"Host": query['host'].split(',')}
+        proxy["http-opts"] = http_opts
+
+
+@register('ss')
+def parse_ss(link):
+    parsed = urlparse(link)
+    data = unquote(parsed.netloc + parsed.path)
+    if '@' not in data:
+        # 整体 Base64: base64(method:password@server:port)
+        data = _b64decode(data).decode()
+    encoded, server_port = data.rsplit('@', 1)
+    if ':' in encoded:
+        # AEAD格式: method:password@server:port
+        method, password = encoded.split(':', 1)
+    else:
+        # 旧格式: base64(method:password)@server:port
+        method, password = _b64decode(encoded).decode().split(':', 1)
+    server, port = server_port.rstrip('/').rsplit(':', 1)
+    server = server.strip('[]')
+
+    proxy = {
+        "name": unquote(parsed.fragment) if parsed.fragment else f"SS-{server}",
+        "type": "ss",
+        "server": server,
+        "port": int(port),
+        "cipher": method,
+        "password": password
+    }
+
+    # SIP003 插件: plugin=obfs-local;obfs=http;obfs-host=example.com
+    plugin = _parse_query(parsed.query).get('plugin')
+    if plugin:
+        name, *opts = plugin.split(';')
+        opts = dict(o.split('=', 1) if '=' in o else (o, 'true') for o in opts)
+        if name in ('obfs-local', 'simple-obfs', 'obfs'):
+            proxy["plugin"] = "obfs"
+            proxy["plugin-opts"] = {"mode": opts.get('obfs', 'http'), "host": opts.get('obfs-host', '')}
+        elif name == 'v2ray-plugin':
+            proxy["plugin"] = "v2ray-plugin"
+            proxy["plugin-opts"] = {
+                "mode": opts.get('mode', 'websocket'),
+                "host": opts.get('host', ''),
+                "path": opts.get('path', '/'),
+                "tls": 'tls' in opts,
+            }
+        else:
+            raise ValueError(f"不支持的插件: {name}")
+    return proxy
+
+
+@register('trojan')
+def parse_trojan(link):
+    password, server, port, query, name = _split_link(link)
+    proxy = {
+        "name": name or f"Trojan-{server}",
+        "type": "trojan",
+        "server": server,
+        "port": port,
+        "password": password
+    }
+    _apply_tls(proxy, query)
+    if query.get('type') in ('ws', 'grpc'):
+        _apply_transport(proxy, query)
+    return proxy
+
+
+@register('vmess')
+def parse_vmess(link):
+    # VMess链接是base64编码的JSON
+    vmess_info = json.loads(_b64decode(link[len("vmess://"):]).decode())
+
+    proxy = {
+        "name": vmess_info.get("ps", f"VMess-{vmess_info.get('add', 'server')}"),
+        "type": "vmess",
+        "server": vmess_info.get("add", "server"),
+        "port": int(vmess_info.get("port", 443)),
+        "uuid": vmess_info.get("id", ""),
+        "alterId": int(vmess_info.get("aid", 0) or 0),
+        "cipher": vmess_info.get("scy", "auto")
+    }
+
+    # 根据network类型设置传输协议
+    net_type = vmess_info.get("net", "tcp")
+    proxy["network"] = net_type
+
+    # TLS设置
+    if vmess_info.get("tls", "") == "tls":
+        proxy["tls"] = True
+        if vmess_info.get("sni"):
+            proxy["servername"] = vmess_info["sni"]
+
+    # 根据传输协议添加额外选项
+    if net_type == "ws":
+        ws_opts = {}
+        if "path" in vmess_info:
+            ws_opts["path"] = vmess_info["path"]
+        if vmess_info.get("host"):
+            ws_opts["headers"] = {"Host": vmess_info["host"]}
+        proxy["ws-opts"] = ws_opts
+    elif net_type == "h2":
+        if "path" in vmess_info:
+            proxy["h2-opts"] = {"path": vmess_info["path"]}
+    elif net_type == "grpc":
+        proxy["grpc-opts"] = {"grpc-service-name": vmess_info.get("path", "")}
+    return proxy
+
+
+@register('vless')
+def parse_vless(link):
+    uuid, server, port, query, name = _split_link(link)
+    security = query.get('security', 'none')
+    proxy = {
+        "name": name or f"VLESS-{server}",
+        "type": "vless",
+        "server": server,
+        "port": port,
+        "uuid": uuid,
+        "tls": security in ('tls', 'reality'),
+        "udp": True
+    }
+    if query.get('flow'):
+        proxy["flow"] = query['flow']
+    _apply_tls(proxy, query, sni_key="servername")
+    if security == 'reality':
+        reality_opts = {"public-key": query.get('pbk', '')}
+        if query.get('sid'):
+            reality_opts["short-id"] = query['sid']
+        proxy["reality-opts"] = reality_opts
+    if query.get('packetEncoding'):
+        proxy["packet-encoding"] = query['packetEncoding']
+    _apply_transport(proxy, query)
+    return proxy
+
+
+@register('hysteria2', 'hy2')
+def parse_hysteria2(link):
+    password, server, port, query, name = _split_link(link)
+    proxy = {
+        "name": name or f"Hy2-{server}",
+        "type": "hysteria2",
+        "server": server,
+        "port": port,
+        "password": password
+    }
+    _apply_tls(proxy, query)
+    if query.get('obfs') and query['obfs'] != 'none':
+        proxy["obfs"] = {"type": query['obfs'], "password": query.get('obfs-password', '')}
+    if query.get('mport'):
+        # 端口跳跃
+        proxy["ports"] = query['mport']
+    return proxy
+
+
+@register('tuic')
+def parse_tuic(link):
+    userinfo, server, port, query, name = _split_link(link)
+    uuid, _, password = userinfo.partition(':')
+    proxy = {
+        "name": name or f"TUIC-{server}",
+        "type": "tuic",
+        "server": server,
+        "port": port,
+        "uuid": uuid,
+        "password": password
+    }
+    if query.get('congestion_control'):
+        proxy["congestion-controller"] = query['congestion_control']
+    if query.get('udp_relay_mode'):
+        proxy["udp-relay-mode"] = query['udp_relay_mode']
+    _apply_tls(proxy, query)
+    if 'disable_sni' in query:
+        proxy["disable-sni"] = _is_true(query['disable_sni'])
+    return proxy
+
+
+@register('anytls')
+def parse_anytls(link):
+    password, server, port, query, name = _split_link(link)
+    proxy = {
+        "name": name or f"AnyTLS-{server}",
+        "type": "anytls",
+        "server": server,
+        "port": port,
+        "password": password,
+        "udp": True
+    }
+    _apply_tls(proxy, query)
+    return proxy
+
+
+def parse_share_link(link):
+    """解析单条分享链接，返回节点字典；格式错误或协议不支持时抛出 ValueError"""
+    link = link.strip()
+    scheme = link.split('://', 1)[0].lower() if '://' in link else ''
+    parser = PARSERS.get(scheme)
+    if parser is None:
+        raise ValueError(f"不支持的协议类型: {scheme or link[:16]}")
+    try:
+        return parser(link)
+    except ValueError as e:
+        raise ValueError(f"{scheme} 链接格式错误: {e}") from e
+    except Exception as e:
+        raise ValueError(f"{scheme} 链接格式错误: {e!r}") from e
+
+
+def parse_links(links):
+    """
+    批量解析分享链接 (忽略空行与 # 注释)，单条失败不影响其他链接。
+    返回 (节点列表, 错误列表 [(链接, 错误信息)])，节点顺序与输入一致。
+    """
+    proxies = []
+    errors = []
+    for link in links:
+        link = link.strip()
+        if not link or link.startswith('#'):
+            continue
+        try:
+            proxies.append(parse_share_link(link))
+        except ValueError as e:
+            errors.append((link, str(e)))
+    return proxies, errors
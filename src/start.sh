@@ -4,6 +4,11 @@
 # 端口 8000 用于 API
 uvicorn api:app --host 0.0.0.0 --port 8000 &
 
+# 定时同步 lhie1 规则集离线镜像并拆分转换 (设置 RULE_MIRROR_INTERVAL 秒数后启用)
+if [ -n "$RULE_MIRROR_INTERVAL" ]; then
+    (while true; do python rule_mirror.py; python rule_convert.py; sleep "$RULE_MIRROR_INTERVAL"; done) &
+fi
+
 # 启动 Streamlit 服务
 # 端口 8501 用于 Web UI
 streamlit run web_app.py --server.address=0.0.0.0 --server.port=8501
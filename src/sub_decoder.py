@@ -0,0 +1,304 @@
+import base64
+import binascii
+import re
+
+import yaml
+
+import yaml_io
+from share_links import parse_share_link
+
+# ==========================================
+# 订阅内容流式解码
+# ==========================================
+# 根据前几百字节判断格式，逐块解码、逐个产出节点：
+#   yaml   - Clash 配置 / 节点列表，按 proxies 列表项逐项解析
+#   links  - 每行一条分享链接
+#   base64 - 以上任一格式的 Base64 包裹，分块解码后再次判断
+# 内存占用与单个节点大小相关，而不是与整个订阅大小相关。
+
+FORMAT_YAML = "yaml"
+FORMAT_LINKS = "links"
+FORMAT_BASE64 = "base64"
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+SNIFF_BYTES = 512
+CHUNK_SIZE = 64 * 1024
+
+_LINK_RE = re.compile(rb"^[A-Za-z][A-Za-z0-9+.-]*://")
+_BASE64_RE = re.compile(rb"^[A-Za-z0-9+/=_\-\s]+$")
+_B64_STRIP = bytes.maketrans(b"-_", b"+/")
+_ANCHOR_RE = re.compile(r"(?:^|[\s\[{,])&[^\s,\[\]{}]+")
+_ALIAS_RE = re.compile(r"(?:^|[\s\[{,])\*[^\s,\[\]{}]+")
+
+BATCH_LINES = 2000  # 每批解析的最大行数
+
+
+
+class DecodeError(ValueError):
+    pass
+
+
+def sniff_format(head):
+    """根据内容开头判断订阅格式"""
+    text = head.lstrip(b"\xef\xbb\xbf \t\r\n")
+    if _LINK_RE.match(text):
+        return FORMAT_LINKS
+    # Base64 字符集且首行没有 YAML 的 "key:" / "- " 结构
+    first_line = text.split(b"\n", 1)[0]
+    if text and _BASE64_RE.match(text) and not first_line.startswith(b"- "):
+        return FORMAT_BASE64
+    return FORMAT_YAML
+
+
+def _limited(chunks, max_bytes):
+    total = 0
+    for chunk in chunks:
+        total += len(chunk)
+        if total > max_bytes:
+            raise DecodeError(f"订阅大小超过上限 {max_bytes} 字节")
+        yield chunk
+
+
+def _peek(chunks, size):
+    """读取至少 size 字节用于格式判断，返回 (开头内容, 包含开头的完整块迭代器)"""
+    chunks = iter(chunks)
+    head = b""
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= size:
+            break
+
+    def rest():
+        if head:
+            yield head
+        yield from chunks
+
+    return head, rest()
+
+
+def _iter_base64(chunks):
+    """分块解码 Base64 (忽略空白，兼容 URL-safe 字符与缺失的填充)"""
+    pending = b""
+    for chunk in chunks:
+        pending += b"".join(chunk.split()).translate(_B64_STRIP)
+        usable = len(pending) - len(pending) % 4
+        if usable:
+            try:
+                yield base64.b64decode(pending[:usable])
+            except binascii.Error as e:
+                raise DecodeError(f"Base64 解码失败: {e}") from e
+            pending = pending[usable:]
+    pending = pending.rstrip(b"=")
+    if pending:
+        try:
+            yield base64.b64decode(pending + b"=" * (-len(pending) % 4))
+        except binascii.Error as e:
+            raise DecodeError(f"Base64 解码失败: {e}") from e
+
+
+def _iter_lines(chunks):
+    """将字节块切分为文本行 (保留行内容，去掉换行符)"""
+    pending = b""
+    for chunk in chunks:
+        pending += chunk
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line.rstrip(b"\r").decode("utf-8", errors="replace")
+    if pending:
+        yield pending.rstrip(b"\r").decode("utf-8", errors="replace")
+
+
+def _iter_link_nodes(lines, on_error):
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            yield parse_share_link(line)
+        except ValueError as e:
+            on_error(line, e)
+
+
+def _indent_of(line):
+    return len(line) - len(line.lstrip(" "))
+
+
+def _has_anchor(lines):
+    return any(_ANCHOR_RE.search(l) or _ALIAS_RE.search(l) for l in lines)
+
+
+def _load_items(items, indent, anchors, on_error):
+    """
+    解析一批列表项 (每项为原始文本行列表)，逐个产出节点字典。
+    不含锚点的连续项整批交给 libyaml 解析以减少开销；含锚点 (&x / *x) 的项使用纯 Python 解析器，
+    并通过共享的 anchors 表 (名称 -> 节点) 引用前面项中定义的锚点。
+    整批解析失败时逐项重试以定位出错的节点。
+    """
+    start = 0
+    while start < len(items):
+        shared = _has_anchor(items[start])
+        end = start + 1
+        while end < len(items) and _has_anchor(items[end]) == shared:
+            end += 1
+        yield from _load_run(items[start:end], indent, anchors if shared else None, on_error)
+        start = end
+
+
+def _load_run(items, indent, anchors, on_error):
+    text = "\n".join(l[indent:] for lines in items for l in lines)
+    if anchors is None:
+        loader = yaml_io.Loader(text)
+    else:
+        saved = dict(anchors)
+        loader = yaml.SafeLoader(text)
+        loader.anchors = anchors
+    try:
+        data = loader.get_single_data()
+    except yaml.YAMLError as e:
+        if anchors is not None:
+            # 回滚失败批次中登记的锚点，避免逐项重试时报重复锚点
+            anchors.clear()
+            anchors.update(saved)
+        if len(items) > 1:
+            for lines in items:
+                yield from _load_run([lines], indent, anchors, on_error)
+        else:
+            on_error(items[0][0].strip(), e)
+        return
+    finally:
+        loader.dispose()
+
+    if not isinstance(data, list) or len(data) != len(items):
+        data = [None] * len(items)
+    for lines, node in zip(items, data):
+        if isinstance(node, dict):
+            yield node
+        else:
+            on_error(lines[0].strip(), DecodeError("节点不是有效的映射"))
+
+
+def _is_item_start(stripped):
+    return stripped.startswith("- ") or stripped == "-"
+
+
+def _iter_yaml_nodes(lines, on_error):
+    """
+    从 Clash YAML 中逐项提取 proxies 列表。
+    支持顶层 "proxies:" 块列表以及直接以 "- " 开头的节点列表；
+    其他结构 (如 flow 风格 "proxies: [...]") 回退为整体解析。
+    """
+    lines = iter(lines)
+    buffered = []        # 回退整体解析时使用
+    seen_content = False
+    in_list = False
+    list_indent = None
+    item = []
+    batch = []           # 待解析的列表项
+    batch_lines = 0
+    anchors = {}
+
+    for line in lines:
+        stripped = line.strip()
+        if not in_list:
+            buffered.append(line)
+            if not stripped or stripped.startswith("#") or stripped == "---":
+                continue
+            at_top = _indent_of(line) == 0
+            if not seen_content and at_top and _is_item_start(stripped):
+                # 文档本身就是节点列表，当前行即为第一个列表项
+                in_list = True
+            elif at_top and stripped.split("#", 1)[0].strip() == "proxies:":
+                in_list = True
+                buffered = []
+                seen_content = True
+                continue
+            else:
+                seen_content = True
+                continue
+
+        # --- 列表内 ---
+        if not stripped or stripped.startswith("#"):
+            if item:
+                item.append(line)
+            continue
+        indent = _indent_of(line)
+        if list_indent is None:
+            if not _is_item_start(stripped):
+                # "proxies:" 下不是块列表，回退整体解析
+                in_list = False
+                buffered = ["proxies:", line]
+                continue
+            list_indent = indent
+
+        if indent == list_indent and _is_item_start(stripped):
+            if item:
+                batch.append(item)
+                batch_lines += len(item)
+                if batch_lines >= BATCH_LINES:
+                    yield from _load_items(batch, list_indent, anchors, on_error)
+                    batch, batch_lines = [], 0
+            item = [line]
+        elif indent > list_indent:
+            item.append(line)
+        else:
+            # 列表结束 (遇到下一个顶层键)
+            break
+
+    if item:
+        batch.append(item)
+    if batch:
+        yield from _load_items(batch, list_indent, anchors, on_error)
+        return
+
+    if in_list:
+        return
+
+    # 回退：剩余内容整体解析
+    buffered.extend(lines)
+    try:
+        data = yaml_io.load("\n".join(buffered))
+    except yaml.YAMLError as e:
+        raise DecodeError(f"YAML 解析错误: {e}") from e
+    if isinstance(data, dict):
+        data = data.get("proxies")
+    if not isinstance(data, list):
+        raise DecodeError("内容不是有效的节点列表")
+    for node in data:
+        if isinstance(node, dict):
+            yield node
+
+
+def _raise_error(source, exc):
+    raise DecodeError(f"{source[:60]}: {exc}")
+
+
+def iter_nodes(chunks, max_bytes=DEFAULT_MAX_BYTES, on_error=None):
+    """
+    从字节块迭代器中逐个产出节点字典。
+    on_error(片段, 异常) 用于接收单个节点的解析错误，未提供时直接抛出 DecodeError。
+    超过 max_bytes 时抛出 DecodeError。
+    """
+    on_error = on_error or _raise_error
+    chunks = _limited(chunks, max_bytes)
+    head, chunks = _peek(chunks, SNIFF_BYTES)
+    fmt = sniff_format(head)
+
+    if fmt == FORMAT_BASE64:
+        head, chunks = _peek(_iter_base64(chunks), SNIFF_BYTES)
+        fmt = sniff_format(head)
+        if fmt == FORMAT_BASE64:
+            raise DecodeError("无法识别的订阅格式")
+
+    if fmt == FORMAT_LINKS:
+        yield from _iter_link_nodes(_iter_lines(chunks), on_error)
+    else:
+        yield from _iter_yaml_nodes(_iter_lines(chunks), on_error)
+
+
+def iter_file_chunks(f, chunk_size=CHUNK_SIZE):
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
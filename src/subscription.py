@@ -0,0 +1,150 @@
+import hashlib
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from node_store import NodeStore
+from sub_decoder import DecodeError, iter_nodes, iter_file_chunks
+
+# ==========================================
+# 多订阅并发聚合
+# ==========================================
+DEFAULT_TIMEOUT = 15                    # 单个订阅的总超时 (秒)
+DEFAULT_RETRIES = 2                     # 失败重试次数 (不含首次)
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024    # 单个订阅最大字节数
+DEFAULT_MAX_WORKERS = 8
+USER_AGENT = "clash.meta"               # 多数机场按 UA 返回 Clash 格式
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class SubscriptionError(Exception):
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def create_session(pool_size=DEFAULT_MAX_WORKERS):
+    """创建带连接池的 requests.Session，多个订阅间复用 TCP/TLS 连接"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+def _download(session, url, timeout, max_bytes, sink, headers=None):
+    deadline = time.monotonic() + timeout
+    try:
+        with session.get(url, timeout=timeout, stream=True, headers=headers) as resp:
+            if resp.status_code == 304:
+                return None, None, resp.headers
+            if resp.status_code != 200:
+                raise SubscriptionError(f"状态码 {resp.status_code}", retryable=resp.status_code in RETRY_STATUS)
+
+            length = resp.headers.get("Content-Length")
+            if length and length.isdigit() and int(length) > max_bytes:
+                raise SubscriptionError(f"订阅大小 {int(length)} 字节超过上限 {max_bytes}")
+
+            digest = hashlib.sha256()
+            total = 0
+            for chunk in resp.iter_content(chunk_size=64 * 1024):
+                total += len(chunk)
+                if total > max_bytes:
+                    raise SubscriptionError(f"订阅大小超过上限 {max_bytes} 字节")
+                if time.monotonic() > deadline:
+                    raise SubscriptionError(f"下载超时 ({timeout} 秒)", retryable=True)
+                digest.update(chunk)
+                sink.write(chunk)
+            return total, digest.hexdigest(), resp.headers
+    except requests.RequestException as e:
+        raise SubscriptionError(str(e), retryable=True) from e
+
+
+def fetch_subscription(session, url, sink, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                       max_bytes=DEFAULT_MAX_BYTES, headers=None):
+    """
+    流式下载单个订阅并写入 sink (二进制文件对象)，网络错误与 5xx/429 按指数退避重试。
+    返回 (字节数, sha256, 响应头)；条件请求命中 304 时前两项为 None。
+    """
+    attempt = 0
+    while True:
+        try:
+            return _download(session, url, timeout, max_bytes, sink, headers=headers)
+        except SubscriptionError as e:
+            if not e.retryable or attempt >= retries:
+                raise
+            sink.seek(0)
+            sink.truncate()
+            time.sleep(0.5 * (2 ** attempt))
+            attempt += 1
+
+
+def parse_subscription(f, errors=None, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    从二进制文件对象中流式解析订阅 (Clash YAML / 分享链接 / Base64 包裹)。
+    单个节点解析失败时记入 errors 列表 (片段, 错误信息) 并继续。
+    """
+    def on_error(source, exc):
+        if errors is not None:
+            errors.append((source[:80], str(exc)))
+
+    try:
+        return list(iter_nodes(iter_file_chunks(f), max_bytes=max_bytes, on_error=on_error))
+    except DecodeError as e:
+        raise SubscriptionError(str(e)) from e
+
+
+def _fetch_and_parse(session, url, timeout, retries, max_bytes, cache=None, cache_ttl=None):
+    result = {"url": url, "proxies": [], "bytes": 0, "error": None, "cache": None, "node_errors": []}
+    start = time.monotonic()
+    try:
+        if cache is not None:
+            result["proxies"], result["bytes"], result["cache"], result["node_errors"] = cache.get(url, ttl=cache_ttl)
+        else:
+            # 小订阅留在内存，大订阅自动落盘，避免整体驻留内存
+            with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as f:
+                result["bytes"], _, _ = fetch_subscription(session, url, f, timeout=timeout, retries=retries,
+                                                           max_bytes=max_bytes)
+                f.seek(0)
+                result["proxies"] = parse_subscription(f, errors=result["node_errors"], max_bytes=max_bytes)
+    except SubscriptionError as e:
+        result["error"] = str(e)
+    result["elapsed"] = time.monotonic() - start
+    return result
+
+
+def aggregate_subscriptions(urls, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, max_bytes=DEFAULT_MAX_BYTES,
+                            max_workers=DEFAULT_MAX_WORKERS, session=None, cache=None, cache_ttl=None):
+    """
+    并发拉取多个订阅并合并为一个去重后的节点集合。
+    返回 (NodeStore, results)：NodeStore 中每个节点的 tag 为其来源订阅地址，
+    results 按输入顺序给出每个订阅的状态 (url, bytes, elapsed, added, duplicates, cache, node_errors, error)。
+    传入 cache (SubscriptionCache) 时经由本地缓存获取，超时/重试/大小上限以缓存的设置为准；
+    cache_ttl 为本次调用的缓存有效期 (秒)，为空时使用缓存的默认值。
+    """
+    urls = list(dict.fromkeys(u.strip() for u in urls if u and u.strip()))
+    own_session = session is None and cache is None
+    if own_session:
+        session = create_session(pool_size=max(1, min(max_workers, len(urls))))
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as pool:
+            results = list(pool.map(
+                lambda u: _fetch_and_parse(session, u, timeout, retries, max_bytes, cache=cache, cache_ttl=cache_ttl), urls
+            ))
+    finally:
+        if own_session:
+            session.close()
+
+    # 按输入顺序合并，保证结果稳定
+    merged = NodeStore()
+    for result in results:
+        added, skipped = merged.add_many(result.pop("proxies"), tag=result["url"])
+        result["added"] = len(added)
+        result["duplicates"] = len(skipped)
+    return merged, results
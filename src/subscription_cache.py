@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from subscription import (
+    DEFAULT_TIMEOUT, DEFAULT_RETRIES, DEFAULT_MAX_BYTES,
+    create_session, fetch_subscription, parse_subscription
+)
+
+# ==========================================
+# 订阅本地缓存 (条件请求 + stale-while-revalidate)
+# ==========================================
+# 每个订阅地址对应两个文件：
+#   <key>.body  原始响应内容
+#   <key>.json  元数据 (url, etag, last_modified, fetched_at, content_hash)
+# 有效期内直接使用缓存；过期后先返回旧内容，同时在后台发起条件请求刷新。
+# 下载内容直接流式写入临时文件后原子替换，解析时从文件流式读取。
+# 解析结果按内容哈希缓存在内存中，内容未变化时不会重复解析。
+
+DATA_DIR = os.environ.get("CLASH_GEN_DATA_DIR", "data")
+CACHE_DIR = os.path.join(DATA_DIR, "subscriptions")
+DEFAULT_TTL = 3600  # 秒
+
+
+def _atomic_write(path, data):
+    tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class SubscriptionCache:
+    def __init__(self, cache_dir=CACHE_DIR, ttl=DEFAULT_TTL, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                 max_bytes=DEFAULT_MAX_BYTES, session=None, max_workers=4):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.timeout = timeout
+        self.retries = retries
+        self.max_bytes = max_bytes
+        self.session = session or create_session()
+        self._lock = threading.Lock()
+        self._parsed = {}       # url -> (content_hash, proxies, node_errors)
+        self._inflight = set()  # 正在后台刷新的 url
+        self._refresher = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sub-refresh")
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+        base = os.path.join(self.cache_dir, key)
+        return base + ".body", base + ".json"
+
+    def _read_meta(self, url):
+        _, meta_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _parse(self, url, meta):
+        """按内容哈希返回解析结果，未命中时才读取并解析缓存文件"""
+        content_hash = meta["content_hash"]
+        cached = self._parsed.get(url)
+        if cached and cached[0] == content_hash:
+            return cached[1], cached[2]
+        body_path, _ = self._paths(url)
+        errors = []
+        with open(body_path, "rb") as f:
+            proxies = parse_subscription(f, errors=errors, max_bytes=self.max_bytes)
+        with self._lock:
+            self._parsed[url] = (content_hash, proxies, errors)
+        return proxies, errors
+
+    def refresh(self, url, meta=None):
+        """发起 (条件) 请求刷新缓存，返回最新元数据"""
+        headers = {}
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        body_path, meta_path = self._paths(url)
+        tmp_path = f"{body_path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        try:
+            with open(tmp_path, "wb") as f:
+                size, content_hash, resp_headers = fetch_subscription(
+                    self.session, url, f, timeout=self.timeout, retries=self.retries,
+                    max_bytes=self.max_bytes, headers=headers
+                )
+            # 内容未变化 (304 或服务端不支持条件请求) 时只更新元数据
+            if size is not None and (not meta or meta.get("content_hash") != content_hash):
+                os.replace(tmp_path, body_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        new_meta = dict(meta or {}, url=url, fetched_at=time.time())
+        if resp_headers.get("ETag"):
+            new_meta["etag"] = resp_headers["ETag"]
+        if resp_headers.get("Last-Modified"):
+            new_meta["last_modified"] = resp_headers["Last-Modified"]
+        if size is not None:
+            new_meta["content_hash"] = content_hash
+            new_meta["size"] = size
+
+        _atomic_write(meta_path, json.dumps(new_meta, ensure_ascii=False).encode("utf-8"))
+        return new_meta
+
+    def _refresh_in_background(self, url, meta):
+        with self._lock:
+            if url in self._inflight:
+                return
+            self._inflight.add(url)
+
+        def task():
+            try:
+                self.refresh(url, meta)
+            except Exception:
+                # 后台刷新失败时继续使用旧内容，下次访问会再次尝试
+                pass
+            finally:
+                with self._lock:
+                    self._inflight.discard(url)
+
+        self._refresher.submit(task)
+
+    def get(self, url, ttl=None):
+        """
+        返回 (proxies, size, status, node_errors)。status 取值：
+        fresh   - 缓存有效，无网络请求
+        stale   - 缓存过期，已返回旧内容并在后台刷新
+        fetched - 无缓存，已同步下载
+        """
+        ttl = self.ttl if ttl is None else ttl
+        meta = self._read_meta(url)
+        if meta and meta.get("content_hash"):
+            if time.time() - meta.get("fetched_at", 0) < ttl:
+                status = "fresh"
+            else:
+                self._refresh_in_background(url, meta)
+                status = "stale"
+        else:
+            meta = self.refresh(url, meta)
+            status = "fetched"
+        proxies, errors = self._parse(url, meta)
+        return proxies, meta.get("size", 0), status, errors
+
+    def invalidate(self, url):
+        with self._lock:
+            self._parsed.pop(url, None)
+        for path in self._paths(url):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache():
+    """进程内共享的缓存实例 (Streamlit 每次 rerun 复用同一个)"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = SubscriptionCache()
+        return _default_cache
@@ -0,0 +1,184 @@
+import re
+import sys
+from collections import Counter
+
+import yaml_io
+
+# ==========================================
+# 配置校验
+# ==========================================
+# 所有名称查找都走 set / dict 索引，整体为 O(节点 + 策略组成员 + 规则)。
+# 可在 Web UI、API (POST /validate) 与命令行 (python validator.py config.yaml) 中使用。
+
+# 内置策略，无需定义即可作为规则目标或策略组成员
+BUILTIN_POLICIES = frozenset(("DIRECT", "REJECT", "REJECT-DROP", "PASS", "COMPATIBLE"))
+# 逻辑规则: AND,((DOMAIN,a.com),(NETWORK,UDP)),目标
+LOGIC_RULE_TYPES = frozenset(("AND", "OR", "NOT"))
+
+_RULE_SET_IN_LOGIC_RE = re.compile(r"\(\s*RULE-SET\s*,\s*([^,()]+)")
+
+
+def parse_rule(rule):
+    """
+    拆分规则，返回 (类型, 内容, 目标策略)。
+    目标后面的 no-resolve / src 等参数会被忽略；SUB-RULE 的目标为子规则名称。
+    格式错误时抛出 ValueError。
+    """
+    rule_type, sep, rest = rule.partition(",")
+    rule_type = rule_type.strip().upper()
+    if not sep or not rest.strip():
+        raise ValueError("缺少目标策略")
+
+    if rule_type == "MATCH":
+        return rule_type, "", rest.split(",", 1)[0].strip()
+
+    if rule_type in LOGIC_RULE_TYPES or rule_type == "SUB-RULE":
+        # 内容为括号表达式，内部可能包含逗号，目标位于最后一个右括号之后
+        end = rest.rfind(")")
+        if not rest.lstrip().startswith("(") or end < 0:
+            raise ValueError("逻辑规则缺少括号表达式")
+        target = rest[end + 1:].lstrip(" ,").split(",", 1)[0].strip()
+        if not target:
+            raise ValueError("缺少目标策略")
+        return rule_type, rest[:end + 1], target
+
+    parts = rest.split(",")
+    if len(parts) < 2 or not parts[1].strip():
+        raise ValueError("缺少目标策略")
+    return rule_type, parts[0].strip(), parts[1].strip()
+
+
+def _find_dialer_cycles(dialer_of):
+    """
+    dialer_of: 节点名 -> 前置节点名 (仅包含指向节点的边)。
+    每个节点至多一条出边，沿链遍历并标记状态，整体 O(N)。返回环列表。
+    """
+    state = {}  # 1 = 当前路径上, 2 = 已完成
+    cycles = []
+    for start in dialer_of:
+        if start in state:
+            continue
+        path = []
+        node = start
+        while node is not None and node not in state:
+            state[node] = 1
+            path.append(node)
+            node = dialer_of.get(node)
+        if node is not None and state[node] == 1:
+            cycles.append(path[path.index(node):])
+        for name in path:
+            state[name] = 2
+    return cycles
+
+
+def validate_config(config):
+    """校验完整配置，返回 (错误列表, 警告列表)"""
+    errors = []
+    warnings = []
+
+    proxies = config.get("proxies") or []
+    groups = config.get("proxy-groups") or []
+    rules = config.get("rules") or []
+    rule_providers = config.get("rule-providers") or {}
+    proxy_providers = config.get("proxy-providers") or {}
+
+    # 1. 节点检查
+    if not proxies and not proxy_providers:
+        errors.append("Proxies 为空")
+
+    proxy_names = [p.get("name") for p in proxies]
+    for name, count in Counter(proxy_names).items():
+        if count > 1:
+            errors.append(f"节点名称重复: '{name}' 出现 {count} 次")
+    proxy_set = set(proxy_names)
+
+    group_names = [g.get("name") for g in groups]
+    for name, count in Counter(group_names).items():
+        if count > 1:
+            errors.append(f"策略组名称重复: '{name}' 出现 {count} 次")
+    group_set = set(group_names)
+    for name in group_set & proxy_set:
+        errors.append(f"策略组 '{name}' 与节点同名")
+
+    valid_targets = proxy_set | group_set | BUILTIN_POLICIES
+
+    # 2. 链式代理 (dialer-proxy)
+    dialer_of = {}
+    for proxy in proxies:
+        dialer = proxy.get("dialer-proxy")
+        if not dialer:
+            continue
+        if dialer not in proxy_set and dialer not in group_set:
+            errors.append(f"节点 '{proxy.get('name')}' 的 dialer-proxy 指向不存在的节点/组: '{dialer}'")
+        elif dialer in proxy_set:
+            dialer_of[proxy.get("name")] = dialer
+    for cycle in _find_dialer_cycles(dialer_of):
+        errors.append("dialer-proxy 存在循环引用: " + " -> ".join(cycle + [cycle[0]]))
+
+    # 3. 策略组检查 (include-all / filter 模式下的策略组可以没有 proxies 列表)
+    for group in groups:
+        for member in group.get("proxies") or []:
+            if member not in valid_targets:
+                warnings.append(f"策略组 '{group.get('name')}' 引用了不存在的节点/组: '{member}'")
+        for provider in group.get("use") or []:
+            if provider not in proxy_providers:
+                errors.append(f"策略组 '{group.get('name')}' 引用了不存在的 proxy-provider: '{provider}'")
+
+    # 4. 规则检查
+    used_providers = set()
+    match_index = None
+    for index, rule in enumerate(rules):
+        try:
+            rule_type, payload, target = parse_rule(rule)
+        except ValueError as e:
+            errors.append(f"规则格式错误 '{rule}': {e}")
+            continue
+
+        if rule_type == "RULE-SET":
+            used_providers.add(payload)
+            if payload not in rule_providers:
+                errors.append(f"规则 '{rule}' 引用了不存在的规则集: '{payload}'")
+        elif rule_type in LOGIC_RULE_TYPES:
+            for name in _RULE_SET_IN_LOGIC_RE.findall(payload):
+                name = name.strip()
+                used_providers.add(name)
+                if name not in rule_providers:
+                    errors.append(f"规则 '{rule}' 引用了不存在的规则集: '{name}'")
+
+        if rule_type != "SUB-RULE" and target not in valid_targets:
+            warnings.append(f"规则 '{rule}' 指向了不存在的策略组: '{target}'")
+        if rule_type == "MATCH" and match_index is None:
+            match_index = index
+
+    if match_index is not None and match_index < len(rules) - 1:
+        warnings.append(f"MATCH 规则 (第 {match_index + 1} 条) 之后还有 {len(rules) - match_index - 1} 条规则，这些规则永远不会生效")
+
+    for name in rule_providers:
+        if name not in used_providers:
+            warnings.append(f"规则集 '{name}' 未被任何规则引用")
+
+    return errors, warnings
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print("用法: python validator.py config.yaml")
+        return 2
+    with open(argv[0], "r", encoding="utf-8") as f:
+        config = yaml_io.load(f)
+    if not isinstance(config, dict):
+        print("❌ 文件不是有效的 Clash 配置")
+        return 1
+
+    errors, warnings = validate_config(config)
+    for e in errors:
+        print(f"❌ {e}")
+    for w in warnings:
+        print(f"⚠️  {w}")
+    print(f"检查完成: {len(errors)} 个错误, {len(warnings)} 个警告")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
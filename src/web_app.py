@@ -1,9 +1,10 @@
 import streamlit as st
-import yaml
+from streamlit.errors import StreamlitAPIException
 import requests
 import json
 import uuid
 import os
+import hashlib
 
 # ==========================================
 # 1. 页面基础设置 (必须位于所有 Streamlit 命令之前)
@@ -20,13 +21,30 @@ st.set_page_config(
     }
 )
 
-# 假设 clash_meta_gen 就在同一目录下，如果报错请确保文件存在
-try:
-    from clash_meta_gen import generate_proxy_groups 
-except ImportError:
-    # 如果没有该文件，定义一个临时函数防止报错，方便测试UI
-    def generate_proxy_groups(proxies):
-        return []
+import yaml_io
+from node_store import NodeStore
+from share_links import parse_links, supported_schemes
+from subscription import aggregate_subscriptions
+from subscription_cache import get_default_cache
+from config_builder import (
+    TARGET_DESKTOP, TARGET_OPENCLASH, RULE_TYPE_LHIE1, RULE_TYPE_CUSTOM, DEFAULT_GLOBAL_CONFIG,
+    build_config_cached, content_hash
+)
+from validator import validate_config
+from rule_analyzer import analyze_rules
+from cidr import aggregate_provider_file, aggregate_rules
+from rule_mirror import mirror_providers
+from rule_compiler import write_rule_files
+from rule_convert import convert_sources, custom_sources, load_plan, mirror_sources, plan_version
+from profiles import link_profile, new_token, save_profile, valid_token
+from workspace_store import DEFAULT_WORKSPACE, WorkspaceNodeStore, get_default_store, valid_workspace
+from healthcheck import probe_load
+from prober import (
+    DEAD_STATUSES, STATUS_OK, STATUS_SKIPPED, load_table, node_status, probe_proxies, save_table, summarize,
+    table_version
+)
+from renderer import render_config
+from artifacts import prune as prune_artifacts, publish_all
 
 # ==========================================
 # 0.5 顶部导航栏 + 隐藏Deploy按钮
@@ -61,160 +79,145 @@ st.title("OpenClash 配置文件生成器")
 st.markdown("不用手写 YAML，输入节点信息，自动生成符合 Meta 规范的配置文件。")
 
 
-# ==========================================
-# 0. 生产环境级配置常量 (提取自你的 Config)
-# ==========================================
-# 1. 强力直连兜底规则
-DEFAULT_DIRECT_RULES = """## 基础直连规则
-DOMAIN-SUFFIX,weather.com,DIRECT
-DOMAIN-KEYWORD,testipv6,DIRECT
-DOMAIN-KEYWORD,kuxueyun,DIRECT
-GEOSITE,category-public-tracker,DIRECT
-DOMAIN-SUFFIX,microsoft.com,DIRECT
-DOMAIN-SUFFIX,apple.com,DIRECT
-DOMAIN,gateway.icloud.com,DIRECT
-DOMAIN,metrics.icloud.com,DIRECT
-DOMAIN-SUFFIX,dbankcdn.com,DIRECT
-DOMAIN-SUFFIX,dbankcloud.cn,DIRECT
-DOMAIN-SUFFIX,vsallcity.awsdns-cn-north-1.com.cn,DIRECT
-
-## 国内流媒体与应用直连
-DOMAIN-SUFFIX,bilibili.com,DIRECT
-DOMAIN-SUFFIX,bilivideo.com,DIRECT
-DOMAIN-SUFFIX,douyin.com,DIRECT
-DOMAIN-SUFFIX,douyincdn.com,DIRECT
-DOMAIN-SUFFIX,huya.com,DIRECT
-DOMAIN-SUFFIX,iqiyi.com,DIRECT
-DOMAIN-SUFFIX,qq.com,DIRECT
-DOMAIN-SUFFIX,tencent.com,DIRECT
-DOMAIN-SUFFIX,alicdn.com,DIRECT
-DOMAIN-SUFFIX,taobao.com,DIRECT
-DOMAIN-SUFFIX,jd.com,DIRECT
-DOMAIN-SUFFIX,163.com,DIRECT
-DOMAIN-SUFFIX,126.net,DIRECT
-DOMAIN-SUFFIX,mgtv.com,DIRECT
-DOMAIN-SUFFIX,zhihu.com,DIRECT
-DOMAIN-SUFFIX,xhscdn.com,DIRECT
-
-## 下载工具进程直连
-PROCESS-NAME,aria2c,DIRECT
-PROCESS-NAME,BitComet,DIRECT
-PROCESS-NAME,fdm,DIRECT
-PROCESS-NAME,NetTransport,DIRECT
-PROCESS-NAME,qbittorrent,DIRECT
-PROCESS-NAME,Thunder,DIRECT
-PROCESS-NAME,transmission-daemon,DIRECT
-PROCESS-NAME,transmission-qt,DIRECT
-PROCESS-NAME,uTorrent,DIRECT
-PROCESS-NAME,WebTorrent,DIRECT
-PROCESS-NAME,Folx,DIRECT
-PROCESS-NAME,v2ray,DIRECT
-PROCESS-NAME,ss-local,DIRECT
-PROCESS-NAME,ssr-local,DIRECT
-PROCESS-NAME,ss-redir,DIRECT
-PROCESS-NAME,trojan-go,DIRECT
-PROCESS-NAME,xray,DIRECT
-PROCESS-NAME,hysteria,DIRECT
-PROCESS-NAME,singbox,DIRECT
-PROCESS-NAME,UUBooster,DIRECT
-
-## 局域网与GeoIP
-GEOIP,CN,DIRECT,no-resolve
-MATCH,Proxy
-"""
+# 初始化session state来存储节点 (从工作区数据库恢复，之后的修改逐条写回)
+workspace = st.query_params.get("ws", DEFAULT_WORKSPACE)
+if not valid_workspace(workspace):
+    st.warning(f"工作区名称 '{workspace}' 无效 (只能包含字母、数字、- 和 _)，已使用默认工作区")
+    workspace = DEFAULT_WORKSPACE
+workspace_store = get_default_store()
+
+# 先记下版本号：读取期间其他会话的写入会在下次 sync_workspace() 时读到
+if 'workspace_version' not in st.session_state:
+    st.session_state.workspace_version = workspace_store.version(workspace)
 
-# 2. Fake-IP 过滤列表 (防止国内应用卡顿)
-FAKE_IP_FILTER_LIST = [
-    "+.services.googleapis.cn", "+.googleapis.cn", "*.lan", "*.localdomain", "*.example", "*.invalid",
-    "*.localhost", "*.test", "*.local", "*.home.arpa", "*.direct", "cable.auth.com",
-    "network-test.debian.org", "detectportal.firefox.com", "msftconnecttest.com", "msftncsi.com",
-    "localhost.*.weixin.qq.com", "*.blzstatic.cn", "*.126.net", "*.163.com", "*.music.163.com",
-    "*.kuwo.cn", "*.kugou.com", "*.y.qq.com", "*.music.migu.cn", "music.migu.cn",
-    "+.qq.com", "+.tencent.com", "+.srv.nintendo.net", "*.xboxlive.com", "+.battle.net",
-    "proxy.golang.org", "stun.*.*", "heartbeat.belkin.com", "*.linksys.com", "*.router.asus.com",
-    "mesu.apple.com", "swscan.apple.com", "swquery.apple.com", "swdownload.apple.com",
-    "Mijia Cloud", "+.cmbchina.com", "local.adguard.org", "geosite:cn"
-]
-
-# 3. 嗅探配置 (强制嗅探 Netflix 等)
-SNIFFER_FORCE_DOMAIN = [
-    "+.netflix.com", "+.nflxvideo.net", "+.amazonaws.com", "+.media.dssott.com"
-]
-SNIFFER_SKIP_DOMAIN = [
-    "Mijia Cloud", "dlg.io.mi.com", "+.oray.com", "+.sunlogin.net", "+.push.apple.com"
-]
-
-# 初始化session state来存储节点
-if 'proxies_data' not in st.session_state:
-    st.session_state.proxies_data = []
+if 'node_store' not in st.session_state:
+    st.session_state.node_store = WorkspaceNodeStore(workspace_store, workspace)
 
 if 'custom_rules' not in st.session_state:
-    st.session_state.custom_rules = []
+    st.session_state.custom_rules = workspace_store.load_rules(workspace)
 
 if 'custom_rule_providers' not in st.session_state:
-    st.session_state.custom_rule_providers = {}
+    st.session_state.custom_rule_providers = workspace_store.load_providers(workspace)
 
 if 'global_config' not in st.session_state:
-    st.session_state.global_config = {
-        # 基础
-        "port": 7890,
-
-        "socks_port": 7891,
-        "mixed_port": 7893,
-        "allow_lan": True,
-        "bind_address": "*",
-        "mode": "rule",
-        "log_level": "info",
-        "ipv6_support": True,
-        "external_controller": "0.0.0.0:9090",
-        "secret": "password",  # 设置默认密码为"password"
-        # 性能与网络
-        "keep_alive_interval": 15,
-        "tcp_concurrent": True,
-        "unified_delay": True,
-        "find_process_mode": "strict",
-        "geodata_mode": True,
-        "geodata_loader": "standard",
-        # TUN
-        "enable_tun": False,
-        "tun_stack": "mixed", # 修改为 mixed
-        "tun_device": "utun",
-        "tun_auto_route": True,
-        "tun_auto_detect_interface": True,
-        "tun_dns_hijack": True,
-        # DNS (参考 Config)
-        "enable_dns": True,
-        "dns_listen": "0.0.0.0:7874", # 修改为 7874
-        "dns_ipv6": True,
-        "enhanced_mode": "fake-ip",
-        "fake_ip_range": "198.18.0.1/16",
-        "default_nameserver": "223.5.5.5\n119.29.29.29",
-        "nameserver": "https://dns.alidns.com/dns-query\nhttps://doh.pub/dns-query",
-        "fallback": "https://1.1.1.1/dns-query\ntcp://8.8.8.8",
-        # 嗅探 (默认开启)
-        "enable_sniffer": True, 
-        "sniff_override_dest": True,
-        # 规则
-        "custom_rules": DEFAULT_DIRECT_RULES # 注入默认规则
-    }
+    st.session_state.global_config = workspace_store.load_global_config(workspace, DEFAULT_GLOBAL_CONFIG)
+    st.session_state.saved_target_mode = workspace_store.load_settings(workspace).get("target_mode")
+
+# 全局设置项 -> 侧边栏控件的 key
+GC_WIDGET_KEYS = {
+    "mixed_port": "gc_mixed_port", "port": "gc_port", "socks_port": "gc_socks_port",
+    "keep_alive_interval": "gc_keep_alive", "allow_lan": "gc_allow_lan", "ipv6_support": "gc_ipv6",
+    "bind_address": "gc_bind_addr", "mode": "gc_mode", "log_level": "gc_log_level",
+    "external_controller": "gc_ext_ctrl", "secret": "gc_secret", "find_process_mode": "gc_find_proc",
+    "enable_tun": "gc_enable_tun", "tun_stack": "gc_tun_stack", "tun_device": "gc_tun_dev",
+    "tun_auto_route": "gc_tun_route", "tun_auto_detect_interface": "gc_tun_detect", "tun_dns_hijack": "gc_tun_hijack",
+    "enable_dns": "gc_enable_dns", "dns_listen": "gc_dns_listen", "enhanced_mode": "gc_dns_mode",
+    "fake_ip_range": "gc_fakeip_range", "default_nameserver": "gc_dns_boot", "nameserver": "gc_dns_main",
+    "fallback": "gc_dns_fallback", "nameserver_policy": "gc_dns_policy",
+    "tcp_concurrent": "gc_tcp_conc", "unified_delay": "gc_uni_delay", "geodata_mode": "gc_geodata",
+    "enable_sniffer": "gc_sniffer", "sniff_override_dest": "gc_sniff_override", "drop_shadowed_rules": "gc_drop_shadowed",
+    "compact_groups": "gc_compact_groups", "region_groups": "gc_region_groups", "skip_unreachable": "gc_skip_unreachable",
+    "healthcheck_budget": "gc_healthcheck_budget", "healthcheck_max_fanout": "gc_healthcheck_max_fanout",
+    "aggregate_cidr": "gc_aggregate_cidr", "compile_rules": "gc_compile_rules", "mirror_rules": "gc_mirror_rules",
+    "mirror_url": "gc_mirror_url", "convert_rules": "gc_convert_rules",
+}
+
+
+def sync_workspace():
+    """
+    同一工作区可能同时在多个会话 (浏览器标签页) 中打开。工作区版本号变化时重新读取节点、规则与设置，
+    之后的写入基于最新内容；整页运行与各片段运行开始时调用。
+    """
+    version = workspace_store.version(workspace)
+    if version == st.session_state.workspace_version:
+        return
+    st.session_state.workspace_version = version
+    st.session_state.node_store.refresh()
+    st.session_state.custom_rules = workspace_store.load_rules(workspace)
+    st.session_state.custom_rule_providers = workspace_store.load_providers(workspace)
+    global_config = workspace_store.load_global_config(workspace, DEFAULT_GLOBAL_CONFIG)
+    for key, value in global_config.items():
+        if st.session_state.global_config.get(key) != value and key in GC_WIDGET_KEYS:
+            # 丢弃侧边栏控件的旧值，下次渲染时按新的设置创建
+            st.session_state.pop(GC_WIDGET_KEYS[key], None)
+    st.session_state.global_config = global_config
+    st.session_state.saved_target_mode = workspace_store.load_settings(workspace).get("target_mode")
+
+sync_workspace()
+
+def add_imported_proxies(input_proxies, tag_of=None):
+    """导入节点列表：按指纹去重，名称冲突自动重命名。tag_of(proxy) 返回节点来源标签"""
+    added, skipped = [], []
+    # 整批导入在一个事务中写入工作区
+    with st.session_state.node_store.batch():
+        for proxy in input_proxies:
+            if not isinstance(proxy, dict):
+                continue
+            name = st.session_state.node_store.add(proxy, tag=tag_of(proxy) if tag_of else None)
+            if name is None:
+                skipped.append(proxy)
+            else:
+                added.append(name)
+    if skipped:
+        preview = "、".join(f"'{p.get('name', '')}'" for p in skipped[:5])
+        more = f" 等 {len(skipped)} 个" if len(skipped) > 5 else ""
+        st.warning(f"节点 {preview}{more}已存在，跳过重复添加")
+    st.success(f"成功添加 {len(added)} 个新节点！")
+
+
+def rerun_fragment():
+    """
+    只重新运行当前片段。片段内的操作通常触发片段单独运行；
+    若该操作被合并进整页运行 (或在 AppTest 中)，此时不允许片段级重新运行，改为整页重新运行。
+    """
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+
+def rule_targets(target_mode):
+    """
+    分流规则页各片段共用的目标策略组列表 (策略组名称 + DIRECT / REJECT / Proxy)。
+    结果记在 session state 中，以节点存储的版本标识与其余输入 (体积很小) 的内容哈希为键，
+    片段单独运行时不必遍历全部节点。
+    """
+    node_key = st.session_state.node_store.cache_key()
+    key = content_hash(st.session_state.global_config, st.session_state.custom_rules,
+                       st.session_state.custom_rule_providers, target_mode)
+    cached = st.session_state.get("rule_targets_cache")
+    if cached and cached[0] == node_key and cached[1] == key:
+        return cached[2]
+    try:
+        preview_config = build_config_cached(
+            st.session_state.global_config,
+            st.session_state.node_store,
+            st.session_state.custom_rules,
+            st.session_state.custom_rule_providers,
+            target_mode,
+            rule_type=RULE_TYPE_LHIE1,
+            cache_key=(node_key, None, None)
+        )
+        proxy_groups = preview_config["proxy-groups"]
+    except Exception:
+        proxy_groups = []
+    all_groups = [group['name'] for group in proxy_groups]
+    all_groups.extend(['DIRECT', 'REJECT', 'Proxy'])
+    all_groups = list(set(all_groups))
+    st.session_state.rule_targets_cache = (node_key, key, all_groups)
+    return all_groups
+
+
 
 # ==========================================
 # 2. 侧边栏：认证 + 高级全局设置
 # ==========================================
-with st.sidebar:
-    st.header("全局设置")
-    
-    # 目标环境选择
-    st.info("💡 **请根据您的使用场景选择模式**")
-    target_mode = st.radio(
-        "生成模式", 
-        ("全平台客户端 (PC/移动端)", "OpenClash / 软路由"),
-        index=0,
-        horizontal=True,
-        help="全平台客户端：适用于 Windows, macOS, Android, iOS 等独立运行的客户端，生成包含 TUN、DNS 的完整配置。\nOpenClash：精简配置，仅生成节点和策略，基础设置由插件接管。"
-    )
-    is_desktop = target_mode == "全平台客户端 (PC/移动端)"
-
+# 生成模式影响所有标签页，切换时整页重新运行；其余设置位于片段中，修改时只重新运行侧边栏。
+# 设置写入 session state 与工作区，各标签页在下次整页运行或点击生成时读取。
+@st.fragment
+def global_settings(is_desktop):
+    """侧边栏的全局设置 (片段)"""
+    sync_workspace()
     # --- 基础入站设置 ---
     if is_desktop:
         with st.expander("📡 端口与基础设置", expanded=False):
@@ -345,7 +348,7 @@ with st.sidebar:
                         if "gc_dns_boot" in st.session_state: st.session_state["gc_dns_boot"] = ""
                         if "gc_dns_main" in st.session_state: st.session_state["gc_dns_main"] = "223.5.5.5\n114.114.114.114"
                         if "gc_dns_fallback" in st.session_state: st.session_state["gc_dns_fallback"] = "8.8.8.8\n1.1.1.1"
-                        st.rerun()
+                        rerun_fragment()
 
                 with d_col2:
                     if st.button("路由器/本地", help="使用 dhcp:// 或本地网关，适用于 OpenClash/路由器环境。", use_container_width=True):
@@ -356,7 +359,7 @@ with st.sidebar:
                         if "gc_dns_boot" in st.session_state: st.session_state["gc_dns_boot"] = ""
                         if "gc_dns_main" in st.session_state: st.session_state["gc_dns_main"] = 'dhcp://"pppoe-wan"\ndhcp://"eth0"\n223.5.5.5'
                         if "gc_dns_fallback" in st.session_state: st.session_state["gc_dns_fallback"] = ""
-                        st.rerun()
+                        rerun_fragment()
 
                 default_nameserver = st.text_area("Bootstrap DNS (默认)", value=st.session_state.global_config["default_nameserver"], height=68,
                                                   help="用于解析 DoH/DoT 域名的传统 DNS 服务器。", key="gc_dns_boot")
@@ -414,54 +417,134 @@ with st.sidebar:
         
         sniff_override = st.checkbox("嗅探覆盖目标", value=st.session_state.global_config["sniff_override_dest"], 
                                      help="使用嗅探到的域名覆盖目标 IP，主要用于 Fake-IP 模式。", key="gc_sniff_override")
-
-# 更新 Session State
-updated_secret = st.session_state.get('gc_secret', st.session_state.global_config["secret"])
-st.session_state.global_config.update({
-    "port": port, "socks_port": socks_port, "mixed_port": mixed_port,
-    "allow_lan": allow_lan, "bind_address": bind_address, "mode": mode,
-    "log_level": log_level, "ipv6_support": ipv6_support,
-    "external_controller": external_controller, "secret": updated_secret,
-    "keep_alive_interval": keep_alive, "tcp_concurrent": tcp_concurrent,
-    "enable_tun": enable_tun, "unified_delay": unified_delay, "find_process_mode": find_process_mode,
-    "geodata_mode": geodata_mode, "enable_sniffer": enable_sniffer, "sniff_override_dest": sniff_override
-})
-
-if enable_dns:
-    # 尝试解析 nameserver_policy
-    dns_policy_dict = {}
-    if enable_dns and 'nameserver_policy' in locals(): # 确保变量存在
-        try:
-            raw_policy = nameserver_policy.strip()  # 使用上面定义的 nameserver_policy 变量
-            if raw_policy:
-                # 简单解析：每行作为一个条目，这里存为字符串，在生成时再处理
-                st.session_state.global_config["nameserver_policy"] = raw_policy
-        except Exception:
-             st.session_state.global_config["nameserver_policy"] = ""
-
+        
+        compact_groups = st.checkbox("精简策略组 (include-all)", value=st.session_state.global_config.get("compact_groups", False), 
+                                     help="策略组使用 include-all-proxies 自动纳入全部节点，不再逐个列出节点名。节点较多时可大幅减小配置体积和路由器解析时间。", key="gc_compact_groups")
+
+        region_groups = st.checkbox("按地区分组节点", value=st.session_state.global_config.get("region_groups", False),
+                                    help="根据节点名称识别地区 (香港 / 台湾 / 日本 / 美国 ...)，为每个地区生成自动测速组，应用与流媒体分组改为引用地区组，只直接列出无法识别地区的节点。节点较多时大幅缩短策略组的成员列表。", key="gc_region_groups")
+
+        skip_unreachable = st.checkbox("自动测速排除不可达节点", value=st.session_state.global_config.get("skip_unreachable", False),
+                                       help="根据「节点管理」中最近一次连通性探测的结果，将 TCP 连接或 TLS 握手失败的节点排除在 Auto - UrlTest 之外，路由器不再对失效节点做健康检查。未探测的节点与 UDP 协议节点不受影响。", key="gc_skip_unreachable")
+
+        healthcheck_budget = st.number_input("健康检查预算 (次/分钟)", value=int(st.session_state.global_config.get("healthcheck_budget", 0)),
+                                             min_value=0, step=10, key="gc_healthcheck_budget",
+                                             help="每台路由器的测速组 (url-test / fallback) 探测频率上限，0 为不限制。超出时为测速组开启 lazy、截断成员过多的组并按比例延长 interval。")
+        healthcheck_max_fanout = st.number_input("单个测速组节点上限", value=int(st.session_state.global_config.get("healthcheck_max_fanout", 64)),
+                                                 min_value=1, step=8, key="gc_healthcheck_max_fanout", disabled=not healthcheck_budget,
+                                                 help="设置预算后，显式列出节点的测速组最多保留的节点数；有探测结果时优先保留可达且延迟最低的节点。")
+
+        drop_shadowed_rules = st.checkbox("移除被遮蔽的规则", value=st.session_state.global_config.get("drop_shadowed_rules", False),
+                                          help="自动删除永远不会生效的规则 (如已被前面的 DOMAIN-SUFFIX / IP-CIDR / MATCH 覆盖)，缩短路由器逐条匹配的规则列表。", key="gc_drop_shadowed")
+
+        aggregate_cidr = st.checkbox("聚合 IP-CIDR 规则", value=st.session_state.global_config.get("aggregate_cidr", False),
+                                     help="将目标相同的连续 IP-CIDR / IP-CIDR6 规则中重叠、相邻的网段合并为最少的前缀，匹配结果不变。上传的 ipcidr 规则集文件同样聚合后保存。", key="gc_aggregate_cidr")
+
+        compile_rules = st.checkbox("编译自定义规则为规则集", value=st.session_state.global_config.get("compile_rules", False),
+                                    help="将目标相同的连续 DOMAIN / DOMAIN-SUFFIX / IP-CIDR 规则合并为 ruleset/ 下的规则集文件，并替换为一条 RULE-SET。内核对规则集使用索引查找，大量规则时显著降低路由器的匹配开销。开启本地规则集镜像时路由器从镜像服务地址的 /ruleset/ 拉取这些文件，否则须自行将 ruleset/ 复制到客户端。", key="gc_compile_rules")
+
+        mirror_rules = st.checkbox("使用本地规则集镜像 (lhie1)", value=st.session_state.global_config.get("mirror_rules", False),
+                                   help="lhie1 规则集改为从本服务的 API (/ruleset/) 拉取，路由器启动时不再依赖 CDN。尚未同步的规则集会被重定向到上游。", key="gc_mirror_rules")
+        mirror_url = st.text_input("镜像服务地址", value=st.session_state.global_config.get("mirror_url", ""),
+                                   help="路由器可以访问到的 API 地址，默认取环境变量 HOST_URL。", key="gc_mirror_url",
+                                   disabled=not mirror_rules)
+        if st.button("🔄 同步规则集镜像", key="sync_rule_mirror"):
+            with st.spinner("正在并发下载 lhie1 规则集..."):
+                mirror_results = mirror_providers()
+            mirror_failed = [r for r in mirror_results if r["status"] == "error"]
+            mirror_updated = sum(1 for r in mirror_results if r["status"] == "updated")
+            st.success(f"同步完成: {len(mirror_results)} 个规则集，更新 {mirror_updated}，失败 {len(mirror_failed)}")
+            for r in mirror_failed:
+                st.error(f"{r['name']}: {r['error']}")
+
+        convert_rules = st.checkbox("拆分 classical 规则集", value=st.session_state.global_config.get("convert_rules", False),
+                                    help="将已转换的 classical 规则集 (镜像的 lhie1 规则集与上传的文件) 拆分为 domain / ipcidr / classical 三个规则集。内核对 domain / ipcidr 使用字典树 / 集合查找，显著降低路由器的 CPU 与内存占用。", key="gc_convert_rules")
+        if st.button("🧩 转换规则集", key="convert_rule_providers"):
+            with st.spinner("正在拆分规则集..."):
+                convert_plan, convert_results = convert_sources(
+                    mirror_sources() + custom_sources(st.session_state.custom_rule_providers))
+            convert_failed = [r for r in convert_results if r["status"] == "error"]
+            convert_counts = {"domain": 0, "ipcidr": 0, "classical": 0}
+            for r in convert_results:
+                for part in convert_plan.get(r["source"], {}).get("parts", []):
+                    convert_counts[part["behavior"]] += part["count"]
+            st.success(f"转换完成: {len(convert_results)} 个规则集，失败 {len(convert_failed)}；"
+                       f"domain {convert_counts['domain']} / ipcidr {convert_counts['ipcidr']} / classical {convert_counts['classical']} 条")
+            for r in convert_failed:
+                st.error(f"{r['source']}: {r['error']}")
+
+    # 更新 Session State
+    updated_secret = st.session_state.get('gc_secret', st.session_state.global_config["secret"])
     st.session_state.global_config.update({
-        "dns_listen": dns_listen, "enhanced_mode": enhanced_mode,
-        "fake_ip_range": fake_ip_range, "default_nameserver": default_nameserver,
-        "nameserver": nameserver, "fallback": fallback
+        "port": port, "socks_port": socks_port, "mixed_port": mixed_port,
+        "allow_lan": allow_lan, "bind_address": bind_address, "mode": mode,
+        "log_level": log_level, "ipv6_support": ipv6_support,
+        "external_controller": external_controller, "secret": updated_secret,
+        "keep_alive_interval": keep_alive, "tcp_concurrent": tcp_concurrent,
+        "enable_tun": enable_tun, "unified_delay": unified_delay, "find_process_mode": find_process_mode,
+        "geodata_mode": geodata_mode, "enable_sniffer": enable_sniffer, "sniff_override_dest": sniff_override,
+        "compact_groups": compact_groups, "region_groups": region_groups, "skip_unreachable": skip_unreachable,
+        "healthcheck_budget": healthcheck_budget, "healthcheck_max_fanout": healthcheck_max_fanout, "drop_shadowed_rules": drop_shadowed_rules,
+        "aggregate_cidr": aggregate_cidr, "compile_rules": compile_rules,
+        "mirror_rules": mirror_rules, "mirror_url": mirror_url, "convert_rules": convert_rules
     })
-else:
-    # 即使关闭 DNS，也要确保 key 存在防止报错
-    if "nameserver_policy" not in st.session_state.global_config:
-        st.session_state.global_config["nameserver_policy"] = ""
 
-if enable_tun:
-    st.session_state.global_config.update({
-        "tun_stack": tun_stack, "tun_device": tun_device,
-        "tun_auto_route": tun_auto_route, "tun_auto_detect_interface": tun_auto_detect_interface,
-        "tun_dns_hijack": tun_dns_hijack
-    })
+    if enable_dns:
+        # 尝试解析 nameserver_policy
+        dns_policy_dict = {}
+        if enable_dns and 'nameserver_policy' in locals(): # 确保变量存在
+            try:
+                raw_policy = nameserver_policy.strip()  # 使用上面定义的 nameserver_policy 变量
+                if raw_policy:
+                    # 简单解析：每行作为一个条目，这里存为字符串，在生成时再处理
+                    st.session_state.global_config["nameserver_policy"] = raw_policy
+            except Exception:
+                 st.session_state.global_config["nameserver_policy"] = ""
+
+        st.session_state.global_config.update({
+            "dns_listen": dns_listen, "enhanced_mode": enhanced_mode,
+            "fake_ip_range": fake_ip_range, "default_nameserver": default_nameserver,
+            "nameserver": nameserver, "fallback": fallback
+        })
+    else:
+        # 即使关闭 DNS，也要确保 key 存在防止报错
+        if "nameserver_policy" not in st.session_state.global_config:
+            st.session_state.global_config["nameserver_policy"] = ""
 
-if enable_dns:
-    st.session_state.global_config.update({
-        "dns_listen": dns_listen, "enhanced_mode": enhanced_mode,
-        "fake_ip_range": fake_ip_range, "default_nameserver": default_nameserver,
-        "nameserver": nameserver, "fallback": fallback
-    })
+    if enable_tun:
+        st.session_state.global_config.update({
+            "tun_stack": tun_stack, "tun_device": tun_device,
+            "tun_auto_route": tun_auto_route, "tun_auto_detect_interface": tun_auto_detect_interface,
+            "tun_dns_hijack": tun_dns_hijack
+        })
+
+    if enable_dns:
+        st.session_state.global_config.update({
+            "dns_listen": dns_listen, "enhanced_mode": enhanced_mode,
+            "fake_ip_range": fake_ip_range, "default_nameserver": default_nameserver,
+            "nameserver": nameserver, "fallback": fallback
+        })
+
+    # 设置写回工作区 (只写入有变化的项)
+    workspace_store.save_global_config(workspace, st.session_state.global_config)
+
+
+with st.sidebar:
+    st.header("全局设置")
+    
+    # 目标环境选择
+    st.info("💡 **请根据您的使用场景选择模式**")
+    target_mode = st.radio(
+        "生成模式", 
+        (TARGET_DESKTOP, TARGET_OPENCLASH),
+        index=1 if st.session_state.get("saved_target_mode") == TARGET_OPENCLASH else 0,
+        horizontal=True,
+        help="全平台客户端：适用于 Windows, macOS, Android, iOS 等独立运行的客户端，生成包含 TUN、DNS 的完整配置。\nOpenClash：精简配置，仅生成节点和策略，基础设置由插件接管。"
+    )
+    is_desktop = target_mode == TARGET_DESKTOP
+    workspace_store.save_settings(workspace, {"target_mode": target_mode})
+
+    global_settings(is_desktop)
 
 # ==========================================
 # 3. 主界面：节点录入 (完整功能)
@@ -486,159 +569,66 @@ with tab1:
     if import_method == "粘贴YAML":
         raw_yaml_input = st.text_area("粘贴 YAML 格式的节点列表", value=default_yaml.strip(), height=300, help="在此处粘贴YAML格式的节点列表")
     elif import_method == "订阅链接":
-        subscription_url = st.text_input("输入订阅链接", placeholder="https://example.com/subscribe/...", help="输入Base64编码的订阅链接")
+        subscription_urls = st.text_area("输入订阅链接 (每行一个)", placeholder="https://example.com/subscribe/...", height=120,
+                                         help="支持同时输入多个订阅链接，将并发获取并合并去重")
         raw_yaml_input = ""
-        if subscription_url:
-            try:
-                response = requests.get(subscription_url)
-                if response.status_code == 200:
-                    # 尝试解析响应为YAML/JSON格式
-                    try:
-                        import base64
-                        # 尝试作为Base64编码的订阅链接处理
-                        decoded_content = base64.b64decode(response.text).decode('utf-8')
-                        raw_yaml_input = decoded_content
-                    except:
-                        # 如果不是Base64，则直接使用响应内容
-                        raw_yaml_input = response.text
-                    st.success("订阅链接获取成功！")
+        subscription_store = None
+        url_list = [u.strip() for u in subscription_urls.split('\n') if u.strip()]
+        sub_cache = get_default_cache()
+        col_ttl, col_refresh = st.columns([3, 1])
+        with col_ttl:
+            # 有效期随本次请求传入，不修改进程内共享的缓存实例 (其他会话不受影响)
+            cache_ttl = st.number_input("订阅缓存有效期 (分钟)", value=sub_cache.ttl // 60, min_value=0, step=10,
+                                        key="sub_cache_ttl",
+                                        help="有效期内重复打开页面不会重新下载订阅；过期后先使用旧内容并在后台刷新。") * 60
+        with col_refresh:
+            st.write("")
+            st.write("")
+            if st.button("强制刷新", key="refresh_subscriptions", help="清除缓存并重新下载全部订阅"):
+                for u in url_list:
+                    sub_cache.invalidate(u)
+        if url_list:
+            with st.spinner(f"正在获取 {len(url_list)} 个订阅..."):
+                subscription_store, subscription_results = aggregate_subscriptions(
+                    url_list, cache=sub_cache, cache_ttl=cache_ttl)
+            cache_labels = {"fresh": "缓存", "stale": "缓存 (后台刷新中)", "fetched": "已下载"}
+            for result in subscription_results:
+                if result["error"]:
+                    st.error(f"获取订阅失败: {result['url']} ({result['error']})")
                 else:
-                    st.error(f"获取订阅链接失败: 状态码 {response.status_code}")
-            except Exception as e:
-                st.error(f"获取订阅链接失败: {e}")
+                    st.caption(f"✅ {result['url']}: {result['added']} 个节点 (重复 {result['duplicates']})，"
+                               f"{result['bytes'] / 1024:.1f} KB，{cache_labels.get(result['cache'], '')} {result['elapsed']:.2f} 秒")
+                    if result["node_errors"]:
+                        with st.expander(f"⚠️ {len(result['node_errors'])} 个节点解析失败，已跳过"):
+                            for fragment, err in result["node_errors"][:50]:
+                                st.text(f"{fragment}  ->  {err}")
+            if subscription_store:
+                st.success(f"订阅链接获取成功！合并后共 {len(subscription_store)} 个节点")
     else:  # 分享链接
-        share_link = st.text_input("输入分享链接", placeholder="ss://, trojan://, vmess:// 等分享链接", help="输入ss://, trojan://, vmess://等分享链接")
+        share_text = st.text_area("输入分享链接 (每行一个)", placeholder="ss://, vmess://, vless://, trojan://, hysteria2:// 等分享链接",
+                                  height=150, help=f"支持一次粘贴大量链接，支持的协议: {', '.join(supported_schemes())}")
         raw_yaml_input = ""
-        if share_link:
-            try:
-                # 解析分享链接并转换为 YAML 格式
-                from urllib.parse import unquote, urlparse
-                import base64
-                
-                parsed = urlparse(share_link)
-                protocol = parsed.scheme
-                
-                if protocol == 'ss':
-                    # 解析Shadowsocks链接
-                    data = unquote(parsed.netloc + parsed.path)
-                    if '@' in data:
-                        # AEAD格式: method:password@server:port
-                        method_password, server_port = data.split('@')
-                        method, password = method_password.split(':', 1)
-                        server, port = server_port.split(':', 1)
-                        
-                        proxy = {
-                            "name": f"SS-{server}",
-                            "type": "ss",
-                            "server": server,
-                            "port": int(port),
-                            "cipher": method,
-                            "password": password
-                        }
-                    else:
-                        # 旧格式: base64(method:password)@server:port
-                        encoded, server_port = data.split('@')
-                        decoded = base64.b64decode(encoded + '=' * (4 - len(encoded) % 4)).decode()
-                        method, password = decoded.split(':', 1)
-                        server, port = server_port.split(':', 1)
-                        
-                        proxy = {
-                            "name": f"SS-{server}",
-                            "type": "ss",
-                            "server": server,
-                            "port": int(port),
-                            "cipher": method,
-                            "password": password
-                        }
-                    
-                    raw_yaml_input = yaml.dump([proxy], default_flow_style=False, allow_unicode=True)
-                    st.success("Shadowsocks链接解析成功！")
-                
-                elif protocol == 'trojan':
-                    # 解析Trojan链接
-                    password_and_host = parsed.netloc
-                    password, host = password_and_host.split('@', 1)
-                    server, port_str = host.split(':', 1) if ':' in host else (host, '443')
-                    port = int(port_str)
-                    
-                    # 解析查询参数
-                    query_params = {}
-                    if parsed.query:
-                        for param in parsed.query.split('&'):
-                            key, value = param.split('=', 1) if '=' in param else (param, '')
-                            query_params[key] = unquote(value)
-                    
-                    proxy = {
-                        "name": f"Trojan-{server}",
-                        "type": "trojan",
-                        "server": server,
-                        "port": port,
-                        "password": unquote(password)
-                    }
-                    
-                    if 'sni' in query_params:
-                        proxy["sni"] = query_params['sni']
-                    if 'alpn' in query_params:
-                        proxy["alpn"] = query_params['alpn'].split(',')
-                    if 'skip-cert-verify' in query_params:
-                        proxy["skip-cert-verify"] = query_params['skip-cert-verify'].lower() == 'true'
-                    
-                    raw_yaml_input = yaml.dump([proxy], default_flow_style=False, allow_unicode=True)
-                    st.success("Trojan链接解析成功！")
-                
-                elif protocol == 'vmess':
-                    # 解析VMess链接
-                    try:
-                        # VMess链接是base64编码的JSON
-                        decoded = base64.b64decode(share_link[8:])  # 移除"vmess://"前缀
-                        vmess_info = json.loads(decoded.decode())
-                        
-                        proxy = {
-                            "name": vmess_info.get("ps", f"VMess-{vmess_info.get('add', 'server')}"),
-                            "type": "vmess",
-                            "server": vmess_info.get("add", "server"),
-                            "port": int(vmess_info.get("port", 443)),
-                            "uuid": vmess_info.get("id", ""),
-                            "alterId": int(vmess_info.get("aid", 0)),
-                            "cipher": vmess_info.get("scy", "auto")
-                        }
-                        
-                        # 根据network类型设置传输协议
-                        net_type = vmess_info.get("net", "tcp")
-                        proxy["network"] = net_type
-                        
-                        # TLS设置
-                        if vmess_info.get("tls", "") == "tls":
-                            proxy["tls"] = True
-                        
-                        # 根据传输协议添加额外选项
-                        if net_type == "ws":
-                            ws_opts = {}
-                            if "path" in vmess_info:
-                                ws_opts["path"] = vmess_info["path"]
-                            if "host" in vmess_info:
-                                ws_opts["headers"] = {"Host": vmess_info["host"]}
-                            proxy["ws-opts"] = ws_opts
-                        elif net_type == "h2":
-                            if "path" in vmess_info:
-                                proxy["h2-opts"] = {"path": vmess_info["path"]}
-                        
-                        raw_yaml_input = yaml.dump([proxy], default_flow_style=False, allow_unicode=True)
-                        st.success("VMess链接解析成功！")
-                    except Exception as e:
-                        st.error(f"VMess链接解析失败: {e}")
-                
-                else:
-                    st.error(f"不支持的协议类型: {protocol}")
-                    
-            except Exception as e:
-                st.error(f"分享链接解析失败: {e}")
+        share_proxies = []
+        if share_text.strip():
+            # 解析结果按文本哈希记在 session state 中，文本不变时其他控件引起的重新运行不再重复解析
+            digest = hashlib.sha256(share_text.encode("utf-8")).hexdigest()
+            cached = st.session_state.get("share_links_cache")
+            if not cached or cached[0] != digest:
+                cached = (digest, *parse_links(share_text.splitlines()))
+                st.session_state.share_links_cache = cached
+            _, share_proxies, share_errors = cached
+            if share_proxies:
+                st.success(f"成功解析 {len(share_proxies)} 个节点")
+            if share_errors:
+                with st.expander(f"⚠️ {len(share_errors)} 条链接解析失败，已跳过"):
+                    for link, err in share_errors[:50]:
+                        st.text(f"{link[:80]}  ->  {err}")
 
     # 添加导入按钮
     if st.button("导入节点", key="import_proxies", help="导入当前输入的节点"):
         if import_method == "粘贴YAML" and raw_yaml_input:
             try:
-                input_proxies = yaml.safe_load(raw_yaml_input)
+                input_proxies = yaml_io.load(raw_yaml_input)
             except Exception as e:
                 # 尝试自动修复缩进问题 (处理常见的复制粘贴导致的子项缩进过深)
                 try:
@@ -675,64 +665,28 @@ with tab1:
                             fixed_lines.append(line)
                             
                     fixed_yaml = '\n'.join(fixed_lines)
-                    input_proxies = yaml.safe_load(fixed_yaml)
+                    input_proxies = yaml_io.load(fixed_yaml)
                     st.warning("⚠️ 检测到 YAML 缩进格式异常，已尝试自动修复。")
                 except:
                     st.error(f"YAML 解析错误: {e}")
                     input_proxies = None
 
             if input_proxies and isinstance(input_proxies, list):
-                    # 检查是否有重复节点
-                    new_proxies = []
-                    for proxy in input_proxies:
-                        if proxy not in st.session_state.proxies_data:
-                            new_proxies.append(proxy)
-                        else:
-                            st.warning(f"节点 '{proxy['name']}' 已存在，跳过重复添加")
-                    
-                    st.session_state.proxies_data.extend(new_proxies)
-                    st.success(f"成功添加 {len(new_proxies)} 个新节点！")
+                    add_imported_proxies(input_proxies)
             elif input_proxies is not None:
                     st.error("YAML 格式错误：必须是一个列表 (以 - 开头)")
 
-        elif import_method == "订阅链接" and raw_yaml_input:
-            try:
-                input_proxies = yaml.safe_load(raw_yaml_input)
-                if isinstance(input_proxies, list):
-                    # 检查是否有重复节点
-                    new_proxies = []
-                    for proxy in input_proxies:
-                        if proxy not in st.session_state.proxies_data:
-                            new_proxies.append(proxy)
-                        else:
-                            st.warning(f"节点 '{proxy['name']}' 已存在，跳过重复添加")
-                    
-                    st.session_state.proxies_data.extend(new_proxies)
-                    st.success(f"成功添加 {len(new_proxies)} 个新节点！")
-                else:
-                    st.error("订阅链接解析错误：内容不是有效的YAML列表")
-            except Exception as e:
-                st.error(f"YAML 解析错误: {e}")
-        elif import_method == "分享链接" and raw_yaml_input:
-            try:
-                input_proxies = yaml.safe_load(raw_yaml_input)
-                if isinstance(input_proxies, list):
-                    # 检查是否有重复节点
-                    new_proxies = []
-                    for proxy in input_proxies:
-                        if proxy not in st.session_state.proxies_data:
-                            new_proxies.append(proxy)
-                        else:
-                            st.warning(f"节点 '{proxy['name']}' 已存在，跳过重复添加")
-                    
-                    st.session_state.proxies_data.extend(new_proxies)
-                    st.success(f"成功添加 {len(new_proxies)} 个新节点！")
-                else:
-                    st.error("分享链接解析错误：内容不是有效的YAML列表")
-            except Exception as e:
-                st.error(f"YAML 解析错误: {e}")
+        elif import_method == "订阅链接" and subscription_store:
+            add_imported_proxies(subscription_store.proxies,
+                                 tag_of=lambda p: subscription_store.tag_of(p["name"]))
+        elif import_method == "分享链接" and share_proxies:
+            add_imported_proxies(share_proxies)
 
-with tab2:
+
+@st.fragment
+def node_form():
+    """手动添加单个节点 (片段)：填写表单时只重新运行表单，添加成功后整页重新运行以刷新节点列表"""
+    sync_workspace()
     st.write("手动添加单个节点：")
     
     # 节点类型选择
@@ -951,7 +905,7 @@ with tab2:
     dialer_proxy_name = ""
     if use_dialer_proxy:
         # 获取现有的节点名称列表
-        existing_proxy_names = [p['name'] for p in st.session_state.proxies_data]
+        existing_proxy_names = st.session_state.node_store.names()
         if existing_proxy_names:
             dialer_proxy_name = st.selectbox("选择前置代理节点", existing_proxy_names, key=f"dialer_proxy_select_{node_type}", help="选择已添加的节点作为前置代理")
         else:
@@ -1120,54 +1074,139 @@ with tab2:
     # 添加手动节点按钮
     if st.button("添加节点", key=f"add_manual_node_{node_type}", help="将当前配置的节点添加到列表"):
         # 检查是否已存在相同的节点
-        if manual_node not in st.session_state.proxies_data:
-            st.session_state.proxies_data.append(manual_node)
-            st.success(f"节点 '{manual_node['name']}' 已添加！")
+        added_name = st.session_state.node_store.add(manual_node)
+        if added_name is None:
+            duplicate = st.session_state.node_store.find_duplicate(manual_node)
+            st.warning(f"节点 '{manual_node['name']}' 与已有节点 '{duplicate}' 重复，跳过添加")
         else:
-            st.warning(f"节点 '{manual_node['name']}' 已存在，跳过重复添加")
+            if added_name != manual_node["name"]:
+                st.session_state.node_notice = f"节点名称已被占用，已重命名为 '{added_name}' 并添加！"
+            else:
+                st.session_state.node_notice = f"节点 '{added_name}' 已添加！"
+            # 节点列表位于片段之外，整页重新运行以显示新节点
+            st.rerun()
+
+
+with tab2:
+    node_form()
 
     # 节点管理功能
     st.subheader("节点管理")
     
-    if not st.session_state.proxies_data:
+    if not st.session_state.node_store:
         st.warning("请先添加一些节点以管理")
     else:
-        # 显示所有节点并提供删除/修改功能
-        for idx, proxy in enumerate(st.session_state.proxies_data):
-            proxy_expander = st.expander(f"节点: {proxy['name']}", expanded=False)
-            with proxy_expander:
-                col_proxy_actions, col_proxy_type = st.columns([3, 1])
-                with col_proxy_actions:
-                    if st.button(f"删除节点 {proxy['name']}", key=f"delete_proxy_{idx}"):
-                        st.session_state.proxies_data.pop(idx)
-                        st.success(f"节点 {proxy['name']} 已删除")
-                        st.rerun()
-                with col_proxy_type:
-                    st.caption(f"类型: {proxy['type']}")
-                
-                # 显示节点详细信息
-                proxy_details = proxy.copy()
-                st.json(proxy_details)
-                
-                # 修改节点功能
-                if st.button(f"编辑节点 {proxy['name']}", key=f"edit_proxy_{idx}"):
-                    # 将节点信息存储到session state，以便在其他地方使用
-                    st.session_state.editing_proxy_idx = idx
+        # 连通性探测 (并发测量 TCP 连接与 TLS 握手耗时)
+        if st.button("📶 探测节点连通性", key="probe_proxies"):
+            with st.spinner("正在并发探测节点..."):
+                save_table(probe_proxies(st.session_state.node_store.proxies))
+        latency_table = load_table()
+        if latency_table:
+            # 统计结果以节点与延迟表的版本为键记在 session state 中，重新运行时不必遍历全部节点
+            probe_key = (st.session_state.node_store.cache_key(), table_version())
+            probe_cached = st.session_state.get("probe_summary_cache")
+            if probe_cached and probe_cached[0] == probe_key:
+                probe_counts = probe_cached[1]
+            else:
+                probe_counts = summarize(st.session_state.node_store.proxies, latency_table)
+                st.session_state.probe_summary_cache = (probe_key, probe_counts)
+            st.caption(f"最近一次探测: 可达 {probe_counts.get(STATUS_OK, 0)}，"
+                       f"不可达 {sum(probe_counts.get(s, 0) for s in DEAD_STATUSES)}，"
+                       f"UDP 未探测 {probe_counts.get(STATUS_SKIPPED, 0)}，未探测 {probe_counts.get(None, 0)}")
+
+        # 节点列表：按页显示为表格，组件数量与节点数无关；搜索使用 NodeStore 的索引
+        node_store = st.session_state.node_store
+        node_notice = st.session_state.pop("node_notice", None)
+        if node_notice:
+            st.success(node_notice)
+        col_search, col_page_size = st.columns([3, 1])
+        with col_search:
+            node_query = st.text_input(
+                "搜索节点", key="node_search", placeholder="如: 香港 type:vless",
+                help="按名称、类型、服务器与来源搜索，多个条件以空格分隔且须全部满足；"
+                     "「字段:文本」只在该字段中匹配 (name / type / server / tag)")
+        with col_page_size:
+            page_size = st.selectbox("每页显示", [25, 50, 100, 200], index=1, key="node_page_size")
+        matched_names = node_store.search(node_query)
+        page_count = max(1, -(-len(matched_names) // page_size))
+        # 页码只通过 session state 设置 (控件不再指定 value)；搜索结果变少时页码可能越界，先收回到最后一页
+        if "node_page" not in st.session_state:
+            st.session_state.node_page = 1
+        elif st.session_state.node_page > page_count:
+            st.session_state.node_page = page_count
+        page = st.number_input(f"页码 (共 {page_count} 页，匹配 {len(matched_names)} / {len(node_store)} 个节点)",
+                               min_value=1, max_value=page_count, step=1, key="node_page")
+        page_names = matched_names[(page - 1) * page_size:page * page_size]
+        # 读取本页节点时会移除刚被其他会话删除的节点
+        page_names = [name for name in page_names if node_store.get(name) is not None]
+
+        node_rows = []
+        for name in page_names:
+            proxy = node_store.get(name)
+            probe_entry = node_status(proxy, latency_table)
+            probe_text = ""
+            if probe_entry and probe_entry["status"] == STATUS_OK:
+                probe_text = f"{probe_entry['tcp_ms']}ms"
+            elif probe_entry and probe_entry["status"] in DEAD_STATUSES:
+                probe_text = "❌ 不可达"
+            elif probe_entry and probe_entry["status"] == STATUS_SKIPPED:
+                probe_text = "UDP"
+            node_rows.append({
+                "名称": name, "类型": str(proxy.get("type", "")), "服务器": str(proxy.get("server", "")),
+                "端口": str(proxy.get("port", "")), "来源": node_store.tag_of(name) or "", "探测": probe_text,
+            })
+        # 表格的选择状态随 key 保存；翻页、搜索或删除后换用新的 key，避免沿用其他行的选择
+        node_table_key = "node_table_{}_{}_{}_{}".format(
+            st.session_state.get("node_table_generation", 0), page, page_size, node_query)
+        node_table = st.dataframe(node_rows, key=node_table_key, on_select="rerun", selection_mode="multi-row",
+                                  use_container_width=True, hide_index=True)
+        selected_names = [page_names[i] for i in node_table.selection.rows if i < len(page_names)]
+
+        col_delete_selected, col_delete_matched = st.columns(2)
+        with col_delete_selected:
+            if st.button(f"🗑️ 删除选中的 {len(selected_names)} 个节点", key="delete_selected_proxies",
+                         disabled=not selected_names, use_container_width=True):
+                removed = node_store.remove_many(selected_names)
+                st.session_state.node_notice = f"已删除 {len(removed)} 个节点"
+                st.session_state.node_table_generation = st.session_state.get("node_table_generation", 0) + 1
+                st.rerun()
+        with col_delete_matched:
+            if st.button(f"🗑️ 删除全部 {len(matched_names)} 个搜索结果", key="delete_matched_proxies",
+                         disabled=not node_query.strip() or not matched_names, use_container_width=True,
+                         help="删除与搜索条件匹配的全部节点 (不限当前页)"):
+                removed = node_store.remove_many(list(matched_names))
+                st.session_state.node_notice = f"已删除 {len(removed)} 个节点"
+                st.session_state.node_table_generation = st.session_state.get("node_table_generation", 0) + 1
+                st.rerun()
+
+        # 只选中一个节点时显示详情与编辑入口
+        if len(selected_names) == 1:
+            proxy = node_store.get(selected_names[0])
+            probe_entry = node_status(proxy, latency_table)
+            with st.expander(f"节点: {proxy['name']}", expanded=True):
+                if probe_entry and probe_entry.get("error"):
+                    st.caption(f"探测结果: {probe_entry['error']}")
+                elif probe_entry and probe_entry.get("tls_ms") is not None:
+                    st.caption(f"探测结果: TCP {probe_entry['tcp_ms']}ms / TLS {probe_entry['tls_ms']}ms")
+                st.json(proxy)
+                if st.button(f"编辑节点 {proxy['name']}", key="edit_selected_proxy"):
+                    # 将节点信息存储到session state，以便在下方编辑
+                    st.session_state.editing_proxy_name = proxy['name']
                     st.session_state.editing_proxy_data = proxy.copy()
-                    st.info(f"正在编辑节点 {proxy['name']}，请修改参数后点击'添加节点'按钮保存")
-        
+                    st.info(f"正在编辑节点 {proxy['name']}，请在下方修改后点击'保存修改'")
+
         st.markdown("---")
         
         # 检查是否有正在编辑的节点
-        if 'editing_proxy_idx' in st.session_state and 'editing_proxy_data' in st.session_state:
-            editing_idx = st.session_state.editing_proxy_idx
+        if 'editing_proxy_name' in st.session_state and 'editing_proxy_data' in st.session_state:
+            editing_name = st.session_state.editing_proxy_name
             editing_data = st.session_state.editing_proxy_data
             
             st.subheader("编辑节点")
             st.info(f"正在编辑节点: {editing_data['name']}")
             
             # 将节点数据转换为YAML格式
-            yaml_data = yaml.dump([editing_data], default_flow_style=False, allow_unicode=True)
+            yaml_data = yaml_io.dump([editing_data], sort_keys=True)
             
             # 允许用户编辑YAML格式的节点配置
             updated_yaml = st.text_area("编辑节点配置 (YAML格式)", value=yaml_data, height=300)
@@ -1175,21 +1214,24 @@ with tab2:
             if st.button("保存修改"):
                 try:
                     # 解析YAML格式的节点配置
-                    updated_data = yaml.safe_load(updated_yaml)
+                    updated_data = yaml_io.load(updated_yaml)
                     if isinstance(updated_data, list) and len(updated_data) > 0:
                         updated_proxy = updated_data[0]
                         
                         # 验证必要的字段
                         if 'name' in updated_proxy and 'type' in updated_proxy and 'server' in updated_proxy and 'port' in updated_proxy:
                             # 更新节点信息
-                            st.session_state.proxies_data[editing_idx] = updated_proxy
-                            
-                            # 清除编辑状态
-                            del st.session_state.editing_proxy_idx
-                            del st.session_state.editing_proxy_data
-                            
-                            st.success("节点信息已更新")
-                            st.rerun()
+                            try:
+                                st.session_state.node_store.replace(editing_name, updated_proxy)
+                            except (KeyError, ValueError) as e:
+                                st.error(f"节点更新失败: {e}")
+                            else:
+                                # 清除编辑状态
+                                del st.session_state.editing_proxy_name
+                                del st.session_state.editing_proxy_data
+                                
+                                st.success("节点信息已更新")
+                                st.rerun()
                         else:
                             st.error("YAML格式错误：节点配置缺少必要的字段 (name, type, server, port)")
                     else:
@@ -1197,253 +1239,225 @@ with tab2:
                 except Exception as e:
                     st.error(f"YAML解析错误: {e}")
 
+
+@st.fragment
+def rules_editor(target_mode):
+    """自定义规则的添加与列表 (片段)"""
+    sync_workspace()
+    # ==========================
+    # 2. 可视化规则编辑 
+    # ==========================
+    st.subheader("可视化规则编辑")
+
+    # 获取所有策略组名称用于下拉菜单
+    all_groups = rule_targets(target_mode)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.write("**规则类型**")
+        rule_select = st.selectbox("选择规则类型", 
+                                 ["DOMAIN-SUFFIX", "DOMAIN", "DOMAIN-KEYWORD", "IP-CIDR", "GEOIP", "MATCH"],
+                                 key="rule_type_select_v3")
+    with col2:
+        st.write("**目标策略**")
+        # 增加自定义组输入
+        group_options = ["选择现有策略组...", "手动输入..."] + all_groups
+        group_mode = st.selectbox("选择目标策略组模式", ["从列表中选择", "手动输入名称"], label_visibility="collapsed", key="group_mode_select")
+
+        if group_mode == "从列表中选择":
+            group_select = st.selectbox("选择目标策略组", all_groups, key="target_group_select_v3")
+            final_group = group_select
+        else:
+            custom_group_input = st.text_input("输入策略组名称", placeholder="例如: MyGroup", key="custom_group_input_v3")
+            final_group = custom_group_input
+
+    rule_value = ""
+    if rule_select not in ["MATCH"]:
+        rule_value = st.text_input("输入值 (域名/IP/国家代码)", placeholder="例如: google.com", key="rule_value_input_v3")
+
+    # 添加规则按钮
+    if st.button("➕ 添加规则", key="add_rule_v3"):            
+        if not final_group:
+             st.error("请选择或输入目标策略组")
+        elif rule_select != "MATCH" and not rule_value:
+             st.error("请输入规则值")
+        else:
+            new_rule = f"{rule_select},{rule_value},{final_group}" if rule_select != "MATCH" else f"{final_group},{final_group}"
+            if new_rule not in st.session_state.custom_rules:
+                st.session_state.custom_rules.append(new_rule)
+                workspace_store.add_rules(workspace, [new_rule])
+                st.success(f"规则已添加: {new_rule}")
+            else:
+                st.warning("该规则已存在")
+
+    with st.expander("📋 批量添加规则 (每行一条)", expanded=False):
+        bulk_rules = st.text_area("粘贴规则", placeholder="DOMAIN-SUFFIX,example.com,Proxy\nIP-CIDR,1.2.3.0/24,DIRECT,no-resolve",
+                                  height=150, key="bulk_rules_input")
+        if st.button("➕ 批量添加", key="add_bulk_rules"):
+            existing = set(st.session_state.custom_rules)
+            new_rules = []
+            for line in bulk_rules.splitlines():
+                line = line.strip()
+                if line and not line.startswith("#") and line not in existing:
+                    existing.add(line)
+                    new_rules.append(line)
+            st.session_state.custom_rules.extend(new_rules)
+            workspace_store.add_rules(workspace, new_rules)
+            st.success(f"已添加 {len(new_rules)} 条规则")
+
+    # 自定义规则列表展示 (移至此处)
+    if st.session_state.custom_rules:
+        st.subheader(f"已添加的自定义规则 ({len(st.session_state.custom_rules)})")
+        for i, rule in enumerate(st.session_state.custom_rules):
+            col_rule, col_action = st.columns([4, 1])
+            with col_rule:
+                st.text(f"{i+1}. {rule}")
+            with col_action:
+                # 按规则内容而不是序号区分按钮：其他会话增删规则后序号会变化
+                if st.button(f"🗑️", key=f"delete_custom_rule_{rule}", help="删除此规则"):
+                    st.session_state.custom_rules.remove(rule)
+                    workspace_store.delete_rule(workspace, rule)
+                    rerun_fragment()
+
+
+@st.fragment
+def rule_provider_editor(target_mode):
+    """规则集的添加与列表 (片段)"""
+    sync_workspace()
+    all_groups = rule_targets(target_mode)
+
+    # ==========================
+    # 3. 编辑规则集配置 (Rule Providers)
+    # ==========================
+    st.subheader("编辑规则集配置 (Rule Providers)")
+    st.caption("规则集使用介绍: https://wiki.metacubex.one/config/rule-providers/content/")
+
+    with st.expander("➕ 添加新规则集", expanded=True):
+        # 配置文件选项移除，默认全部
+        rp_name = st.text_input("别名 (请勿重名)", placeholder="Rule-provider - " + str(uuid.uuid4())[:8], key="rp_name")
+
+        col_rp1, col_rp2 = st.columns(2)
+        with col_rp1:
+            rp_type = st.selectbox("规则集类型", ["http", "file"], key="rp_type")
+            rp_behavior = st.selectbox("规则类型", ["domain", "ipcidr", "classical"], key="rp_behavior")
+        with col_rp2:
+            rp_format = st.selectbox("规则格式", ["yaml", "text"], key="rp_format")
+            rp_interval = st.number_input("规则集更新时间 (秒)", value=86400, key="rp_interval")
+
+        rp_path_or_url = ""
+        if rp_type == "http":
+            rp_url = st.text_input("规则集地址", placeholder="http://...", key="rp_url")
+            # 连通性测试按钮
+            if rp_url:
+                if st.button("测试链接可用性", key="test_rp_url"):
+                     try:
+                         resp = requests.head(rp_url, timeout=5)
+                         if resp.status_code == 200:
+                             st.success("✅ 链接可用")
+                         else:
+                             st.warning(f"⚠️ 链接返回状态码: {resp.status_code}")
+                     except Exception as e:
+                         st.error(f"❌ 连接失败: {e}")
+
+        elif rp_type == "file":
+            uploaded_file = st.file_uploader("上传规则文件", type=["yaml", "yml", "txt", "list"], key="rp_file_upload")
+            if uploaded_file:
+                # 保存文件逻辑
+                ruleset_dir = "ruleset"
+                if not os.path.exists(ruleset_dir):
+                    os.makedirs(ruleset_dir)
+                # 使用别名或原文件名
+                safe_filename = f"{rp_name}.{rp_format}" if rp_name else uploaded_file.name
+                file_path = os.path.join(ruleset_dir, safe_filename)
+                content = uploaded_file.getvalue()
+                if rp_behavior == "ipcidr" and st.session_state.global_config.get("aggregate_cidr", False):
+                    # 聚合结果按文件内容缓存，避免每次重绘都重新计算
+                    digest = hashlib.sha256(content).hexdigest()
+                    cached = st.session_state.get("rp_cidr_cache")
+                    if not cached or cached[0] != digest:
+                        cached = (digest, aggregate_provider_file(content))
+                        st.session_state.rp_cidr_cache = cached
+                    content, before, after, invalid = cached[1]
+                    st.info(f"网段聚合: {before} -> {after} 条 (减少 {before - after})")
+                    if invalid:
+                        st.warning(f"{len(invalid)} 条无法解析的内容已忽略，例如: {invalid[0]}")
+                with open(file_path, "wb") as f:
+                    f.write(content)
+                st.success(f"已保存到: {file_path}")
+
+        rp_order = st.selectbox("规则集匹配顺序", ["优先 (覆盖)", "默认 (追加)"], key="rp_order")
+
+        # 获取所有策略组名称用于下拉菜单
+        rp_target = st.selectbox("指定策略组", list(set(all_groups)), key="rp_target")
+
+        if st.button("保存规则集配置", key="save_rp"):
+            if not rp_name:
+                st.error("请输入规则集别名")
+            elif rp_name in st.session_state.custom_rule_providers:
+                st.error("该别名已存在")
+            elif rp_type == "http" and not rp_url:
+                st.error("请输入规则集 URL")
+            elif rp_type == "file" and not uploaded_file:
+                 st.error("请上传规则文件")
+            else:
+                provider_config = {
+                    "type": rp_type,
+                    "behavior": rp_behavior,
+                    "interval": rp_interval,
+                    "format": rp_format,
+                    "target": rp_target,
+                    "order": rp_order
+                }
+
+                if rp_type == "http":
+                    provider_config["url"] = rp_url
+                    provider_config["path"] = f"./ruleset/{rp_name}.{rp_format}"
+                elif rp_type == "file":
+                     provider_config["path"] = f"./ruleset/{safe_filename}" # 使用刚才保存的路径
+
+                st.session_state.custom_rule_providers[rp_name] = provider_config
+                workspace_store.put_provider(workspace, rp_name, provider_config)
+                st.success(f"规则集 {rp_name} 已添加")
+
+    # 显示已添加的规则集
+    if st.session_state.custom_rule_providers:
+        st.write(f"**已添加的规则集列表 ({len(st.session_state.custom_rule_providers)})**")
+        for name, config in list(st.session_state.custom_rule_providers.items()):
+            target_group = config.get('target', '未指定')
+            with st.expander(f"{name} ({target_group})"):
+                st.json(config)
+                if st.button(f"删除 {name}", key=f"del_rp_{name}"):
+                    del st.session_state.custom_rule_providers[name]
+                    workspace_store.delete_provider(workspace, name)
+                    rerun_fragment()
+
+
 with tab3:
     st.header("分流规则配置")
     
-    if not st.session_state.proxies_data:
+    if not st.session_state.node_store:
         st.warning("请先在“快速填入”或“节点管理”标签页添加节点，才能配置分流规则。")
     else:
-        # ==========================
-        # 1. 准备配置上下文
-        # ==========================
-        try:
-            proxy_groups = generate_proxy_groups(st.session_state.proxies_data)
-        except Exception:
-            proxy_groups = []
-
-        # 构建基础预览配置
-        preview_config = {
-            "global": {
-                "port": st.session_state.global_config["port"],
-                "socks-port": st.session_state.global_config["socks_port"],
-                "mixed-port": st.session_state.global_config["mixed_port"],
-                "allow-lan": st.session_state.global_config["allow_lan"],
-                "bind-address": st.session_state.global_config["bind_address"],
-                "mode": st.session_state.global_config["mode"],
-                "log-level": st.session_state.global_config["log_level"],
-                "ipv6": st.session_state.global_config["ipv6_support"]
-            },
-            "proxies": st.session_state.proxies_data,
-            "proxy-groups": proxy_groups,
-            "rules": [
-                "DOMAIN-SUFFIX,google.com,Proxy",
-                "GEOIP,CN,Domestic",
-                "MATCH,Others"
-            ]
-        }
-        
-        # 添加 TUN 设置
-        if st.session_state.global_config["enable_tun"]:
-            preview_config["tun"] = {
-                "enable": True,
-                "stack": st.session_state.global_config["tun_stack"],
-                "device": st.session_state.global_config["tun_device"],
-                "auto-route": st.session_state.global_config["tun_auto_route"],
-                "auto-detect-interface": st.session_state.global_config["tun_auto_detect_interface"],
-                "dns-hijack": ["any:53"] if st.session_state.global_config["tun_dns_hijack"] else []
-            }
-        
-        # 添加 DNS 设置
-        if st.session_state.global_config["enable_dns"]:
-            def text_to_list(text):
-                return [x.strip() for x in text.split('\n') if x.strip()]
-                
-            preview_config["dns"] = {
-                "enable": True,
-                "listen": st.session_state.global_config["dns_listen"],
-                "ipv6": st.session_state.global_config["dns_ipv6"],
-                "enhanced-mode": st.session_state.global_config["enhanced_mode"],
-                "fake-ip-range": st.session_state.global_config["fake_ip_range"],
-                "fake-ip-filter": ["*.lan", "*.local", "time.windows.com"] + FAKE_IP_FILTER_LIST,
-                "default-nameserver": text_to_list(st.session_state.global_config["default_nameserver"]),
-                "nameserver": text_to_list(st.session_state.global_config["nameserver"]),
-                "fallback": text_to_list(st.session_state.global_config["fallback"]),
-                "fallback-filter": {"geoip": True, "geoip-code": "CN", "ipcidr": ["240.0.0.0/4"]}
-            }
-            
-            # 处理 Nameserver Policy
-            if "nameserver_policy" in st.session_state.global_config and st.session_state.global_config["nameserver_policy"]:
-                try:
-                    policy_dict = {}
-                    lines = st.session_state.global_config["nameserver_policy"].split('\n')
-                    for line in lines:
-                        if ':' in line:
-                            # 简单处理：key: value
-                            k, v = line.split(':', 1)
-                            policy_dict[k.strip()] = v.strip()
-                    if policy_dict:
-                        preview_config["dns"]["nameserver-policy"] = policy_dict
-                except:
-                    pass
-        
-        if st.session_state.global_config["secret"]:
-            preview_config["secret"] = st.session_state.global_config["secret"]
-        
         # ==========================
         # 1. 规则集选择 (仅保留 lhie1)
         # ==========================
         # 默认选中 lhie1 且不展示下拉框 (或者展示但不可选)
-        rule_type = "lhie1规则"
+        rule_type = RULE_TYPE_LHIE1
         st.session_state.selected_rule_type = rule_type
+        workspace_store.save_settings(workspace, {"rule_type": rule_type})
         st.info("💡 默认使用 lhie1 规则集进行基础分流。您可以在下方添加自定义规则或规则集。")
 
-        # ==========================
-        # 2. 可视化规则编辑 
-        # ==========================
-        st.subheader("可视化规则编辑")
-        
-        # 获取所有策略组名称用于下拉菜单
-        all_groups = [group['name'] for group in proxy_groups]
-        all_groups.extend(['DIRECT', 'REJECT', 'Proxy'])
-        all_groups = list(set(all_groups))
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            st.write("**规则类型**")
-            rule_select = st.selectbox("选择规则类型", 
-                                     ["DOMAIN-SUFFIX", "DOMAIN", "DOMAIN-KEYWORD", "IP-CIDR", "GEOIP", "MATCH"],
-                                     key="rule_type_select_v3")
-        with col2:
-            st.write("**目标策略**")
-            # 增加自定义组输入
-            group_options = ["选择现有策略组...", "手动输入..."] + all_groups
-            group_mode = st.selectbox("选择目标策略组模式", ["从列表中选择", "手动输入名称"], label_visibility="collapsed", key="group_mode_select")
-            
-            if group_mode == "从列表中选择":
-                group_select = st.selectbox("选择目标策略组", all_groups, key="target_group_select_v3")
-                final_group = group_select
-            else:
-                custom_group_input = st.text_input("输入策略组名称", placeholder="例如: MyGroup", key="custom_group_input_v3")
-                final_group = custom_group_input
+        rules_editor(target_mode)
 
-        rule_value = ""
-        if rule_select not in ["MATCH"]:
-            rule_value = st.text_input("输入值 (域名/IP/国家代码)", placeholder="例如: google.com", key="rule_value_input_v3")
-        
-        # 添加规则按钮
-        if st.button("➕ 添加规则", key="add_rule_v3"):            
-            if not final_group:
-                 st.error("请选择或输入目标策略组")
-            elif rule_select != "MATCH" and not rule_value:
-                 st.error("请输入规则值")
-            else:
-                new_rule = f"{rule_select},{rule_value},{final_group}" if rule_select != "MATCH" else f"{final_group},{final_group}"
-                if new_rule not in st.session_state.custom_rules:
-                    st.session_state.custom_rules.append(new_rule)
-                    st.success(f"规则已添加: {new_rule}")
-                else:
-                    st.warning("该规则已存在")
-        
-        # 自定义规则列表展示 (移至此处)
-        if st.session_state.custom_rules:
-            st.subheader(f"已添加的自定义规则 ({len(st.session_state.custom_rules)})")
-            for i, rule in enumerate(st.session_state.custom_rules):
-                col_rule, col_action = st.columns([4, 1])
-                with col_rule:
-                    st.text(f"{i+1}. {rule}")
-                with col_action:
-                    if st.button(f"🗑️", key=f"delete_custom_rule_{i}", help="删除此规则"):
-                        st.session_state.custom_rules.pop(i)
-                        st.rerun()
-                        
         st.divider()
 
-        # ==========================
-        # 3. 编辑规则集配置 (Rule Providers)
-        # ==========================
-        st.subheader("编辑规则集配置 (Rule Providers)")
-        st.caption("规则集使用介绍: https://wiki.metacubex.one/config/rule-providers/content/")
-        
-        with st.expander("➕ 添加新规则集", expanded=True):
-            # 配置文件选项移除，默认全部
-            rp_name = st.text_input("别名 (请勿重名)", placeholder="Rule-provider - " + str(uuid.uuid4())[:8], key="rp_name")
-            
-            col_rp1, col_rp2 = st.columns(2)
-            with col_rp1:
-                rp_type = st.selectbox("规则集类型", ["http", "file"], key="rp_type")
-                rp_behavior = st.selectbox("规则类型", ["domain", "ipcidr", "classical"], key="rp_behavior")
-            with col_rp2:
-                rp_format = st.selectbox("规则格式", ["yaml", "text"], key="rp_format")
-                rp_interval = st.number_input("规则集更新时间 (秒)", value=86400, key="rp_interval")
-            
-            rp_path_or_url = ""
-            if rp_type == "http":
-                rp_url = st.text_input("规则集地址", placeholder="http://...", key="rp_url")
-                # 连通性测试按钮
-                if rp_url:
-                    if st.button("测试链接可用性", key="test_rp_url"):
-                         try:
-                             resp = requests.head(rp_url, timeout=5)
-                             if resp.status_code == 200:
-                                 st.success("✅ 链接可用")
-                             else:
-                                 st.warning(f"⚠️ 链接返回状态码: {resp.status_code}")
-                         except Exception as e:
-                             st.error(f"❌ 连接失败: {e}")
-                
-            elif rp_type == "file":
-                uploaded_file = st.file_uploader("上传规则文件", type=["yaml", "yml", "txt", "list"], key="rp_file_upload")
-                if uploaded_file:
-                    # 保存文件逻辑
-                    ruleset_dir = "ruleset"
-                    if not os.path.exists(ruleset_dir):
-                        os.makedirs(ruleset_dir)
-                    # 使用别名或原文件名
-                    safe_filename = f"{rp_name}.{rp_format}" if rp_name else uploaded_file.name
-                    file_path = os.path.join(ruleset_dir, safe_filename)
-                    with open(file_path, "wb") as f:
-                        f.write(uploaded_file.getbuffer())
-                    st.success(f"已保存到: {file_path}")
-            
-            rp_order = st.selectbox("规则集匹配顺序", ["优先 (覆盖)", "默认 (追加)"], key="rp_order")
-            
-            # 获取所有策略组名称用于下拉菜单
-            rp_target = st.selectbox("指定策略组", list(set(all_groups)), key="rp_target")
-            
-            if st.button("保存规则集配置", key="save_rp"):
-                if not rp_name:
-                    st.error("请输入规则集别名")
-                elif rp_name in st.session_state.custom_rule_providers:
-                    st.error("该别名已存在")
-                elif rp_type == "http" and not rp_url:
-                    st.error("请输入规则集 URL")
-                elif rp_type == "file" and not uploaded_file:
-                     st.error("请上传规则文件")
-                else:
-                    provider_config = {
-                        "type": rp_type,
-                        "behavior": rp_behavior,
-                        "interval": rp_interval,
-                        "format": rp_format,
-                        "target": rp_target,
-                        "order": rp_order
-                    }
-                    
-                    if rp_type == "http":
-                        provider_config["url"] = rp_url
-                        provider_config["path"] = f"./ruleset/{rp_name}.{rp_format}"
-                    elif rp_type == "file":
-                         provider_config["path"] = f"./ruleset/{safe_filename}" # 使用刚才保存的路径
-
-                    st.session_state.custom_rule_providers[rp_name] = provider_config
-                    st.success(f"规则集 {rp_name} 已添加")
-        
-        # 显示已添加的规则集
-        if st.session_state.custom_rule_providers:
-            st.write(f"**已添加的规则集列表 ({len(st.session_state.custom_rule_providers)})**")
-            for name, config in list(st.session_state.custom_rule_providers.items()):
-                target_group = config.get('target', '未指定')
-                with st.expander(f"{name} ({target_group})"):
-                    st.json(config)
-                    if st.button(f"删除 {name}", key=f"del_rp_{name}"):
-                        del st.session_state.custom_rule_providers[name]
-                        st.rerun()
+        rule_provider_editor(target_mode)
 
 with tab4:
     st.header("配置生成与检查")
     
     # 上传旧配置 (仅当无节点时显示，方便修改)
-    if not st.session_state.proxies_data:
+    if not st.session_state.node_store:
         uploaded_yaml = st.file_uploader("📂 上传之前的配置文件 (进行修改)", type=["yaml", "yml"])
         if uploaded_yaml:
             if uploaded_yaml.size > 5 * 1024 * 1024:
@@ -1453,10 +1467,10 @@ with tab4:
                     content = uploaded_yaml.read().decode("utf-8")
                     # 检查标记 (简单的字符串检查)
                     if "# Generator: Clash-Config-Gen" in content or True: # 暂时放开 True 以便测试，实际应严格检查
-                        data = yaml.safe_load(content)
+                        data = yaml_io.load(content)
                         if "proxies" in data:
-                            st.session_state.proxies_data = data["proxies"]
-                            st.success(f"已恢复 {len(data['proxies'])} 个节点！")
+                            st.session_state.node_store.add_many(data["proxies"])
+                            st.success(f"已恢复 {len(st.session_state.node_store)} 个节点！")
                             st.rerun()
                     else:
                         st.error("此文件不是由本工具生成的，或版本太旧，无法还原编辑。")
@@ -1464,331 +1478,38 @@ with tab4:
                     st.error(f"解析失败: {e}")
 
     if st.button("🔍 生成并检查配置文件", type="primary", use_container_width=True):
-        if not st.session_state.proxies_data:
+        if not st.session_state.node_store:
             st.error("❌ 错误: 未添加任何节点！无法生成配置。")
         else:
-            # 1. 重新构建配置 (复用逻辑)
+            # 1. 构建配置 (与分流规则页共用缓存)
+            gc = st.session_state.global_config
+            convert = gc.get("convert_rules", False)
+            skip = gc.get("skip_unreachable", False)
+            rule_files = {}
             try:
-                final_proxy_groups = generate_proxy_groups(st.session_state.proxies_data)
+                final_config = build_config_cached(
+                    st.session_state.global_config,
+                    st.session_state.node_store,
+                    st.session_state.custom_rules,
+                    st.session_state.custom_rule_providers,
+                    target_mode,
+                    rule_type=st.session_state.get("selected_rule_type", RULE_TYPE_CUSTOM),
+                    rule_plan=load_plan() if convert else None,
+                    latency_table=load_table() if skip else None,
+                    rule_files=rule_files,
+                    cache_key=(st.session_state.node_store.cache_key(),
+                               plan_version() if convert else None,
+                               table_version() if skip else None)
+                )
+                write_rule_files(rule_files)
             except Exception as e:
-                final_proxy_groups = []
-                st.error(f"策略组生成失败: {e}")
-
-            # 构建基础配置
-            final_config = {
-                "global": { # 兼容不同Clash版本的字段结构，这里我们混合输出，Clash Meta会自动识别一级key
-                    "port": st.session_state.global_config["port"],
-                    "socks-port": st.session_state.global_config["socks_port"],
-                    "mixed-port": st.session_state.global_config["mixed_port"],
-                    "allow-lan": st.session_state.global_config["allow_lan"],
-                    "bind-address": st.session_state.global_config["bind_address"],
-                    "mode": st.session_state.global_config["mode"],
-                    "log-level": st.session_state.global_config["log_level"],
-                    "ipv6": st.session_state.global_config["ipv6_support"],
-                    "external-controller": st.session_state.global_config["external_controller"],
-                    "find-process-mode": st.session_state.global_config["find_process_mode"]
-                },
-                # 直接展开到根节点
-                "port": st.session_state.global_config["port"],
-                "socks-port": st.session_state.global_config["socks_port"],
-                "mixed-port": st.session_state.global_config["mixed_port"],
-                "allow-lan": st.session_state.global_config["allow_lan"],
-                "bind-address": st.session_state.global_config["bind_address"],
-                "mode": st.session_state.global_config["mode"],
-                "log-level": st.session_state.global_config["log_level"],
-                "ipv6": st.session_state.global_config["ipv6_support"],
-                "external-controller": st.session_state.global_config["external_controller"],
-                "find-process-mode": st.session_state.global_config["find_process_mode"],
-                
-                "proxies": st.session_state.proxies_data,
-                "proxy-groups": final_proxy_groups
-            }
-            
-            # TUN
-            if st.session_state.global_config["enable_tun"]:
-                final_config["tun"] = {
-                    "enable": True,
-                    "stack": st.session_state.global_config["tun_stack"],
-                    "device": st.session_state.global_config["tun_device"],
-                    "auto-route": st.session_state.global_config["tun_auto_route"],
-                    "auto-detect-interface": st.session_state.global_config["tun_auto_detect_interface"],
-                    "dns-hijack": ["any:53"] if st.session_state.global_config["tun_dns_hijack"] else []
-                }
-            
-            # DNS
-            if st.session_state.global_config["enable_dns"]:
-                 final_config["dns"] = {
-                    "enable": True,
-                    "listen": st.session_state.global_config["dns_listen"],
-                    "ipv6": st.session_state.global_config["dns_ipv6"],
-                    "enhanced-mode": st.session_state.global_config["enhanced_mode"],
-                    "fake-ip-range": st.session_state.global_config["fake_ip_range"],
-                    "fake-ip-filter": ["*.lan", "*.local", "time.windows.com"] + FAKE_IP_FILTER_LIST,
-                    "default-nameserver": text_to_list(st.session_state.global_config["default_nameserver"]),
-                    "nameserver": text_to_list(st.session_state.global_config["nameserver"]),
-                    "fallback": text_to_list(st.session_state.global_config["fallback"]),
-                    "fallback-filter": {"geoip": True, "geoip-code": "CN", "ipcidr": ["240.0.0.0/4"]}
-                }
-                 # Nameserver Policy
-                 if "nameserver_policy" in st.session_state.global_config and st.session_state.global_config["nameserver_policy"]:
-                    try:
-                        policy_dict = {}
-                        lines = st.session_state.global_config["nameserver_policy"].split('\n')
-                        for line in lines:
-                            if ':' in line:
-                                k, v = line.split(':', 1)
-                                policy_dict[k.strip()] = v.strip()
-                        if policy_dict:
-                            final_config["dns"]["nameserver-policy"] = policy_dict
-                    except:
-                        pass
-            
-            # Secret
-            if st.session_state.global_config["secret"]:
-                final_config["secret"] = st.session_state.global_config["secret"]
-            
-            # Meta Core Features
-            final_config["tcp-concurrent"] = st.session_state.global_config["tcp_concurrent"]
-            final_config["unified-delay"] = st.session_state.global_config["unified_delay"]
-            final_config["geodata-mode"] = st.session_state.global_config["geodata_mode"]
-            final_config["geodata-loader"] = st.session_state.global_config["geodata_loader"]
-            if st.session_state.global_config["enable_sniffer"]:
-                final_config["sniffer"] = {
-                    "enable": True,
-                    "sniff": {
-                        "TLS": {"ports": [443]},
-                        "HTTP": {"ports": [80], "override-destination": True}
-                    },
-                    "force-domain": SNIFFER_FORCE_DOMAIN,
-                    "skip-domain": SNIFFER_SKIP_DOMAIN
-                }
-
-            # 处理规则 (Rules)
-            selected_rule = st.session_state.get("selected_rule_type", "自定义规则")
-            rule_list = []
-            
-            # 为了简化逻辑，这里重复部分规则生成逻辑，实际项目中应封装函数
-            if selected_rule == "lhie1规则":
-                # 按照 config.yaml 的 dler-io 规则集重构 (用户习惯称之为 lhie1)
-                final_config["rule-providers"] = {}
-                base_url = "https://testingcf.jsdelivr.net/gh/dler-io/Rules@main/Clash/Provider"
-                
-                # 定义规则集与Target策略组的映射关系
-                # Key: Provider Name (也是文件名的一部分)
-                # Value: (Path Suffix, Target Group)
-                # Path Suffix 如果为 None，则默认与 Key 相同
-                
-                providers_map = {
-                    "AdBlock": ("AdBlock", "AdBlock"),
-                    "HTTPDNS": ("HTTPDNS", "HTTPDNS"),
-                    "Special": ("Special", "DIRECT"),
-                    "PROXY": ("Proxy", "Proxy"),
-                    "Domestic": ("Domestic", "Domestic"),
-                    "Domestic IPs": ("Domestic%20IPs", "Domestic"),
-                    "LAN": ("LAN", "DIRECT"),
-                    "Netflix": ("Media/Netflix", "Netflix"),
-                    "Spotify": ("Media/Spotify", "Spotify"),
-                    "YouTube": ("Media/YouTube", "Youtube"), # 注意 Group 是 Youtube
-                    "Max": ("Media/Max", "HBO Max"),
-                    "Bilibili": ("Media/Bilibili", "Bilibili"),
-                    "IQ": ("Media/IQ", "Asian TV"),
-                    "IQIYI": ("Media/IQIYI", "Asian TV"),
-                    "Letv": ("Media/Letv", "Asian TV"),
-                    "Netease Music": ("Media/Netease%20Music", "Asian TV"),
-                    "Tencent Video": ("Media/Tencent%20Video", "Asian TV"),
-                    "Youku": ("Media/Youku", "Asian TV"),
-                    "WeTV": ("Media/WeTV", "Global TV"),
-                    "ABC": ("Media/ABC", "Global TV"),
-                    "Abema TV": ("Media/Abema%20TV", "Asian TV"),
-                    "Amazon": ("Media/Amazon", "Global TV"),
-                    "Apple Music": ("Media/Apple%20Music", "Apple"),
-                    "Apple News": ("Media/Apple%20News", "Apple"),
-                    "Apple TV": ("Media/Apple%20TV", "Apple TV"),
-                    "Bahamut": ("Media/Bahamut", "Bahamut"),
-                    "BBC iPlayer": ("Media/BBC%20iPlayer", "Global TV"),
-                    "DAZN": ("Media/DAZN", "DAZN"),
-                    "Discovery Plus": ("Media/Discovery%20Plus", "Discovery Plus"),
-                    "Disney Plus": ("Media/Disney%20Plus", "Disney Plus"),
-                    "DMM": ("Media/DMM", "Asian TV"),
-                    "encoreTVB": ("Media/encoreTVB", "Global TV"),
-                    "F1 TV": ("Media/F1%20TV", "Global TV"),
-                    "Fox Now": ("Media/Fox%20Now", "Global TV"),
-                    "Fox+": ("Media/Fox%2B", "Asian TV"),
-                    "Hulu Japan": ("Media/Hulu%20Japan", "Asian TV"),
-                    "Hulu": ("Media/Hulu", "Global TV"),
-                    "Japonx": ("Media/Japonx", "Asian TV"),
-                    "JOOX": ("Media/JOOX", "Asian TV"),
-                    "KKBOX": ("Media/KKBOX", "Asian TV"),
-                    "KKTV": ("Media/KKTV", "Asian TV"),
-                    "Line TV": ("Media/Line%20TV", "Asian TV"),
-                    "myTV SUPER": ("Media/myTV%20SUPER", "Asian TV"),
-                    "Niconico": ("Media/Niconico", "Asian TV"),
-                    "Pandora": ("Media/Pandora", "Global TV"),
-                    "PBS": ("Media/PBS", "Global TV"),
-                    "Pornhub": ("Media/Pornhub", "Pornhub"),
-                    "Soundcloud": ("Media/Soundcloud", "Global TV"),
-                    "ViuTV": ("Media/ViuTV", "Asian TV"),
-                    "Telegram": ("Telegram", "Telegram"),
-                    "Crypto": ("Crypto", "Crypto"),
-                    "Discord": ("Discord", "Discord"),
-                    "Steam": ("Steam", "Steam"),
-                    "TikTok": ("TikTok", "TikTok"),
-                    "Speedtest": ("Speedtest", "Speedtest"),
-                    "PayPal": ("PayPal", "PayPal"),
-                    "Microsoft": ("Microsoft", "Microsoft"),
-                    "AI Suite": ("AI%20Suite", "AI Suite"),
-                    "Apple": ("Apple", "Apple"),
-                    "Google FCM": ("Google%20FCM", "Google FCM"),
-                    "Scholar": ("Scholar", "Scholar"),
-                    "miHoYo": (None, "miHoYo") # URL in root
-                }
-                
-                rule_list = []
-                
-                for name, (suffix, target) in providers_map.items():
-                    # 1. Add Provider
-                    real_suffix = suffix if suffix else name
-                    final_config["rule-providers"][name] = {
-                        "type": "http",
-                        "behavior": "classical",
-                        "url": f"{base_url}/{real_suffix}.yaml",
-                        "path": f"./ruleset/{name.replace(' ', '_')}.yaml",
-                        "interval": 86400
-                    }
-                    # 2. Add Rule
-                    rule_list.append(f"RULE-SET,{name},{target}")
-
-                # 添加 Google 特殊域名代理 (防止 DNS 泄露)
-                rule_list = [
-                    "DOMAIN-SUFFIX,xn--ngstr-lra8j.com,Proxy",
-                    "DOMAIN-SUFFIX,services.googleapis.cn,Proxy"
-                ] + rule_list
-
-                # 添加通用规则
-                rule_list.extend([
-                    "GEOIP,CN,Domestic,no-resolve",
-                    "MATCH,Others"
-                ])
-            elif selected_rule == "自定义规则":
-                rule_list = [
-                    "DOMAIN-SUFFIX,xn--ngstr-lra8j.com,Proxy",
-                    "DOMAIN-SUFFIX,services.googleapis.cn,Proxy",
-                    "DOMAIN-SUFFIX,google.com,Proxy", 
-                    "DOMAIN-SUFFIX,youtube.com,Proxy", 
-                    "GEOIP,CN,DIRECT,no-resolve", 
-                    "MATCH,Proxy"
-                ]
-            else:
-                rule_list = [
-                    "DOMAIN-SUFFIX,xn--ngstr-lra8j.com,Proxy",
-                    "DOMAIN-SUFFIX,services.googleapis.cn,Proxy",
-                    "GEOIP,CN,DIRECT,no-resolve", 
-                    "MATCH,Proxy"
-                ]
-                
-            # 处理自定义规则集 (Rule Providers)
-            provider_rules_prepend = []
-            provider_rules_append = []
-            
-            if "custom_rule_providers" in st.session_state and st.session_state.custom_rule_providers:
-                if "rule-providers" not in final_config:
-                    final_config["rule-providers"] = {}
-                
-                for name, config in st.session_state.custom_rule_providers.items():
-                    # 添加到 rule-providers
-                    provider = {
-                        "type": config["type"],
-                        "behavior": config["behavior"],
-                        "path": config["path"],
-                        "interval": config["interval"]
-                    }
-                    if config["type"] == "http":
-                        provider["url"] = config["url"]
-                    elif config["type"] == "file":
-                        # 对于 file 类型，这里简单处理，实际可能需要处理文件路径
-                         pass 
-                         
-                    if config["format"]:
-                         provider["format"] = config["format"]
-
-                    final_config["rule-providers"][name] = provider
-                    
-                    # 生成对应的规则
-                    target_group = config.get('target', 'Proxy')
-                    new_rule = f"RULE-SET,{name},{target_group}"
-                    if config.get("order") == "优先 (覆盖)":
-                        provider_rules_prepend.append(new_rule)
-                    else:
-                        provider_rules_append.append(new_rule)
-            
-            # 合并所有规则: 
-            # 顺序: 自定义规则(单条) -> 优先覆盖的规则集 -> 选定的预设规则集(lhie1) -> 追加的规则集 -> 兜底
-            # 注意：实际顺序取决于用户的预期，这里假设单条自定义规则优先级最高
-            
-            # 修正 lhie1 的 MATCH,Proxy，避免被中间插入的规则截断（如果有 MATCH）
-            # 通常预设规则最后一条是 MATCH，所以追加的规则可能无法生效。
-            # 如果是 lhie1，它最后是 MATCH,Proxy。
-            
-            # 策略调整：
-            # 1. 自定义单条规则 (最优先)
-            # 2. 规则集 (优先覆盖)
-            # 3. 预设规则 (lhie1) [除了最后的 MATCH]
-            # 4. 规则集 (默认追加)
-            # 5. 兜底 MATCH (如果预设里有)
-            
-            def split_rules(rules):
-                """分离普通规则和兜底规则(MATCH)"""
-                normal = []
-                match = []
-                for r in rules:
-                    if r.startswith("MATCH,"):
-                        match.append(r)
-                    else:
-                        normal.append(r)
-                return normal, match
-
-            preset_normal, preset_match = split_rules(rule_list)
-            
-            final_rules = []
-            final_rules.extend(st.session_state.custom_rules)
-            final_rules.extend(provider_rules_prepend)
-            final_rules.extend(preset_normal)
-            final_rules.extend(provider_rules_append)
-            final_rules.extend(preset_match)
-            
-            # 如果没有兜底，添加默认兜底
-            if not any(r.startswith("MATCH,") for r in final_rules):
-                final_rules.append("MATCH,Proxy")
-
-            final_config["rules"] = final_rules
+                st.error(f"配置生成失败: {e}")
+                st.stop()
 
             # --------------------------
             # 执行检查逻辑
             # --------------------------
-            check_errors = []
-            check_warnings = []
-            
-            # 1. 节点检查
-            if not final_config["proxies"]:
-                check_errors.append("Proxies 为空")
-            
-            # 2. 策略组检查
-            all_proxy_names = [p['name'] for p in final_config["proxies"]]
-            all_group_names = [g['name'] for g in final_config["proxy-groups"]]
-            all_valid_targets = all_proxy_names + all_group_names + ["DIRECT", "REJECT", "no-resolve"]
-            
-            for group in final_config["proxy-groups"]:
-                for p in group["proxies"]:
-                    if p not in all_valid_targets:
-                        check_warnings.append(f"策略组 '{group['name']}' 引用了不存在的节点/组: '{p}' (可能是正则筛选或其他)")
-                        
-            # 3. 规则检查 (简单检查)
-            for r in final_config["rules"]:
-                parts = r.split(',')
-                if len(parts) >= 2:
-                    target = parts[-1]
-                    if target not in all_valid_targets:
-                       check_warnings.append(f"规则 '{r}' 指向了不存在的策略组: '{target}'")
+            check_errors, check_warnings = validate_config(final_config)
 
             # 显示结果
             if check_errors:
@@ -1803,8 +1524,41 @@ with tab4:
                     for w in check_warnings:
                         st.warning(w)
 
+            # 健康检查负载
+            hc_load = probe_load(final_config)
+            hc_budget = st.session_state.global_config.get("healthcheck_budget", 0)
+            if hc_load["groups"]:
+                hc_summary = (f"📶 健康检查负载: 默认选择下约 {hc_load['expected']} 次/分钟，"
+                              f"全部测速组同时在用时 {hc_load['worst']} 次/分钟 ({len(hc_load['groups'])} 个测速组)")
+                if hc_budget and hc_load["worst"] > hc_budget:
+                    st.warning(hc_summary + f"，超出预算 {hc_budget} 次/分钟")
+                else:
+                    st.caption(hc_summary + (f"，预算 {hc_budget} 次/分钟" if hc_budget else "，可在侧边栏设置预算"))
+                with st.expander("测速组明细", expanded=False):
+                    st.dataframe([
+                        {"策略组": row["name"], "类型": row["type"], "成员数": row["members"], "间隔(秒)": row["interval"],
+                         "lazy": row["lazy"], "默认在用": row["active"], "次/分钟": row["rate"]}
+                        for row in hc_load["groups"]
+                    ], use_container_width=True, hide_index=True)
+
+            # 被遮蔽规则分析
+            if st.session_state.global_config.get("drop_shadowed_rules", False):
+                st.caption("已启用「移除被遮蔽的规则」，输出中不包含永远不会生效的规则。")
+            else:
+                shadowed_rules = analyze_rules(final_config["rules"])
+                if shadowed_rules:
+                    with st.expander(f"🔍 发现 {len(shadowed_rules)} 条被遮蔽的规则 (永远不会生效，可在侧边栏开启自动移除)", expanded=False):
+                        for index, by_index in shadowed_rules[:200]:
+                            st.text(f"#{index + 1} {final_config['rules'][index]}  <-  #{by_index + 1} {final_config['rules'][by_index]}")
+
+            # IP-CIDR 聚合
+            if not st.session_state.global_config.get("aggregate_cidr", False):
+                _, cidr_before, cidr_after = aggregate_rules(final_config["rules"])
+                if cidr_after < cidr_before:
+                    st.info(f"💡 IP-CIDR 规则可聚合: {cidr_before} -> {cidr_after} 条，可在侧边栏开启「聚合 IP-CIDR 规则」")
+
             # 生成 YAML
-            final_config_str = "# Generator: Clash-Config-Gen\n" + yaml.dump(final_config, allow_unicode=True, sort_keys=False, default_flow_style=False)
+            final_config_str = render_config(final_config)
             
             st.divider()
             col_d1, col_d2 = st.columns([3, 1])
@@ -1820,3 +1574,45 @@ with tab4:
                     use_container_width=True,
                     help="下载最终生成的配置文件"
                 )
+
+    # --------------------------
+    # 订阅链接
+    # --------------------------
+    st.divider()
+    st.subheader("🔗 订阅链接")
+    st.caption("保存当前的节点、规则与设置，路由器即可通过 API 定时拉取最新配置 (支持 ETag / gzip，内容未变化时几乎没有开销)。")
+    col_s1, col_s2 = st.columns([3, 1])
+    with col_s1:
+        profile_token = st.text_input("订阅 Token (留空则新建，填写已有 Token 则覆盖更新)",
+                                      value=st.session_state.get("profile_token", ""), key="profile_token_input").strip()
+    with col_s2:
+        save_clicked = st.button("💾 保存为订阅", use_container_width=True, key="save_profile")
+    follow_workspace = st.checkbox(
+        "跟随工作区自动更新", value=False, key="profile_follow_workspace",
+        help=f"订阅直接读取工作区 '{workspace}' 的数据库，之后在此页面的修改无需再次保存即可生效；不勾选则保存当前内容的快照")
+    if save_clicked:
+        if not st.session_state.node_store:
+            st.error("❌ 错误: 未添加任何节点！")
+        elif profile_token and not valid_token(profile_token):
+            st.error("Token 只能包含字母、数字、- 和 _，长度 8~64")
+        else:
+            token = profile_token or new_token()
+            if follow_workspace:
+                link_profile(token, workspace)
+            else:
+                save_profile(token, {
+                    "global_config": st.session_state.global_config,
+                    "proxies": st.session_state.node_store.proxies,
+                    "custom_rules": st.session_state.custom_rules,
+                    "custom_rule_providers": st.session_state.custom_rule_providers,
+                    "target_mode": target_mode,
+                    "rule_type": st.session_state.get("selected_rule_type", RULE_TYPE_CUSTOM),
+                })
+            st.session_state.profile_token = token
+            # 保存时即渲染，API 直接输出预渲染文件
+            with st.spinner("正在渲染配置..."):
+                pointer = publish_all(token)
+                prune_artifacts()
+            st.success(f"订阅已保存 (配置 {pointer['size'] / 1024:.0f} KB，gzip 后 {pointer['gz_size'] / 1024:.0f} KB)")
+    if st.session_state.get("profile_token"):
+        st.code(f"{os.environ.get('HOST_URL', 'http://localhost:8000')}/sub/{st.session_state.profile_token}", language=None)
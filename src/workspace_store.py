@@ -0,0 +1,580 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from node_store import NodeStore, fingerprint
+
+# ==========================================
+# 工作区持久化 (SQLite / WAL)
+# ==========================================
+# Web UI 中的节点、自定义规则、规则集与全局设置写入 data/workspace.db，
+# 容器重启或新开浏览器标签页后自动恢复，不再需要重新上传 YAML。
+# - 按行存储：每个节点 / 规则 / 规则集 / 设置项一行，增删改只写入变化的行
+# - WAL 模式：写入不阻塞读取，API 进程可以同时读取同一数据库
+# - 每次写入递增工作区版本号，关联了工作区的订阅据此判断是否需要重新渲染；
+#   节点另有单独的版本号，每行节点记录写入时的节点版本号 (updated)
+# - 打开工作区时只读取节点名称、位置与来源标签，节点内容在用到时才读取并解码，指纹索引在首次去重时建立
+# - 多个会话 (浏览器标签页) 打开同一工作区时，各自按版本号增量读取其他会话写入的变更，不会用过期内容覆盖
+# 一个数据库可保存多个工作区，Web UI 通过 ?ws=<名称> 选择，默认为 default。
+
+DATA_DIR = os.environ.get("CLASH_GEN_DATA_DIR", "data")
+DB_PATH = os.path.join(DATA_DIR, "workspace.db")
+DEFAULT_WORKSPACE = "default"
+
+_WORKSPACE_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workspaces (
+    workspace TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    nodes_version INTEGER NOT NULL DEFAULT 0,
+    updated_at INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    workspace TEXT NOT NULL,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    tag TEXT,
+    updated INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (workspace, name)
+);
+CREATE INDEX IF NOT EXISTS nodes_order ON nodes (workspace, position);
+CREATE TABLE IF NOT EXISTS rules (
+    workspace TEXT NOT NULL,
+    rule TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (workspace, rule)
+);
+CREATE TABLE IF NOT EXISTS providers (
+    workspace TEXT NOT NULL,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (workspace, name)
+);
+CREATE TABLE IF NOT EXISTS settings (
+    workspace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (workspace, key)
+);
+CREATE TABLE IF NOT EXISTS links (
+    token TEXT PRIMARY KEY,
+    workspace TEXT NOT NULL
+);
+"""
+
+# 旧版本数据库缺少的列 (表, 列, 定义)，打开时补齐
+MIGRATIONS = [
+    ("workspaces", "nodes_version", "INTEGER NOT NULL DEFAULT 0"),
+    ("nodes", "updated", "INTEGER NOT NULL DEFAULT 0"),
+]
+POST_MIGRATION = "CREATE INDEX IF NOT EXISTS nodes_updated ON nodes (workspace, updated);"
+
+GLOBAL_PREFIX = "global_config/"    # 全局设置按单个键存储
+QUERY_CHUNK = 500                   # 按名称批量读取节点时每条查询的参数个数
+
+
+def valid_workspace(workspace):
+    return bool(workspace) and _WORKSPACE_RE.match(workspace) is not None
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class WorkspaceStore:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._local = threading.local()   # 每个线程一个连接
+        self._settings = {}               # 工作区 -> (版本号, 已持久化的设置 {键: JSON 文本})，用于只写入变化的项
+        self._lock = threading.Lock()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._migrate(conn)
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _migrate(conn):
+        for table, column, definition in MIGRATIONS:
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                try:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                except sqlite3.OperationalError as e:
+                    # 其他进程同时完成了迁移
+                    if "duplicate column" not in str(e):
+                        raise
+        conn.executescript(POST_MIGRATION)
+
+    @contextmanager
+    def _write(self, workspace, nodes=False):
+        """
+        写事务：开始时递增工作区版本号 (nodes=True 时同时递增节点版本号)，
+        事务内可读取新的版本号；异常时整体回滚。
+        """
+        if not valid_workspace(workspace):
+            raise ValueError(f"无效的工作区名称: {workspace}")
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO workspaces (workspace, version, nodes_version, updated_at) VALUES (?, 1, ?, ?) "
+                "ON CONFLICT (workspace) DO UPDATE SET version = version + 1, "
+                "nodes_version = nodes_version + excluded.nodes_version, updated_at = excluded.updated_at",
+                (workspace, int(nodes), int(time.time())),
+            )
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def version(self, workspace):
+        """工作区的版本号 (每次写入递增)；工作区不存在时返回 None"""
+        row = self._conn().execute("SELECT version FROM workspaces WHERE workspace = ?", (workspace,)).fetchone()
+        return row[0] if row else None
+
+    def nodes_version(self, workspace):
+        """工作区的节点版本号 (每次写入节点时递增)；工作区不存在时返回 None"""
+        row = self._conn().execute("SELECT nodes_version FROM workspaces WHERE workspace = ?",
+                                   (workspace,)).fetchone()
+        return row[0] if row else None
+
+    def workspaces(self):
+        return [r[0] for r in self._conn().execute("SELECT workspace FROM workspaces ORDER BY workspace")]
+
+    # ------------------------------------------
+    # 节点
+    # ------------------------------------------
+    def load_nodes(self, workspace):
+        """按顺序返回 [(名称, 节点, 来源标签, 位置)]"""
+        rows = self._conn().execute(
+            "SELECT name, data, tag, position FROM nodes WHERE workspace = ? ORDER BY position", (workspace,))
+        return [(name, json.loads(data), tag, position) for name, data, tag, position in rows]
+
+    def node_count(self, workspace):
+        return self._conn().execute("SELECT COUNT(*) FROM nodes WHERE workspace = ?", (workspace,)).fetchone()[0]
+
+    def node_snapshot(self, workspace, since=None):
+        """
+        在同一个读事务中读取节点索引 (不读取节点内容)，返回
+        (节点版本号, [(名称, 位置, 来源标签)] 按位置排列, 节点版本号 since 之后写入的节点名称集合)。
+        since 为 None 时第三项为 None。
+        """
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute("SELECT nodes_version FROM workspaces WHERE workspace = ?", (workspace,)).fetchone()
+            index = conn.execute("SELECT name, position, tag FROM nodes WHERE workspace = ? ORDER BY position",
+                                 (workspace,)).fetchall()
+            changed = None if since is None else {r[0] for r in conn.execute(
+                "SELECT name FROM nodes WHERE workspace = ? AND updated > ?", (workspace, since))}
+        finally:
+            conn.execute("COMMIT")
+        return (row[0] if row else 0), index, changed
+
+    def node_data(self, workspace, names=None):
+        """返回 {名称: (节点 JSON 文本, 写入时的节点版本号)}；names 为 None 时读取全部节点"""
+        conn = self._conn()
+        if names is None:
+            return {name: (data, updated) for name, data, updated in conn.execute(
+                "SELECT name, data, updated FROM nodes WHERE workspace = ?", (workspace,))}
+        names = list(names)
+        result = {}
+        for i in range(0, len(names), QUERY_CHUNK):
+            chunk = names[i:i + QUERY_CHUNK]
+            rows = conn.execute(
+                f"SELECT name, data, updated FROM nodes WHERE workspace = ? AND name IN ({','.join('?' * len(chunk))})",
+                (workspace, *chunk))
+            result.update((name, (data, updated)) for name, data, updated in rows)
+        return result
+
+    def apply_node_ops(self, workspace, ops):
+        """
+        在一个事务中执行节点变更，返回新的节点版本号 (ops 为空时返回 None)。ops 为以下元组的列表：
+        ("put", 名称, 节点, 标签, 位置)  新增或覆盖
+        ("rename", 原名称, 新名称)
+        ("delete", 名称)
+        ("clear",)
+        """
+        if not ops:
+            return None
+        with self._write(workspace, nodes=True) as conn:
+            version = conn.execute("SELECT nodes_version FROM workspaces WHERE workspace = ?",
+                                   (workspace,)).fetchone()[0]
+            for op in ops:
+                kind = op[0]
+                if kind == "put":
+                    _, name, proxy, tag, position = op
+                    conn.execute(
+                        "INSERT INTO nodes (workspace, name, position, data, tag, updated) VALUES (?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT (workspace, name) DO UPDATE SET position = excluded.position, "
+                        "data = excluded.data, tag = excluded.tag, updated = excluded.updated",
+                        (workspace, name, position, _dumps(proxy), tag, version))
+                elif kind == "rename":
+                    conn.execute("UPDATE nodes SET name = ?, updated = ? WHERE workspace = ? AND name = ?",
+                                 (op[2], version, workspace, op[1]))
+                elif kind == "delete":
+                    conn.execute("DELETE FROM nodes WHERE workspace = ? AND name = ?", (workspace, op[1]))
+                elif kind == "clear":
+                    conn.execute("DELETE FROM nodes WHERE workspace = ?", (workspace,))
+                else:
+                    raise ValueError(f"未知的节点操作: {kind}")
+        return version
+
+    # ------------------------------------------
+    # 自定义规则 (按文本去重，保持添加顺序)
+    # ------------------------------------------
+    def load_rules(self, workspace):
+        return [r[0] for r in self._conn().execute(
+            "SELECT rule FROM rules WHERE workspace = ? ORDER BY position", (workspace,))]
+
+    def add_rules(self, workspace, rules):
+        if not rules:
+            return
+        with self._write(workspace) as conn:
+            start = conn.execute("SELECT COALESCE(MAX(position), 0) FROM rules WHERE workspace = ?",
+                                 (workspace,)).fetchone()[0]
+            conn.executemany("INSERT OR IGNORE INTO rules (workspace, rule, position) VALUES (?, ?, ?)",
+                             [(workspace, rule, start + i + 1) for i, rule in enumerate(rules)])
+
+    def delete_rule(self, workspace, rule):
+        with self._write(workspace) as conn:
+            conn.execute("DELETE FROM rules WHERE workspace = ? AND rule = ?", (workspace, rule))
+
+    # ------------------------------------------
+    # 自定义规则集
+    # ------------------------------------------
+    def load_providers(self, workspace):
+        return {name: json.loads(data) for name, data in self._conn().execute(
+            "SELECT name, data FROM providers WHERE workspace = ? ORDER BY position", (workspace,))}
+
+    def put_provider(self, workspace, name, config):
+        with self._write(workspace) as conn:
+            position = conn.execute("SELECT COALESCE(MAX(position), 0) + 1 FROM providers WHERE workspace = ?",
+                                    (workspace,)).fetchone()[0]
+            conn.execute(
+                "INSERT INTO providers (workspace, name, position, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (workspace, name) DO UPDATE SET data = excluded.data",
+                (workspace, name, position, _dumps(config)))
+
+    def delete_provider(self, workspace, name):
+        with self._write(workspace) as conn:
+            conn.execute("DELETE FROM providers WHERE workspace = ? AND name = ?", (workspace, name))
+
+    # ------------------------------------------
+    # 设置 (全局设置、生成模式、规则类型)
+    # ------------------------------------------
+    def _load_raw_settings(self, workspace):
+        return dict(self._conn().execute("SELECT key, value FROM settings WHERE workspace = ?", (workspace,)))
+
+    def load_settings(self, workspace):
+        # 先读版本号：两次读取之间有写入时缓存的版本号偏旧，下次保存时会重新读取
+        version = self.version(workspace)
+        raw = self._load_raw_settings(workspace)
+        with self._lock:
+            self._settings[workspace] = (version, dict(raw))
+        return {key: json.loads(value) for key, value in raw.items()}
+
+    def save_settings(self, workspace, settings):
+        """
+        只写入与数据库中的当前值不同的设置项，返回写入的项数。
+        已持久化的设置按工作区版本号缓存，工作区被其他会话或进程修改后重新读取。
+        """
+        version = self.version(workspace)
+        with self._lock:
+            cached = self._settings.get(workspace)
+        if cached is not None and cached[0] == version:
+            known = cached[1]
+        else:
+            known = self._load_raw_settings(workspace)
+            with self._lock:
+                self._settings[workspace] = (version, known)
+        changed = []
+        for key, value in settings.items():
+            text = _dumps(value)
+            if known.get(key) != text:
+                changed.append((workspace, key, text))
+        if not changed:
+            return 0
+        with self._write(workspace) as conn:
+            conn.executemany(
+                "INSERT INTO settings (workspace, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (workspace, key) DO UPDATE SET value = excluded.value", changed)
+            new_version = conn.execute("SELECT version FROM workspaces WHERE workspace = ?",
+                                       (workspace,)).fetchone()[0]
+        with self._lock:
+            if new_version == (version or 0) + 1:
+                known = dict(known)
+                known.update((key, text) for _, key, text in changed)
+                self._settings[workspace] = (new_version, known)
+            else:
+                # 期间有其他写入，下次保存时重新读取
+                self._settings.pop(workspace, None)
+        return len(changed)
+
+    @staticmethod
+    def _global_config(settings, defaults):
+        config = dict(defaults or {})
+        config.update((key[len(GLOBAL_PREFIX):], value) for key, value in settings.items()
+                      if key.startswith(GLOBAL_PREFIX))
+        return config
+
+    def load_global_config(self, workspace, defaults):
+        """读取全局设置，缺少的项使用 defaults (新增设置项时旧工作区自动获得默认值)"""
+        return self._global_config(self.load_settings(workspace), defaults)
+
+    def save_global_config(self, workspace, global_config):
+        return self.save_settings(workspace, {GLOBAL_PREFIX + key: value for key, value in global_config.items()})
+
+    # ------------------------------------------
+    # 完整档案与订阅关联
+    # ------------------------------------------
+    def load_profile(self, workspace, defaults=None):
+        """
+        以 profiles.PROFILE_KEYS 的结构读取整个工作区，供 API 直接渲染；工作区不存在时返回 None。
+        defaults 为全局设置的默认值 (config_builder.DEFAULT_GLOBAL_CONFIG)。
+        """
+        if self.version(workspace) is None:
+            return None
+        settings = self.load_settings(workspace)
+        return {
+            "global_config": self._global_config(settings, defaults),
+            "proxies": [proxy for _, proxy, _, _ in self.load_nodes(workspace)],
+            "custom_rules": self.load_rules(workspace),
+            "custom_rule_providers": self.load_providers(workspace),
+            "target_mode": settings.get("target_mode"),
+            "rule_type": settings.get("rule_type"),
+        }
+
+    def link(self, token, workspace):
+        """将订阅 token 关联到工作区，API 按工作区的最新内容渲染"""
+        conn = self._conn()
+        conn.execute("INSERT INTO links (token, workspace) VALUES (?, ?) "
+                     "ON CONFLICT (token) DO UPDATE SET workspace = excluded.workspace", (token, workspace))
+
+    def unlink(self, token):
+        self._conn().execute("DELETE FROM links WHERE token = ?", (token,))
+
+    def linked_workspace(self, token):
+        row = self._conn().execute("SELECT workspace FROM links WHERE token = ?", (token,)).fetchone()
+        return row[0] if row else None
+
+
+class WorkspaceNodeStore(NodeStore):
+    """
+    与工作区同步的 NodeStore：每次增删改只写入变化的节点。
+    batch() 内的变更合并为一个事务，用于批量导入。
+    打开时只读取节点索引，节点内容在用到时才读取 (未读取的节点值为 None)，指纹索引在首次去重时建立。
+    refresh() 按节点版本号增量读取其他会话写入的变更，增删改之前会先调用。
+    """
+
+    def __init__(self, store, workspace=DEFAULT_WORKSPACE):
+        super().__init__()
+        self.store = store
+        self.workspace = workspace
+        self._positions = {}    # name -> 数据库中的位置
+        self._next_position = 1
+        self._pending = None    # batch() 内累积的操作
+        self._version = 0       # 内存中的节点对应的节点版本号
+        self._synced = False    # 内存中的节点与数据库在 _version 时的内容一致
+        self._fp_ready = True   # 指纹索引是否已建立
+        self._reload(None)
+
+    def _reload(self, since):
+        """重新读取节点索引；节点版本号 since 之后写入的节点 (since 为 None 时为全部) 标记为未读取"""
+        version, index, changed = self.store.node_snapshot(self.workspace, since)
+        if since is not None and version < since:
+            changed = None  # 数据库被替换过
+        nodes, tags, positions = {}, {}, {}
+        for name, position, tag in index:
+            nodes[name] = None if changed is None or name in changed else self._nodes.get(name)
+            if tag:
+                tags[name] = tag
+            positions[name] = position
+        self._nodes, self._tags, self._positions = nodes, tags, positions
+        self._next_position = max(positions.values(), default=0) + 1
+        self._name_seq.clear()
+        self._by_fp = {}
+        self._fp_ready = not nodes
+        self._version = version
+        self._synced = True
+        self._changed()
+
+    def refresh(self):
+        """其他会话修改了工作区的节点时重新读取，返回是否有变化；batch() 内不做任何事"""
+        if self._pending is not None:
+            return False
+        if self._synced and self.store.nodes_version(self.workspace) == self._version:
+            return False
+        self._reload(self._version)
+        return True
+
+    def _load(self, names):
+        """读取并解码指定节点的内容"""
+        if not names:
+            return
+        rows = self.store.node_data(self.workspace, None if len(names) == len(self._nodes) else names)
+        dropped = False
+        for name in names:
+            row = rows.get(name)
+            if row is None:
+                # 已被其他会话删除，下次 refresh() 时同步
+                self._nodes.pop(name, None)
+                self._tags.pop(name, None)
+                self._positions.pop(name, None)
+                dropped = True
+                continue
+            data, updated = row
+            self._nodes[name] = json.loads(data)
+            if updated > self._version:
+                self._synced = False
+        if dropped:
+            self._synced = False
+            self._changed()
+
+    def _load_all(self):
+        self._load([name for name, proxy in self._nodes.items() if proxy is None])
+
+    def _ensure_fingerprints(self):
+        if self._fp_ready:
+            return
+        self._load_all()
+        by_fp = {}
+        for name, proxy in self._nodes.items():
+            by_fp.setdefault(fingerprint(proxy), name)
+        self._by_fp = by_fp
+        self._fp_ready = True
+
+    def __iter__(self):
+        return iter(self.proxies)
+
+    @property
+    def proxies(self):
+        if self._list is None:
+            self._load_all()
+        return super().proxies
+
+    def cache_key(self):
+        """与数据库一致时以 (数据库, 工作区, 节点版本号) 为键，打开同一工作区的各个会话共用构建缓存"""
+        if self._synced and self._pending is None:
+            return self.store.path, self.workspace, self._version
+        return super().cache_key()
+
+    def get(self, name):
+        proxy = self._nodes.get(name)
+        if proxy is None and name in self._nodes:
+            self._load([name])
+            proxy = self._nodes.get(name)
+        return proxy
+
+    def find_duplicate(self, proxy):
+        self._ensure_fingerprints()
+        return super().find_duplicate(proxy)
+
+    def _search_index(self):
+        if self._index is None:
+            self._load_all()
+        return super()._search_index()
+
+    def _record(self, *ops):
+        if self._pending is not None:
+            self._pending.extend(ops)
+        else:
+            self._written(self.store.apply_node_ops(self.workspace, list(ops)))
+
+    def _written(self, version):
+        """写入完成：期间没有其他会话写入节点时直接推进版本号，否则留给下次 refresh() 重新读取"""
+        if version is None:
+            return
+        if version == self._version + 1:
+            self._version = version
+        else:
+            self._synced = False
+
+    @contextmanager
+    def batch(self):
+        if self._pending is not None:
+            yield self
+            return
+        self.refresh()
+        self._pending = []
+        try:
+            yield self
+        finally:
+            ops, self._pending = self._pending, None
+            self._written(self.store.apply_node_ops(self.workspace, ops))
+
+    def add(self, proxy, tag=None):
+        self.refresh()
+        self._ensure_fingerprints()
+        name = super().add(proxy, tag=tag)
+        if name is not None:
+            position = self._positions[name] = self._next_position
+            self._next_position += 1
+            self._record(("put", name, self._nodes[name], tag, position))
+        return name
+
+    def add_many(self, proxies, tag=None):
+        with self.batch():
+            return super().add_many(proxies, tag=tag)
+
+    def remove(self, name):
+        self.refresh()
+        # 先读取节点内容：用于维护指纹索引，并作为返回值
+        if self.get(name) is None:
+            return None
+        proxy = super().remove(name)
+        self._positions.pop(name, None)
+        self._record(("delete", name))
+        return proxy
+
+    def remove_many(self, names):
+        with self.batch():
+            self._load([name for name in names if name in self._nodes and self._nodes[name] is None])
+            return super().remove_many(names)
+
+    def replace(self, name, proxy):
+        self.refresh()
+        self._ensure_fingerprints()
+        super().replace(name, proxy)
+        new_name = proxy.get("name", name)
+        position = self._positions.pop(name)
+        self._positions[new_name] = position
+        ops = [("rename", name, new_name)] if new_name != name else []
+        ops.append(("put", new_name, proxy, self._tags.get(new_name), position))
+        self._record(*ops)
+
+    def clear(self):
+        super().clear()
+        self._positions.clear()
+        self._next_position = 1
+        self._fp_ready = True
+        self._record(("clear",))
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_default_store():
+    """进程内共享的默认工作区数据库"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = WorkspaceStore()
+        return _default_store
@@ -0,0 +1,138 @@
+import re
+
+import yaml
+
+# ==========================================
+# YAML 读写 (优先使用 libyaml)
+# ==========================================
+# 安装了 libyaml 时使用 CSafeLoader / CSafeDumper，否则回退到纯 Python 实现。
+# 两种实现的输出逐字节一致：libyaml 会把 BMP 以外的字符 (如 emoji) 转义为 "\U0001F41F"，
+# 因此 dump 前将这类字符临时替换为私用区占位符，输出后再换回原字符。
+
+LIBYAML = hasattr(yaml, "CSafeDumper")
+Loader = yaml.CSafeLoader if LIBYAML else yaml.SafeLoader
+Dumper = yaml.CSafeDumper if LIBYAML else yaml.SafeDumper
+YAMLError = yaml.YAMLError
+
+# 仓库统一的输出风格：保留中文、保持键顺序、块风格
+DUMP_DEFAULTS = {"allow_unicode": True, "sort_keys": False, "default_flow_style": False}
+
+_PLACEHOLDER_BASE = 0xE000
+_PLACEHOLDER_LIMIT = 0xF8FF
+_SPECIAL_RE = re.compile(r"[\uE000-\uF8FF\U00010000-\U0010FFFF]")
+
+
+class _Fallback(Exception):
+    """数据本身含有私用区字符或占位符不够用，改用纯 Python 实现"""
+
+
+class _AstralMasker:
+    """将 BMP 以外的字符替换为私用区占位符，共享对象替换后仍保持共享 (锚点不变)"""
+
+    def __init__(self):
+        self.forward = {}   # 原字符 -> 占位符
+        self.reverse = {}   # 占位符码位 -> 原字符
+        self._memo = {}
+
+    def _sub(self, match):
+        ch = match.group()
+        if ord(ch) <= _PLACEHOLDER_LIMIT:
+            raise _Fallback()
+        placeholder = self.forward.get(ch)
+        if placeholder is None:
+            code = _PLACEHOLDER_BASE + len(self.forward)
+            if code > _PLACEHOLDER_LIMIT:
+                raise _Fallback()
+            placeholder = self.forward[ch] = chr(code)
+            self.reverse[code] = ch
+        return placeholder
+
+    def mask(self, obj):
+        """返回替换后的对象；不含特殊字符的子树原样返回"""
+        if isinstance(obj, str):
+            if obj.isascii():
+                return obj
+            return _SPECIAL_RE.sub(self._sub, obj)
+        if not isinstance(obj, (dict, list)):
+            return obj
+        key = id(obj)
+        if key in self._memo:
+            return self._memo[key]
+        if isinstance(obj, dict):
+            items = [(self.mask(k), self.mask(v)) for k, v in obj.items()]
+            changed = any(k is not k0 or v is not v0 for (k, v), (k0, v0) in zip(items, obj.items()))
+            result = dict(items) if changed else obj
+        else:
+            values = [self.mask(v) for v in obj]
+            changed = any(v is not v0 for v, v0 in zip(values, obj))
+            result = values if changed else obj
+        self._memo[key] = result
+        return result
+
+
+def load(stream):
+    """解析 YAML 字符串 / 字节 / 文件对象"""
+    return yaml.load(stream, Loader=Loader)
+
+
+def _scan_payload(text):
+    """
+    逐行读取只含 payload 列表的简单 YAML (大型规则集的常见格式)，比完整解析快一个数量级。
+    遇到其他结构时返回 None，交给 YAML 解析器处理。
+    """
+    lines = iter(text.splitlines())
+    for line in lines:
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        if stripped != "payload:":
+            return None
+        break
+    cidrs = []
+    for line in lines:
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        if not stripped.startswith("- "):
+            return None
+        value = stripped[2:].strip()
+        if value[:1] in ("'", '"'):
+            if len(value) < 2 or value[-1] != value[0]:
+                return None
+            value = value[1:-1]
+        elif "#" in value:
+            value = value.split(" #", 1)[0].strip()
+        cidrs.append(value)
+    return cidrs
+
+
+def load_payload(text):
+    """读取规则集文件 (payload: 列表) 的全部条目，返回字符串列表"""
+    entries = _scan_payload(text)
+    if entries is None:
+        data = load(text)
+        payload = data.get("payload") if isinstance(data, dict) else None
+        entries = [str(v) for v in payload or []]
+    return entries
+
+
+def dump(data, stream=None, **kwargs):
+    """
+    序列化为 YAML，参数同 yaml.dump (默认使用 DUMP_DEFAULTS)。
+    stream 为空时返回字符串，否则写入 stream。
+    """
+    options = dict(DUMP_DEFAULTS, **kwargs)
+    if LIBYAML and options.get("allow_unicode"):
+        masker = _AstralMasker()
+        try:
+            masked = masker.mask(data)
+        except _Fallback:
+            return yaml.dump(data, stream, Dumper=yaml.SafeDumper, **options)
+        text = yaml.dump(masked, Dumper=Dumper, **options)
+        if masker.reverse:
+            text = text.translate(masker.reverse)
+    else:
+        text = yaml.dump(data, Dumper=Dumper, **options)
+    if stream is None:
+        return text
+    stream.write(text)
@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# 各模块在导入时读取数据目录，须在导入 src 下任何模块之前设置
+os.environ.setdefault("CLASH_GEN_DATA_DIR", tempfile.mkdtemp(prefix="clash-gen-test-"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
@@ -0,0 +1,132 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+import artifacts
+from config_builder import DEFAULT_GLOBAL_CONFIG, RULE_TYPE_CUSTOM, TARGET_DESKTOP
+from prober import LATENCY_PATH, save_table
+from profiles import delete_profile, new_token, save_profile
+
+
+def make_profile(**gc):
+    return {
+        "global_config": dict(DEFAULT_GLOBAL_CONFIG, **gc),
+        "proxies": [{"name": "a", "type": "trojan", "server": "a.example.com", "port": 443, "password": "pw"}],
+        "custom_rules": [],
+        "custom_rule_providers": {},
+        "target_mode": TARGET_DESKTOP,
+        "rule_type": RULE_TYPE_CUSTOM,
+    }
+
+
+def touch_table():
+    """写入延迟表并确保修改时间前进"""
+    save_table({})
+    stat = os.stat(LATENCY_PATH)
+    os.utime(LATENCY_PATH, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    calls = []
+    render_profile = artifacts.render_profile
+
+    def counting(profile, variant=None):
+        calls.append(variant)
+        return render_profile(profile, variant)
+
+    monkeypatch.setattr(artifacts, "render_profile", counting)
+    return calls
+
+
+@pytest.fixture
+def token():
+    token = new_token()
+    yield token
+    delete_profile(token)
+
+
+def test_source_ignores_unused_latency_table(token):
+    touch_table()
+    save_profile(token, make_profile(skip_unreachable=False))
+    source = artifacts.current_source(token)
+    assert source[1] is None and source[2] is None
+
+    touch_table()
+    assert artifacts.current_source(token) == source
+
+
+def test_source_tracks_latency_table_when_used(token):
+    touch_table()
+    save_profile(token, make_profile(skip_unreachable=True))
+    source = artifacts.current_source(token)
+    assert source[2] is not None
+
+    touch_table()
+    assert artifacts.current_source(token)[2] != source[2]
+
+
+def test_source_follows_profile_settings(token):
+    save_profile(token, make_profile(skip_unreachable=False))
+    assert artifacts.current_source(token)[2] is None
+    touch_table()
+    save_profile(token, make_profile(skip_unreachable=True))
+    assert artifacts.current_source(token)[2] is not None
+
+
+def test_latency_update_does_not_rerender_unrelated_profiles(token, renders):
+    client = TestClient(api.app)
+    save_profile(token, make_profile(skip_unreachable=False))
+    artifacts.publish_all(token)
+    renders.clear()
+
+    touch_table()
+    resp = client.get(f"/sub/{token}")
+    assert resp.status_code == 200
+    assert renders == []
+
+    save_profile(token, make_profile(skip_unreachable=True))
+    artifacts.publish_all(token)
+    renders.clear()
+    touch_table()
+    assert client.get(f"/sub/{token}").status_code == 200
+    assert renders == [None]
+
+
+def test_deleted_profile_leaves_no_cache_entries(token):
+    client = TestClient(api.app)
+    save_profile(token, make_profile())
+    artifacts.publish_all(token)
+    assert client.get(f"/sub/{token}").status_code == 200
+    assert (token, None) in api._pointer_cache and token in artifacts._inputs
+
+    delete_profile(token)
+    assert client.get(f"/sub/{token}").status_code == 404
+    assert all(key[0] != token for key in api._pointer_cache)
+    assert all(key[0] != token for key in artifacts._locks)
+    assert token not in artifacts._inputs
+
+
+def test_caches_are_bounded(monkeypatch):
+    monkeypatch.setattr(artifacts, "_CACHE_SIZE", 2)
+    monkeypatch.setattr(api, "_POINTER_CACHE_SIZE", 2)
+    client = TestClient(api.app)
+    tokens = [new_token() for _ in range(4)]
+    try:
+        for token in tokens:
+            save_profile(token, make_profile())
+            artifacts.publish_all(token)
+            assert client.get(f"/sub/{token}").status_code == 200
+        assert len(api._pointer_cache) == 2 and len(artifacts._locks) == 2 and len(artifacts._inputs) == 2
+        assert list(artifacts._inputs) == tokens[2:]
+
+        # 正在持有的渲染锁不会被淘汰
+        with artifacts._render_lock(tokens[0], None):
+            artifacts._render_lock(tokens[1], None)
+            artifacts._render_lock(tokens[2], None)
+            assert (tokens[0], None) in artifacts._locks
+    finally:
+        for token in tokens:
+            delete_profile(token)
@@ -0,0 +1,96 @@
+import ipaddress
+import random
+
+import pytest
+
+from cidr import aggregate, aggregate_provider_file, aggregate_rules, parse_cidr
+
+
+def covered(cidrs):
+    return {net for c in cidrs for net in [ipaddress.ip_network(c, strict=False)]}
+
+
+def addresses(cidrs):
+    result = set()
+    for net in covered(cidrs):
+        result.update(range(int(net.network_address), int(net.broadcast_address) + 1))
+    return result
+
+
+def test_merge_adjacent_and_contained():
+    merged, invalid = aggregate(["10.0.0.0/25", "10.0.0.128/25", "10.0.1.0/24", "10.0.0.5/32", "192.168.1.1"])
+    assert merged == ["10.0.0.0/23", "192.168.1.1/32"]
+    assert invalid == []
+
+
+def test_non_aligned_range_is_split():
+    merged, _ = aggregate(["10.0.0.1/32", "10.0.0.2/31", "10.0.0.4/30"])
+    assert merged == ["10.0.0.1/32", "10.0.0.2/31", "10.0.0.4/30"]
+
+
+def test_ipv6_and_invalid_entries():
+    merged, invalid = aggregate(["2001:db8::/33", "2001:db8:8000::/33", "1.1.1.0/24", "bogus", "1.1.1.0/33"])
+    assert merged == ["1.1.1.0/24", "2001:db8::/32"]
+    assert invalid == ["bogus", "1.1.1.0/33"]
+
+
+def test_random_sets_cover_same_addresses():
+    rng = random.Random(7)
+    for _ in range(50):
+        cidrs = [f"10.0.{rng.randrange(4)}.{rng.randrange(256)}/{rng.randrange(24, 33)}" for _ in range(30)]
+        merged, _ = aggregate(cidrs)
+        assert addresses(merged) == addresses(cidrs)
+        assert len(merged) <= len(set(cidrs))
+
+
+def test_parse_cidr_rejects_garbage():
+    with pytest.raises(ValueError):
+        parse_cidr("10.0.0.0/abc")
+
+
+def test_aggregate_rules_keeps_order_and_options():
+    rules = [
+        "IP-CIDR,10.0.0.0/25,DIRECT,no-resolve",
+        "IP-CIDR,10.0.0.128/25,DIRECT,no-resolve",
+        "IP-CIDR,10.0.1.0/24,DIRECT",
+        "DOMAIN,example.com,Proxy",
+        "IP-CIDR,10.0.2.0/24,Proxy",
+        "IP-CIDR,10.0.3.0/24,Proxy",
+        "IP-CIDR,not-a-cidr,Proxy",
+        "MATCH,DIRECT",
+    ]
+    result, before, after = aggregate_rules(rules)
+    assert result == [
+        "IP-CIDR,10.0.0.0/24,DIRECT,no-resolve",
+        "IP-CIDR,10.0.1.0/24,DIRECT",
+        "DOMAIN,example.com,Proxy",
+        "IP-CIDR,10.0.2.0/23,Proxy",
+        "IP-CIDR,not-a-cidr,Proxy",
+        "MATCH,DIRECT",
+    ]
+    assert (before, after) == (5, 3)
+
+
+def test_aggregate_provider_file_formats():
+    content, before, after, invalid = aggregate_provider_file(b"payload:\n  - 10.0.0.0/25\n  - 10.0.0.128/25\n")
+    assert content == b"payload:\n- 10.0.0.0/24\n"
+    assert (before, after, invalid) == (2, 1, [])
+
+    content, before, after, invalid = aggregate_provider_file(b"# list\n10.0.0.0/25\n10.0.0.128/25\nbad\n")
+    assert content == b"10.0.0.0/24\n"
+    assert (before, after, invalid) == (3, 1, ["bad"])
+
+
+def test_build_config_aggregates_only_when_enabled():
+    from config_builder import DEFAULT_GLOBAL_CONFIG, RULE_TYPE_CUSTOM, TARGET_DESKTOP, build_config
+
+    proxies = [{"name": "a", "type": "trojan", "server": "a.example.com", "port": 443, "password": "pw"}]
+    rules = ["IP-CIDR,10.0.0.0/25,DIRECT", "IP-CIDR,10.0.0.128/25,DIRECT"]
+
+    config = build_config(DEFAULT_GLOBAL_CONFIG, proxies, rules, {}, TARGET_DESKTOP, rule_type=RULE_TYPE_CUSTOM)
+    assert all(rule in config["rules"] for rule in rules)
+
+    gc = dict(DEFAULT_GLOBAL_CONFIG, aggregate_cidr=True)
+    config = build_config(gc, proxies, rules, {}, TARGET_DESKTOP, rule_type=RULE_TYPE_CUSTOM)
+    assert "IP-CIDR,10.0.0.0/24,DIRECT" in config["rules"]
+    assert not any(rule in config["rules"] for rule in rules)
@@ -0,0 +1,121 @@
+import pytest
+
+from healthcheck import MAX_INTERVAL, apply_budget, group_members, probe_load
+from prober import STATUS_OK, STATUS_UNREACHABLE
+
+URL = "http://www.gstatic.com/generate_204"
+
+
+def make_proxies(count):
+    return [{"name": f"n{i}", "type": "ss", "server": f"s{i}.example.com", "port": 8388,
+             "cipher": "aes-128-gcm", "password": "pw"} for i in range(count)]
+
+
+def url_test(name, members, interval=300, **extra):
+    return dict({"name": name, "type": "url-test", "proxies": members, "url": URL, "interval": interval}, **extra)
+
+
+def make_config(proxies, groups, rules=("MATCH,Proxy",)):
+    return {"proxies": proxies, "proxy-groups": groups, "rules": list(rules)}
+
+
+def latency(proxies, ms=None, dead=()):
+    """ms: {节点名: 握手耗时}，dead: 不可达的节点名"""
+    endpoints = {}
+    for proxy in proxies:
+        key = f"{proxy['server']}:{proxy['port']}"
+        if proxy["name"] in dead:
+            endpoints[key] = {"status": STATUS_UNREACHABLE}
+        elif ms and proxy["name"] in ms:
+            endpoints[key] = {"status": STATUS_OK, "tcp_ms": ms[proxy["name"]], "tls_ms": None}
+    return {"probed_at": 0, "endpoints": endpoints}
+
+
+def test_probe_load_lazy_and_active():
+    proxies = make_proxies(10)
+    names = [p["name"] for p in proxies]
+    groups = [
+        {"name": "Proxy", "type": "select", "proxies": ["Auto", "Fallback", "Eager"]},
+        url_test("Auto", names, interval=300),                               # 默认选项，在用
+        url_test("Fallback", names[:4], interval=60, type="fallback"),       # lazy 且未被选中
+        url_test("Eager", names[:6], interval=120, lazy=False),              # 不 lazy，始终探测
+        url_test("NoUrl", names, url=None),
+    ]
+    load = probe_load(make_config(proxies, groups))
+    rows = {row["name"]: row for row in load["groups"]}
+    assert set(rows) == {"Auto", "Fallback", "Eager"}
+    assert rows["Auto"] == {"name": "Auto", "type": "url-test", "members": 10, "interval": 300,
+                            "lazy": True, "active": True, "rate": 2.0}
+    assert rows["Fallback"]["rate"] == 4.0 and not rows["Fallback"]["active"]
+    assert rows["Eager"]["rate"] == 3.0 and not rows["Eager"]["lazy"]
+    assert load["worst"] == 9.0
+    assert load["expected"] == 5.0
+
+
+def test_group_members_filters():
+    names = ["香港 01", "香港 02", "日本 01", "美国 01"]
+    group = {"name": "HK", "proxies": ["DIRECT"], "include-all-proxies": True, "filter": "香港|日本",
+             "exclude-filter": "日本"}
+    assert group_members(group, names) == ["DIRECT", "香港 01", "香港 02"]
+    # 无法解析的 filter 视为不筛选
+    assert group_members({"name": "All", "include-all": True, "filter": "(?<bad"}, names) == names
+
+
+def test_fanout_keeps_best_ranked_nodes():
+    proxies = make_proxies(10)
+    names = [p["name"] for p in proxies]
+    groups = [url_test("Auto", ["Sub"] + names)]
+    table = latency(proxies, ms={"n9": 20, "n3": 50, "n5": 10, "n0": 200}, dead={"n1", "n2"})
+    planned, changes = apply_budget(groups, proxies, budget=1000, max_fanout=6, latency_table=table)
+    # 可达的按延迟升序，其次未探测的；保持原有顺序，不是节点的成员不计入
+    assert planned[0]["proxies"] == ["Sub", "n0", "n3", "n4", "n5", "n6", "n9"]
+    assert planned[0]["lazy"] is True
+    assert changes == ["Auto: 成员节点 10 -> 6"]
+    assert groups[0]["proxies"] == ["Sub"] + names
+
+    # 没有延迟表时保留前 max_fanout 个
+    planned, _ = apply_budget(groups, proxies, budget=1000, max_fanout=3)
+    assert planned[0]["proxies"] == ["Sub", "n0", "n1", "n2"]
+
+
+def test_interval_scaled_to_budget():
+    proxies = make_proxies(30)
+    names = [p["name"] for p in proxies]
+    groups = [url_test("A", names, interval=60), url_test("B", names[:10], interval=120),
+              {"name": "Proxy", "type": "select", "proxies": ["A", "B"]}]
+    assert probe_load(make_config(proxies, groups))["worst"] == 35.0
+
+    planned, changes = apply_budget(groups, proxies, budget=10, max_fanout=0)
+    load = probe_load(make_config(proxies, planned))
+    assert load["worst"] <= 10
+    assert [g.get("interval") for g in planned] == [210, 420, None]
+    assert "A: interval 60s -> 210s" in changes
+    assert planned[2] is groups[2]
+
+
+def test_interval_cap_is_reported():
+    proxies = make_proxies(100)
+    groups = [url_test("A", [p["name"] for p in proxies], interval=600)]
+    planned, changes = apply_budget(groups, proxies, budget=1, max_fanout=0)
+    assert planned[0]["interval"] == MAX_INTERVAL
+    assert probe_load(make_config(proxies, planned))["worst"] > 1
+    assert changes[-1].startswith(f"interval 已达上限 {MAX_INTERVAL}s")
+
+
+@pytest.mark.parametrize("include_key", ["include-all-proxies", "include-all"])
+def test_include_all_groups_are_not_truncated(include_key):
+    proxies = make_proxies(20)
+    names = [p["name"] for p in proxies]
+    groups = [url_test("Auto", names[:5], **{include_key: True, "filter": "n1"})]
+    planned, changes = apply_budget(groups, proxies, budget=1000, max_fanout=4)
+    assert planned[0]["proxies"] == names[:5]
+    assert planned[0]["filter"] == "n1"
+    assert not changes
+    # 成员为显式列出的 n0..n4 加上按 filter 筛选的 n10..n19
+    assert probe_load(make_config(proxies, planned))["groups"][0]["members"] == 15
+
+
+def test_zero_budget_is_a_no_op():
+    proxies = make_proxies(5)
+    groups = [url_test("Auto", [p["name"] for p in proxies])]
+    assert apply_budget(groups, proxies, budget=0) == (groups, [])
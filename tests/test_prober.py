@@ -0,0 +1,176 @@
+import asyncio
+import shutil
+import socket
+import ssl
+import subprocess
+import threading
+import time
+
+import pytest
+
+from config_builder import DEFAULT_GLOBAL_CONFIG, RULE_TYPE_CUSTOM, TARGET_DESKTOP, build_config
+from prober import (
+    STATUS_OK, STATUS_SKIPPED, STATUS_TLS_ERROR, STATUS_UNREACHABLE,
+    endpoint_key, node_status, probe_endpoints, probe_proxies, summarize, unreachable_names
+)
+
+TIMEOUT = 0.5
+
+
+@pytest.fixture(scope="module")
+def cert(tmp_path_factory):
+    if shutil.which("openssl") is None:
+        pytest.skip("需要 openssl 生成自签证书")
+    path = tmp_path_factory.mktemp("cert")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=localhost",
+                    "-keyout", str(path / "key.pem"), "-out", str(path / "cert.pem")],
+                   check=True, capture_output=True)
+    return str(path / "cert.pem"), str(path / "key.pem")
+
+
+@pytest.fixture(scope="module")
+def listeners(cert):
+    """在后台事件循环中启动本地监听：plain (TCP，连接后立即关闭)、tls (自签证书)、hang (接受连接但不响应)"""
+    loop = asyncio.new_event_loop()
+    ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    ctx.load_cert_chain(*cert)
+
+    async def close_now(reader, writer):
+        writer.close()
+
+    async def read_until_eof(reader, writer):
+        try:
+            await reader.read()
+        except (OSError, ssl.SSLError):
+            pass
+        writer.close()
+
+    async def start():
+        servers = {
+            "plain": await asyncio.start_server(close_now, "127.0.0.1", 0),
+            "tls": await asyncio.start_server(read_until_eof, "127.0.0.1", 0, ssl=ctx),
+            # 读取客户端数据但从不回应，直到客户端超时断开
+            "hang": await asyncio.start_server(read_until_eof, "127.0.0.1", 0),
+        }
+        return servers
+
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    servers = asyncio.run_coroutine_threadsafe(start(), loop).result(5)
+    yield {name: server.sockets[0].getsockname()[1] for name, server in servers.items()}
+    for server in servers.values():
+        loop.call_soon_threadsafe(server.close)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+
+
+@pytest.fixture
+def closed_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def ss(name, port, server="127.0.0.1"):
+    return {"name": name, "type": "ss", "server": server, "port": port, "cipher": "aes-128-gcm", "password": "pw"}
+
+
+def trojan(name, port, sni="localhost"):
+    return {"name": name, "type": "trojan", "server": "127.0.0.1", "port": port, "password": "pw", "sni": sni}
+
+
+def hy2(name, port):
+    return {"name": name, "type": "hysteria2", "server": "127.0.0.1", "port": port, "password": "pw"}
+
+
+def test_tcp_and_tls_timings(listeners):
+    proxies = [ss("tcp", listeners["plain"]), trojan("tls", listeners["tls"])]
+    table = probe_proxies(proxies, timeout=TIMEOUT)
+
+    tcp, tls = (node_status(p, table) for p in proxies)
+    assert tcp["status"] == STATUS_OK and tls["status"] == STATUS_OK
+    for entry in (tcp, tls):
+        assert 0 <= entry["dns_ms"] < TIMEOUT * 1000
+        assert 0 <= entry["tcp_ms"] < TIMEOUT * 1000
+        assert entry["error"] is None
+        assert entry["checked_at"] > 0
+    assert tcp["tls_ms"] is None
+    assert 0 < tls["tls_ms"] < TIMEOUT * 1000
+
+
+def test_unreachable_classification(listeners, closed_port):
+    proxies = [
+        ss("refused", closed_port),
+        trojan("not-tls", listeners["plain"]),
+        trojan("tls-timeout", listeners["hang"]),
+        ss("no-dns", 443, server="no-such-host.invalid"),
+    ]
+    table = probe_proxies(proxies, timeout=TIMEOUT)
+    refused, not_tls, tls_timeout, no_dns = (node_status(p, table) for p in proxies)
+
+    assert refused["status"] == STATUS_UNREACHABLE
+    assert refused["error"].startswith("TCP 连接失败")
+    assert refused["tcp_ms"] is None
+    assert not_tls["status"] == STATUS_TLS_ERROR
+    assert not_tls["tcp_ms"] is not None
+    assert tls_timeout["status"] == STATUS_TLS_ERROR
+    assert tls_timeout["error"] == "TLS 握手失败: 超时"
+    assert no_dns["status"] == STATUS_UNREACHABLE
+    assert no_dns["error"].startswith("DNS 解析失败")
+    assert unreachable_names(proxies, table) == {"refused", "not-tls", "tls-timeout", "no-dns"}
+
+
+def test_timeouts_run_concurrently(listeners):
+    proxies = [trojan(f"hang-{i}", listeners["hang"], sni=f"h{i}.test") for i in range(8)]
+    start = time.monotonic()
+    table = probe_proxies(proxies, timeout=TIMEOUT)
+    elapsed = time.monotonic() - start
+
+    assert len(table["endpoints"]) == 8
+    assert all(e["status"] == STATUS_TLS_ERROR for e in table["endpoints"].values())
+    # 每个地址最多占用一个超时，并发探测的总耗时接近单个超时
+    assert elapsed < TIMEOUT * 3
+
+    start = time.monotonic()
+    endpoints = {f"k{i}": ("127.0.0.1", listeners["hang"], f"c{i}.test") for i in range(3)}
+    asyncio.run(probe_endpoints(endpoints, concurrency=1, timeout=0.2))
+    assert time.monotonic() - start >= 0.6
+
+
+def test_same_endpoint_probed_once(listeners):
+    proxies = [ss("a", listeners["plain"]), ss("b", listeners["plain"]), trojan("c", listeners["tls"])]
+    table = probe_proxies(proxies, timeout=TIMEOUT)
+    assert len(table["endpoints"]) == 2
+    assert node_status(proxies[0], table) is node_status(proxies[1], table)
+
+
+def test_udp_types_are_skipped(closed_port):
+    proxies = [hy2("udp", closed_port), {"name": "wg", "type": "wireguard", "server": "127.0.0.1", "port": 1}]
+    assert endpoint_key(proxies[0]) is None
+    table = probe_proxies(proxies, timeout=TIMEOUT)
+    assert table["endpoints"] == {}
+    assert all(node_status(p, table) == {"status": STATUS_SKIPPED} for p in proxies)
+    assert unreachable_names(proxies, table) == set()
+    assert summarize(proxies, table) == {STATUS_SKIPPED: 2}
+
+
+def test_build_config_excludes_unreachable(listeners, closed_port):
+    proxies = [ss("alive", listeners["plain"]), ss("dead", closed_port), hy2("udp", closed_port),
+               ss("unprobed", 1, server="10.255.255.1")]
+    table = probe_proxies(proxies[:3], timeout=TIMEOUT)
+    assert unreachable_names(proxies, table) == {"dead"}
+
+    def auto_members(gc):
+        config = build_config(gc, proxies, [], {}, TARGET_DESKTOP, rule_type=RULE_TYPE_CUSTOM, latency_table=table)
+        group = next(g for g in config["proxy-groups"] if g["name"] == "Auto - UrlTest")
+        return group["proxies"], config
+
+    members, _ = auto_members(DEFAULT_GLOBAL_CONFIG)
+    assert "dead" in members
+
+    members, config = auto_members(dict(DEFAULT_GLOBAL_CONFIG, skip_unreachable=True))
+    assert "dead" not in members
+    assert {"alive", "udp", "unprobed"} <= set(members)
+    # 手动选择组仍保留全部节点
+    proxy_group = next(g for g in config["proxy-groups"] if g["name"] == "Proxy")
+    assert "dead" in proxy_group["proxies"]
@@ -0,0 +1,62 @@
+import re
+
+import pytest
+
+import region
+from region import REGIONS, classify_name, group_by_region, region_filter
+
+CASES = [
+    ("🇭🇰 香港 01", "HK"),
+    ("HK01 IPLC", "HK"),
+    ("hong-kong 02", "HK"),
+    ("Taipei_3", "TW"),
+    ("JP Tokyo", "JP"),
+    ("美国 洛杉矶", "US"),
+    ("[US] Los Angeles", "US"),
+    ("los_angeles-01", "US"),
+    ("UK London", "UK"),
+    ("GB-01", "UK"),
+    ("Toronto CA", "CA"),
+    ("节点 | 新加坡", "SG"),
+    # 左侧是字母或数字时不算独立的词
+    ("100GB 流量", None),
+    ("BUS 01", None),
+    ("Plus", None),
+    # "数字 + 空白" 之后是数量单位而不是地区
+    ("剩余流量 50 GB", None),
+    ("剩余流量：1.5 GB", None),
+    ("已用 10 GB / 总计 200 GB", None),
+    ("套餐 3 CA", None),
+    ("官网 example.com", None),
+    ("剩余 50 GB | 🇺🇸 美国", "US"),
+    ("剩余 50 GB US 01", "US"),
+    ("Node 50 - GB", "UK"),
+]
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    region.clear_cache()
+
+
+@pytest.mark.parametrize("name, code", CASES)
+def test_classify_name(name, code):
+    assert classify_name(name) == code
+
+
+@pytest.mark.parametrize("name, code", CASES)
+def test_region_filter_matches_classifier(name, code):
+    # 单个地区的 filter 与 classify_name 的边界规则一致
+    # (classify_name 取最靠左的关键词，filter 只判断是否包含，因此只检查识别出的地区)
+    codes = {c for c, _, _ in REGIONS}
+    assert bool(re.search(region_filter(codes), name)) == (code is not None)
+    if code is not None:
+        assert re.search(region_filter({code}), name)
+
+
+def test_group_by_region_keeps_order():
+    proxies = [{"name": n} for n in ("JP 1", "剩余流量 50 GB", "HK 1", "JP 2", "到期时间 2030-01-01")]
+    regions, others = group_by_region(proxies)
+    assert [(code, [p["name"] for p in members]) for code, members in regions] == [
+        ("HK", ["HK 1"]), ("JP", ["JP 1", "JP 2"])]
+    assert [p["name"] for p in others] == ["剩余流量 50 GB", "到期时间 2030-01-01"]
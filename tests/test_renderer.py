@@ -0,0 +1,73 @@
+import pytest
+
+import renderer
+import yaml_io
+from config_builder import DEFAULT_GLOBAL_CONFIG, RULE_TYPE_LHIE1, TARGET_DESKTOP, TARGET_OPENCLASH, build_config
+
+
+def make_proxies(count):
+    return [{"name": f"节点 {i}", "type": "trojan", "server": f"s{i}.example.com", "port": 443,
+             "password": f"pw{i}", "udp": True} for i in range(count)]
+
+
+def make_profile(target_mode=TARGET_DESKTOP, **gc):
+    return {
+        "global_config": dict(DEFAULT_GLOBAL_CONFIG, **gc),
+        "proxies": make_proxies(5),
+        "custom_rules": ["DOMAIN-SUFFIX,example.com,DIRECT"],
+        "custom_rule_providers": {},
+        "target_mode": target_mode,
+        "rule_type": RULE_TYPE_LHIE1,
+    }
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    renderer.clear_cache()
+    yield
+    renderer.clear_cache()
+
+
+@pytest.mark.parametrize("target_mode", [TARGET_DESKTOP, TARGET_OPENCLASH])
+def test_segments_match_full_dump(target_mode):
+    config = build_config(DEFAULT_GLOBAL_CONFIG, make_proxies(20), [], {}, target_mode)
+    expected = renderer.CONFIG_HEADER + yaml_io.dump(config)
+    assert renderer.render_config(config) == expected
+    # 第二次全部命中缓存，输出不变
+    assert renderer.render_config(config) == expected
+
+
+def test_edit_one_node_matches_full_dump():
+    proxies = make_proxies(20)
+    renderer.render_config(build_config(DEFAULT_GLOBAL_CONFIG, proxies, [], {}, TARGET_DESKTOP))
+
+    proxies[7] = dict(proxies[7], port=8443)
+    config = build_config(DEFAULT_GLOBAL_CONFIG, proxies, [], {}, TARGET_DESKTOP)
+    assert renderer.render_config(config) == renderer.CONFIG_HEADER + yaml_io.dump(config)
+
+
+def test_variants():
+    profile = make_profile(enable_tun=True, enable_dns=True)
+    desktop = yaml_io.load(renderer.render_profile(profile, "desktop"))
+    openclash = yaml_io.load(renderer.render_profile(profile, "openclash"))
+
+    for key in ("mixed-port", "dns", "tun"):
+        assert key in desktop
+        assert key not in openclash
+    assert desktop["proxies"] == openclash["proxies"] == profile["proxies"]
+    assert desktop["rules"] == openclash["rules"]
+
+    # 未指定变体时使用档案保存的生成模式
+    assert renderer.render_profile(profile) == renderer.render_profile(profile, "desktop")
+    openclash_profile = make_profile(TARGET_OPENCLASH, enable_tun=True, enable_dns=True)
+    assert renderer.render_profile(openclash_profile) == renderer.render_profile(profile, "openclash")
+
+
+@pytest.mark.parametrize("user_agent, variant", [
+    ("OpenClash/0.46", "openclash"),
+    ("clash.meta", None),
+    ("", None),
+    (None, None),
+])
+def test_variant_from_user_agent(user_agent, variant):
+    assert renderer.variant_from_user_agent(user_agent) == variant
@@ -0,0 +1,60 @@
+from rule_analyzer import analyze_rules, drop_shadowed
+
+
+def test_domain_suffix_shadows_subdomains():
+    rules = [
+        "DOMAIN-SUFFIX,example.com,Proxy",
+        "DOMAIN,www.example.com,DIRECT",
+        "DOMAIN-SUFFIX,cdn.example.com,DIRECT",
+        "DOMAIN-SUFFIX,notexample.com,DIRECT",
+    ]
+    assert analyze_rules(rules) == [(1, 0), (2, 0)]
+
+
+def test_exact_domain_shadows_only_itself():
+    rules = ["DOMAIN,example.com,Proxy", "DOMAIN,EXAMPLE.com.,DIRECT", "DOMAIN-SUFFIX,example.com,DIRECT"]
+    assert analyze_rules(rules) == [(1, 0)]
+
+
+def test_cidr_containment():
+    rules = [
+        "IP-CIDR,10.0.0.0/8,DIRECT,no-resolve",
+        "IP-CIDR,10.1.0.0/16,Proxy,no-resolve",
+        "IP-CIDR,11.0.0.0/16,Proxy,no-resolve",
+        "IP-CIDR6,2001:db8::/32,DIRECT,no-resolve",
+        "IP-CIDR6,2001:db8:1::/48,Proxy,no-resolve",
+    ]
+    assert analyze_rules(rules) == [(1, 0), (4, 3)]
+
+
+def test_no_resolve_semantics():
+    # 不带 no-resolve 的网段会先解析域名，能覆盖后面的任何同网段规则
+    rules = ["IP-CIDR,10.0.0.0/8,DIRECT", "IP-CIDR,10.1.0.0/16,Proxy,no-resolve"]
+    assert analyze_rules(rules) == [(1, 0)]
+    # no-resolve 的网段不匹配未解析的域名请求，后面会解析的规则仍可能生效
+    rules = ["IP-CIDR,10.0.0.0/8,DIRECT,no-resolve", "IP-CIDR,10.1.0.0/16,Proxy"]
+    assert analyze_rules(rules) == []
+    # 两者之间发生过解析时，no-resolve 的网段也不再覆盖
+    rules = ["IP-CIDR,10.0.0.0/8,DIRECT,no-resolve", "GEOIP,CN,DIRECT", "IP-CIDR,10.1.0.0/16,Proxy,no-resolve"]
+    assert analyze_rules(rules) == []
+    rules = ["IP-CIDR,10.0.0.0/8,DIRECT,no-resolve", "DOMAIN,a.com,DIRECT", "IP-CIDR,10.1.0.0/16,Proxy,no-resolve"]
+    assert analyze_rules(rules) == [(2, 0)]
+
+
+def test_identical_rules_and_match():
+    rules = [
+        "GEOIP,CN,DIRECT",
+        "GEOIP,CN,Proxy",
+        "MATCH,Proxy",
+        "DOMAIN,late.example.com,DIRECT",
+    ]
+    assert analyze_rules(rules) == [(1, 0), (3, 2)]
+
+
+def test_malformed_rules_are_skipped():
+    assert analyze_rules(["garbage", "IP-CIDR,not-a-cidr,DIRECT", "DOMAIN,a.com,DIRECT"]) == []
+
+
+def test_drop_shadowed():
+    rules = ["DOMAIN-SUFFIX,example.com,Proxy", "DOMAIN,a.example.com,DIRECT", "MATCH,DIRECT"]
+    assert drop_shadowed(rules) == ["DOMAIN-SUFFIX,example.com,Proxy", "MATCH,DIRECT"]
@@ -0,0 +1,131 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+import yaml_io
+from config_builder import DEFAULT_GLOBAL_CONFIG, RULE_TYPE_CUSTOM, TARGET_DESKTOP, build_config
+from rule_compiler import MIN_GROUP_SIZE, compile_rules, write_rule_files
+
+
+def domains(count, target="Proxy", start=0, rule_type="DOMAIN-SUFFIX"):
+    return [f"{rule_type},site{i}.example.com,{target}" for i in range(start, start + count)]
+
+
+def cidrs(count, target="DIRECT", options=""):
+    return [f"IP-CIDR,10.{i}.0.0/16,{target}{options}" for i in range(count)]
+
+
+def payload(files, provider):
+    return yaml_io.load(files[provider["path"].rsplit("/", 1)[1]])["payload"]
+
+
+def test_short_runs_are_kept():
+    rules = domains(MIN_GROUP_SIZE - 1)
+    assert compile_rules(rules) == (rules, {}, {})
+
+    compiled, providers, files = compile_rules(domains(MIN_GROUP_SIZE))
+    assert len(compiled) == 1 and len(providers) == 1 and len(files) == 1
+    name, provider = next(iter(providers.items()))
+    assert compiled == [f"RULE-SET,{name},Proxy"]
+    assert provider == {"type": "file", "behavior": "domain", "format": "yaml", "path": f"./ruleset/{name}.yaml"}
+    assert payload(files, provider) == [f"+.site{i}.example.com" for i in range(MIN_GROUP_SIZE)]
+
+
+def test_runs_stop_at_other_rules():
+    rules = domains(10) + ["DOMAIN-KEYWORD,google,Proxy"] + domains(10, start=10) + ["MATCH,Proxy"]
+    compiled, providers, _ = compile_rules(rules)
+    names = list(providers)
+    # 不可合并的规则打断连续段，匹配顺序不变
+    assert compiled == [f"RULE-SET,{names[0]},Proxy", "DOMAIN-KEYWORD,google,Proxy",
+                        f"RULE-SET,{names[1]},Proxy", "MATCH,Proxy"]
+
+
+def test_runs_split_by_target_and_behavior():
+    rules = domains(8, "Proxy") + domains(8, "DIRECT", start=8) + cidrs(8, "DIRECT") + domains(3, "DIRECT", start=16)
+    compiled, providers, files = compile_rules(rules)
+    assert [rule.rsplit(",", 1)[1] for rule in compiled[:3]] == ["Proxy", "DIRECT", "DIRECT"]
+    assert [p["behavior"] for p in providers.values()] == ["domain", "domain", "ipcidr"]
+    assert compiled[3:] == domains(3, "DIRECT", start=16)
+    ipcidr = list(providers.values())[2]
+    assert payload(files, ipcidr) == [f"10.{i}.0.0/16" for i in range(8)]
+
+
+def test_domain_payload_formats():
+    rules = [f"DOMAIN,Host{i}.Example.com,Proxy" for i in range(4)] + domains(4)
+    compiled, providers, files = compile_rules(rules)
+    assert len(compiled) == 1
+    assert payload(files, next(iter(providers.values()))) == \
+        [f"host{i}.example.com" for i in range(4)] + [f"+.site{i}.example.com" for i in range(4)]
+
+
+def test_no_resolve_carries_over():
+    compiled, providers, _ = compile_rules(cidrs(8, options=",no-resolve") + cidrs(8))
+    # no-resolve 不同的网段分为两段，内容相同时共用一个规则集文件
+    (name, provider), = providers.items()
+    assert provider["behavior"] == "ipcidr"
+    assert compiled == [f"RULE-SET,{name},DIRECT,no-resolve", f"RULE-SET,{name},DIRECT"]
+
+    # 其他选项无法在 RULE-SET 上表达，保持原样
+    rules = [f"DOMAIN,d{i}.example.com,Proxy,extra" for i in range(8)]
+    assert compile_rules(rules)[0] == rules
+
+
+def test_names_are_content_hashes():
+    first, providers, files = compile_rules(domains(8))
+    # 重复的条目只保留一次，内容相同的段名称相同
+    second, _, _ = compile_rules(domains(8) + domains(8, start=0))
+    assert first == second
+    name = next(iter(providers))
+    assert name.startswith("custom-") and len(name) == len("custom-") + 12
+    assert list(files) == [f"{name}.yaml"]
+
+    other, _, _ = compile_rules(domains(8, start=1))
+    assert other != first
+    # 目标不参与命名：相同内容的文件可以被多条 RULE-SET 共用
+    shared, _, _ = compile_rules(domains(8, "DIRECT"))
+    assert shared == [first[0].replace(",Proxy", ",DIRECT")]
+
+
+def test_http_providers_with_base_url():
+    _, providers, _ = compile_rules(domains(8), base_url="http://router.lan:8000/")
+    name, provider = next(iter(providers.items()))
+    assert provider["type"] == "http"
+    assert provider["url"] == f"http://router.lan:8000/ruleset/{name}.yaml"
+    assert provider["path"] == f"./ruleset/{name}.yaml"
+
+
+def test_build_config_uses_mirror_url():
+    proxies = [{"name": "a", "type": "trojan", "server": "a.example.com", "port": 443, "password": "pw"}]
+    gc = dict(DEFAULT_GLOBAL_CONFIG, compile_rules=True)
+    config = build_config(gc, proxies, domains(8), {}, TARGET_DESKTOP, rule_type=RULE_TYPE_CUSTOM)
+    assert {p["type"] for p in config["rule-providers"].values()} == {"file"}
+
+    gc.update(mirror_rules=True, mirror_url="http://gen.lan:8000")
+    files = {}
+    config = build_config(gc, proxies, domains(8), {}, TARGET_DESKTOP, rule_type=RULE_TYPE_CUSTOM, rule_files=files)
+    (name, provider), = config["rule-providers"].items()
+    assert provider["url"] == f"http://gen.lan:8000/ruleset/{name}.yaml"
+    assert list(files) == [f"{name}.yaml"]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "RULESET_DIR", str(tmp_path))
+    return TestClient(api.app)
+
+
+def test_compiled_files_are_served(client, tmp_path):
+    _, _, files = compile_rules(domains(8))
+    write_rule_files(files, str(tmp_path))
+    filename = next(iter(files))
+
+    resp = client.get(f"/ruleset/{filename}")
+    assert resp.status_code == 200
+    assert resp.text == files[filename]
+    assert resp.headers["etag"] == f'"{filename}"'
+    assert client.get(f"/ruleset/{filename}", headers={"If-None-Match": f'"{filename}"'}).status_code == 304
+
+    assert client.get("/ruleset/custom-000000000000.yaml").status_code == 404
+    # 只提供编译生成的文件名
+    (tmp_path / "custom-notahash.yaml").write_text("payload: []\n")
+    assert client.get("/ruleset/custom-notahash.yaml").status_code == 404
@@ -0,0 +1,132 @@
+import os
+import stat
+
+import pytest
+
+import rule_convert
+from rule_convert import apply_plan, convert_content, convert_sources, load_plan, split_classical
+
+CLASSICAL = b"""payload:
+  - DOMAIN-SUFFIX,Example.com
+  - DOMAIN,api.example.org
+  - DOMAIN-KEYWORD,tracker
+  - IP-CIDR,10.0.0.0/25,no-resolve
+  - IP-CIDR,10.0.0.128/25,no-resolve
+  - IP-CIDR6,2001:db8::/32,no-resolve
+  - IP-CIDR,192.168.0.0/16
+  - PROCESS-NAME,curl
+"""
+
+
+def test_split_classical():
+    entries = rule_convert.read_entries(CLASSICAL)
+    domains, cidrs, no_resolve, classical = split_classical(entries)
+    assert domains == ["+.example.com", "api.example.org"]
+    # 网段聚合，IPv6 一并放入 ipcidr
+    assert cidrs == ["10.0.0.0/24", "2001:db8::/32"]
+    assert no_resolve is True
+    # no-resolve 与第一条网段不一致的网段留在 classical 中
+    assert classical == ["DOMAIN-KEYWORD,tracker", "IP-CIDR,192.168.0.0/16", "PROCESS-NAME,curl"]
+
+
+def test_split_keeps_invalid_and_optioned_entries():
+    domains, cidrs, no_resolve, classical = split_classical(
+        ["IP-CIDR,10.0.0.0/8", "IP-CIDR,not-a-cidr", "DOMAIN,a.com,extra", "IP-CIDR6,::/0,no-resolve"])
+    assert domains == [] and cidrs == ["10.0.0.0/8"] and no_resolve is False
+    assert classical == ["DOMAIN,a.com,extra", "IP-CIDR6,::/0,no-resolve", "IP-CIDR,not-a-cidr"]
+
+
+def test_read_text_format():
+    assert rule_convert.read_entries(b"# comment\nDOMAIN,a.com\n\nIP-CIDR,1.1.1.0/24\n", "text") == \
+        ["DOMAIN,a.com", "IP-CIDR,1.1.1.0/24"]
+
+
+def test_convert_content_text_fallback(tmp_path):
+    # 找不到 mihomo (或 convert-ruleset 失败) 时输出 text 格式
+    parts = convert_content(CLASSICAL, out_dir=str(tmp_path), mihomo=str(tmp_path / "missing-mihomo"))
+    assert [(p["behavior"], p["format"], p["count"], p["no_resolve"]) for p in parts] == [
+        ("domain", "text", 2, False), ("classical", "text", 3, False), ("ipcidr", "text", 2, True)]
+    for part in parts:
+        assert part["file"].endswith(".txt")
+    assert (tmp_path / parts[0]["file"]).read_text() == "+.example.com\napi.example.org\n"
+    assert (tmp_path / parts[2]["file"]).read_text() == "10.0.0.0/24\n2001:db8::/32\n"
+    # 内容寻址，重复转换得到相同文件
+    assert convert_content(CLASSICAL, out_dir=str(tmp_path)) == parts
+
+
+@pytest.mark.skipif(os.name != "posix", reason="需要 shell 脚本")
+def test_convert_content_mrs(tmp_path):
+    fake = tmp_path / "mihomo"
+    # 模拟 mihomo convert-ruleset <behavior> text <src> <dst>
+    fake.write_text('#!/bin/sh\n{ echo "mrs $2"; cat "$4"; } > "$5"\n')
+    fake.chmod(fake.stat().st_mode | stat.S_IEXEC)
+    out_dir = tmp_path / "out"
+    parts = convert_content(CLASSICAL, out_dir=str(out_dir), mihomo=str(fake))
+    assert [(p["behavior"], p["format"]) for p in parts] == [("domain", "mrs"), ("classical", "text"), ("ipcidr", "mrs")]
+    assert (out_dir / parts[0]["file"]).read_text().startswith("mrs domain\n")
+
+
+def test_convert_sources_plan(tmp_path, monkeypatch):
+    monkeypatch.setattr(rule_convert, "RULESET_DIR", str(tmp_path))
+    (tmp_path / "upload.yaml").write_bytes(CLASSICAL)
+    out_dir = str(tmp_path / "converted")
+    sources = [("upload.yaml", "yaml"), ("missing.yaml", "yaml")]
+
+    plan, results = convert_sources(sources, out_dir=out_dir, use_mrs=False)
+    assert [r["status"] for r in results] == ["converted", "error"]
+    assert [p["behavior"] for p in plan["upload.yaml"]["parts"]] == ["domain", "classical", "ipcidr"]
+    assert load_plan(out_dir) == plan
+
+    _, results = convert_sources(sources[:1], out_dir=out_dir, use_mrs=False)
+    assert results[0]["status"] == "unchanged"
+    (tmp_path / "upload.yaml").write_bytes(b"payload:\n  - DOMAIN,b.com\n")
+    plan, results = convert_sources(sources[:1], out_dir=out_dir, use_mrs=False)
+    assert results[0]["status"] == "converted"
+    assert [p["behavior"] for p in plan["upload.yaml"]["parts"]] == ["domain"]
+
+
+PLAN = {
+    "upload.yaml": {"source_sha256": "x", "mrs": False, "parts": [
+        {"behavior": "domain", "format": "text", "file": "d.txt", "no_resolve": False, "count": 2},
+        {"behavior": "classical", "format": "text", "file": "c.txt", "no_resolve": False, "count": 1},
+        {"behavior": "ipcidr", "format": "text", "file": "i.txt", "no_resolve": True, "count": 1},
+    ]},
+    "mirror/Netflix.yaml": {"source_sha256": "y", "mrs": True, "parts": [
+        {"behavior": "domain", "format": "mrs", "file": "n.mrs", "no_resolve": False, "count": 5},
+    ]},
+}
+
+
+def test_apply_plan_file_provider():
+    providers = {
+        "upload": {"type": "file", "behavior": "classical", "format": "yaml", "path": "./ruleset/upload.yaml"},
+        "other": {"type": "file", "behavior": "domain", "path": "./ruleset/other.yaml"},
+    }
+    rules = ["DOMAIN,first.com,DIRECT", "RULE-SET,upload,Proxy", "RULE-SET,other,DIRECT", "MATCH,Proxy"]
+    new_providers, new_rules = apply_plan(providers, rules, PLAN)
+    assert new_rules == ["DOMAIN,first.com,DIRECT", "RULE-SET,upload-domain,Proxy", "RULE-SET,upload-classical,Proxy",
+                         "RULE-SET,upload-ipcidr,Proxy,no-resolve", "RULE-SET,other,DIRECT", "MATCH,Proxy"]
+    assert list(new_providers) == ["upload-domain", "upload-classical", "upload-ipcidr", "other"]
+    assert new_providers["upload-domain"] == {
+        "type": "file", "behavior": "domain", "format": "text", "path": "./ruleset/converted/d.txt"}
+    assert new_providers["other"] is providers["other"]
+
+
+def test_apply_plan_http_provider():
+    mirror_url = "http://gen.lan:8000/"
+    providers = {"Netflix": {"type": "http", "behavior": "classical", "interval": 86400,
+                             "url": "http://gen.lan:8000/ruleset/Netflix.yaml", "path": "./ruleset/Netflix.yaml"}}
+    new_providers, new_rules = apply_plan(providers, ["RULE-SET,Netflix,Streaming"], PLAN, mirror_url=mirror_url)
+    assert new_rules == ["RULE-SET,Netflix-domain,Streaming"]
+    assert new_providers == {"Netflix-domain": {
+        "type": "http", "behavior": "domain", "format": "mrs", "path": "./ruleset/converted/n.mrs",
+        "url": "http://gen.lan:8000/ruleset/converted/n.mrs", "interval": 86400}}
+
+    # 未使用镜像时 http 规则集来自 CDN，无法转换
+    assert apply_plan(providers, ["RULE-SET,Netflix,Streaming"], PLAN) == (providers, ["RULE-SET,Netflix,Streaming"])
+
+
+def test_apply_plan_skips_logic_rules():
+    providers = {"upload": {"type": "file", "behavior": "classical", "path": "./ruleset/upload.yaml"}}
+    rules = ["AND,((RULE-SET,upload),(NETWORK,udp)),REJECT", "RULE-SET,upload,Proxy"]
+    assert apply_plan(providers, rules, PLAN) == (providers, rules)
@@ -0,0 +1,202 @@
+import hashlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+from lhie1 import lhie1_filename
+from rule_mirror import MANIFEST_NAME, file_sha256, mirror_providers, read_manifest, upstream_url
+
+NAMES = ["AdBlock", "HTTPDNS"]
+
+
+class Upstream(BaseHTTPRequestHandler):
+    bodies = {}         # 路径 -> 响应内容 (None 表示 404)
+    requests = []       # (路径, If-None-Match, 状态码)
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = self.bodies.get(self.path)
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"' if body is not None else None
+        conditional = self.headers.get("If-None-Match")
+        if body is None:
+            status = 404
+        elif conditional == etag:
+            status = 304
+        else:
+            status = 200
+        with self.lock:
+            self.requests.append((self.path, conditional, status))
+
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+        payload = body if status == 200 else b""
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def ruleset(*domains):
+    return ("payload:\n" + "".join(f"  - '+.{d}'\n" for d in domains)).encode()
+
+
+@pytest.fixture(scope="module")
+def upstream():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Upstream)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def reset_upstream():
+    Upstream.bodies = {
+        "/AdBlock.yaml": ruleset("ads.example.com", "tracker.example.com"),
+        "/HTTPDNS.yaml": ruleset("dns.example.com"),
+    }
+    Upstream.requests = []
+
+
+def mirror(upstream, mirror_dir, names=NAMES):
+    results = mirror_providers(names=names, base_url=upstream, mirror_dir=str(mirror_dir), max_workers=2, timeout=5)
+    return {r["name"]: r for r in results}
+
+
+def statuses(path):
+    return [status for p, _, status in Upstream.requests if p == path]
+
+
+def test_manifest_records_sha256(upstream, tmp_path):
+    results = mirror(upstream, tmp_path)
+    assert {name: r["status"] for name, r in results.items()} == {"AdBlock": "updated", "HTTPDNS": "updated"}
+
+    manifest = read_manifest(str(tmp_path))
+    for name in NAMES:
+        entry = manifest[name]
+        path = tmp_path / lhie1_filename(name)
+        body = Upstream.bodies[f"/{name}.yaml"]
+        assert path.read_bytes() == body
+        assert entry["sha256"] == hashlib.sha256(body).hexdigest() == file_sha256(str(path))
+        assert entry["size"] == len(body)
+        assert entry["url"] == upstream_url(name, upstream)
+        assert entry["etag"]
+    # 清单原子写入，不留临时文件
+    assert sorted(os.listdir(tmp_path)) == sorted([MANIFEST_NAME] + [lhie1_filename(n) for n in NAMES])
+
+
+def test_conditional_refetch(upstream, tmp_path):
+    mirror(upstream, tmp_path)
+    first = read_manifest(str(tmp_path))
+    Upstream.requests = []
+
+    results = mirror(upstream, tmp_path)
+    assert all(r["status"] == "unchanged" for r in results.values())
+    assert statuses("/AdBlock.yaml") == [304]
+    assert all(conditional for _, conditional, _ in Upstream.requests)
+    assert read_manifest(str(tmp_path))["AdBlock"]["sha256"] == first["AdBlock"]["sha256"]
+
+    # 上游内容变化时重新下载
+    Upstream.bodies["/AdBlock.yaml"] = ruleset("ads.example.com", "new.example.com")
+    results = mirror(upstream, tmp_path)
+    assert results["AdBlock"]["status"] == "updated"
+    assert results["HTTPDNS"]["status"] == "unchanged"
+    assert read_manifest(str(tmp_path))["AdBlock"]["sha256"] != first["AdBlock"]["sha256"]
+
+
+def test_corrupted_local_file_is_redownloaded(upstream, tmp_path):
+    mirror(upstream, tmp_path)
+    path = tmp_path / lhie1_filename("AdBlock")
+    path.write_bytes(b"payload:\n  - 'tampered'\n")
+    Upstream.requests = []
+
+    results = mirror(upstream, tmp_path, names=["AdBlock"])
+    assert results["AdBlock"]["status"] == "updated"
+    # 哈希校验失败时不发送条件请求
+    assert Upstream.requests == [("/AdBlock.yaml", None, 200)]
+    assert path.read_bytes() == Upstream.bodies["/AdBlock.yaml"]
+
+
+def test_invalid_body_is_rejected(upstream, tmp_path):
+    Upstream.bodies["/AdBlock.yaml"] = b"<html><body>rate limited</body></html>"
+    results = mirror(upstream, tmp_path)
+    assert results["AdBlock"]["status"] == "error"
+    assert "payload" in results["AdBlock"]["error"]
+    assert results["HTTPDNS"]["status"] == "updated"
+    assert not (tmp_path / lhie1_filename("AdBlock")).exists()
+    assert "AdBlock" not in read_manifest(str(tmp_path))
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".tmp")]
+
+
+def test_failed_sync_keeps_previous_file(upstream, tmp_path):
+    mirror(upstream, tmp_path)
+    good = (tmp_path / lhie1_filename("AdBlock")).read_bytes()
+    entry = read_manifest(str(tmp_path))["AdBlock"]
+
+    for bad in (b"<html>error</html>", None):
+        Upstream.bodies["/AdBlock.yaml"] = bad
+        results = mirror(upstream, tmp_path, names=["AdBlock"])
+        assert results["AdBlock"]["status"] == "error"
+        assert (tmp_path / lhie1_filename("AdBlock")).read_bytes() == good
+        assert read_manifest(str(tmp_path))["AdBlock"]["sha256"] == entry["sha256"]
+
+
+# ------------------------------------------
+# api.py /ruleset/{filename}
+# ------------------------------------------
+
+@pytest.fixture
+def client(upstream, tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "MIRROR_DIR", str(tmp_path))
+    monkeypatch.setattr(api, "_mirror_index", {"mtime": None, "files": {}})
+    mirror(upstream, tmp_path, names=["AdBlock"])
+    return TestClient(api.app, follow_redirects=False)
+
+
+def test_ruleset_served_with_etag(client, tmp_path):
+    filename = lhie1_filename("AdBlock")
+    resp = client.get(f"/ruleset/{filename}")
+    assert resp.status_code == 200
+    assert resp.content == Upstream.bodies["/AdBlock.yaml"]
+    etag = resp.headers["etag"]
+    assert etag == f'"{read_manifest(str(tmp_path))["AdBlock"]["sha256"]}"'
+
+    resp = client.get(f"/ruleset/{filename}", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.headers["etag"] == etag
+    assert resp.content == b""
+
+    resp = client.get(f"/ruleset/{filename}", headers={"If-None-Match": '"stale"'})
+    assert resp.status_code == 200
+
+
+def test_ruleset_index_follows_manifest(client, upstream, tmp_path):
+    filename = lhie1_filename("HTTPDNS")
+    assert client.get(f"/ruleset/{filename}").status_code == 307
+
+    mirror(upstream, tmp_path)
+    # 清单修改时间变化后重新读取
+    manifest_path = tmp_path / MANIFEST_NAME
+    stat = manifest_path.stat()
+    os.utime(manifest_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    resp = client.get(f"/ruleset/{filename}")
+    assert resp.status_code == 200
+    assert resp.content == Upstream.bodies["/HTTPDNS.yaml"]
+
+
+def test_unmirrored_ruleset_redirects_upstream(client):
+    resp = client.get(f"/ruleset/{lhie1_filename('Special')}")
+    assert resp.status_code == 307
+    assert resp.headers["location"] == upstream_url("Special")
+
+
+def test_unknown_ruleset(client):
+    assert client.get("/ruleset/not-a-ruleset.yaml").status_code == 404
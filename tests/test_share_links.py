@@ -0,0 +1,114 @@
+import base64
+import json
+from urllib.parse import quote
+
+import pytest
+
+from share_links import parse_links, parse_share_link, supported_schemes
+
+
+def b64(text, urlsafe=False):
+    encoded = (base64.urlsafe_b64encode if urlsafe else base64.b64encode)(text.encode()).decode()
+    return encoded.rstrip("=")
+
+
+VMESS = {"v": "2", "ps": "香港 VMess", "add": "vm.example.com", "port": "8443", "id": "uuid-1", "aid": "0",
+         "scy": "auto", "net": "ws", "path": "/ws", "host": "cdn.example.com", "tls": "tls", "sni": "vm.example.com"}
+
+# (链接, 解析结果)
+CASES = {
+    "ss": (
+        f"ss://{b64('aes-256-gcm:pa:ss', urlsafe=True)}@ss.example.com:8388#{quote('SS 节点')}",
+        {"name": "SS 节点", "type": "ss", "server": "ss.example.com", "port": 8388,
+         "cipher": "aes-256-gcm", "password": "pa:ss"},
+    ),
+    "ss-sip002-plugin": (
+        "ss://2022-blake3-aes-128-gcm:key%3D@[2001:db8::1]:443/?plugin=" + quote("obfs-local;obfs=tls;obfs-host=a.com") + "#p",
+        {"name": "p", "type": "ss", "server": "2001:db8::1", "port": 443, "cipher": "2022-blake3-aes-128-gcm",
+         "password": "key=", "plugin": "obfs", "plugin-opts": {"mode": "tls", "host": "a.com"}},
+    ),
+    "ss-legacy": (
+        "ss://" + b64("chacha20-ietf-poly1305:pw@legacy.example.com:8000"),
+        {"name": "SS-legacy.example.com", "type": "ss", "server": "legacy.example.com", "port": 8000,
+         "cipher": "chacha20-ietf-poly1305", "password": "pw"},
+    ),
+    "trojan": (
+        "trojan://p%40ss@tr.example.com:443?sni=sni.example.com&alpn=h2,http/1.1&allowInsecure=1&type=ws&path=/t&host=h.com#TR",
+        {"name": "TR", "type": "trojan", "server": "tr.example.com", "port": 443, "password": "p@ss",
+         "sni": "sni.example.com", "alpn": ["h2", "http/1.1"], "skip-cert-verify": True,
+         "network": "ws", "ws-opts": {"path": "/t", "headers": {"Host": "h.com"}}},
+    ),
+    "vmess": (
+        "vmess://" + b64(json.dumps(VMESS, ensure_ascii=False)),
+        {"name": "香港 VMess", "type": "vmess", "server": "vm.example.com", "port": 8443, "uuid": "uuid-1",
+         "alterId": 0, "cipher": "auto", "network": "ws", "tls": True, "servername": "vm.example.com",
+         "ws-opts": {"path": "/ws", "headers": {"Host": "cdn.example.com"}}},
+    ),
+    "vless": (
+        "vless://uuid-2@vl.example.com:443?security=tls&sni=vl.example.com&type=grpc&serviceName=svc&fp=chrome#VL",
+        {"name": "VL", "type": "vless", "server": "vl.example.com", "port": 443, "uuid": "uuid-2", "tls": True,
+         "udp": True, "servername": "vl.example.com", "client-fingerprint": "chrome",
+         "network": "grpc", "grpc-opts": {"grpc-service-name": "svc"}},
+    ),
+    "vless-reality": (
+        "vless://uuid-3@re.example.com:443?security=reality&sni=www.apple.com&pbk=PUBKEY&sid=ab12"
+        "&flow=xtls-rprx-vision&fp=safari#Reality",
+        {"name": "Reality", "type": "vless", "server": "re.example.com", "port": 443, "uuid": "uuid-3", "tls": True,
+         "udp": True, "flow": "xtls-rprx-vision", "servername": "www.apple.com", "client-fingerprint": "safari",
+         "reality-opts": {"public-key": "PUBKEY", "short-id": "ab12"}, "network": "tcp"},
+    ),
+    "hysteria2": (
+        "hysteria2://secret@hy.example.com:8443?sni=hy.example.com&insecure=1&obfs=salamander&obfs-password=o&mport=20000-30000#Hy",
+        {"name": "Hy", "type": "hysteria2", "server": "hy.example.com", "port": 8443, "password": "secret",
+         "sni": "hy.example.com", "skip-cert-verify": True, "obfs": {"type": "salamander", "password": "o"},
+         "ports": "20000-30000"},
+    ),
+    "hy2": (
+        "hy2://secret@hy.example.com?obfs=none",
+        {"name": "Hy2-hy.example.com", "type": "hysteria2", "server": "hy.example.com", "port": 443,
+         "password": "secret"},
+    ),
+    "tuic": (
+        "tuic://uuid-4:pw@tu.example.com:10443?congestion_control=bbr&udp_relay_mode=native&alpn=h3&disable_sni=1#TU",
+        {"name": "TU", "type": "tuic", "server": "tu.example.com", "port": 10443, "uuid": "uuid-4", "password": "pw",
+         "congestion-controller": "bbr", "udp-relay-mode": "native", "alpn": ["h3"], "disable-sni": True},
+    ),
+    "anytls": (
+        "anytls://pw@any.example.com:443?sni=any.example.com&fp=chrome#Any",
+        {"name": "Any", "type": "anytls", "server": "any.example.com", "port": 443, "password": "pw", "udp": True,
+         "sni": "any.example.com", "client-fingerprint": "chrome"},
+    ),
+}
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_parse_share_link(case):
+    link, expected = CASES[case]
+    assert parse_share_link(link) == expected
+
+
+def test_every_scheme_is_covered():
+    covered = {link.split("://", 1)[0] for link, _ in CASES.values()}
+    assert covered == set(supported_schemes())
+
+
+@pytest.mark.parametrize("link, message", [
+    ("socks5://user:pw@host:1080", "不支持的协议类型: socks5"),
+    ("trojan://tr.example.com:443", "trojan 链接格式错误: 缺少认证信息"),
+    ("vless://uuid@:443", "vless 链接格式错误: 缺少服务器地址"),
+    ("vmess://not-base64!!", "vmess 链接格式错误"),
+    ("ss://aes-256-gcm:pw@host:notaport", "ss 链接格式错误"),
+    ("just some text", "不支持的协议类型"),
+])
+def test_malformed_links(link, message):
+    with pytest.raises(ValueError, match=message):
+        parse_share_link(link)
+
+
+def test_batch_keeps_going_after_errors():
+    links = ["", "# 注释", CASES["trojan"][0], "vmess://broken", "  " + CASES["anytls"][0] + "  ",
+             "ftp://x", CASES["tuic"][0]]
+    proxies, errors = parse_links(links)
+    assert proxies == [CASES["trojan"][1], CASES["anytls"][1], CASES["tuic"][1]]
+    assert [link for link, _ in errors] == ["vmess://broken", "ftp://x"]
+    assert errors[0][1].startswith("vmess 链接格式错误")
@@ -0,0 +1,131 @@
+import base64
+
+import pytest
+
+import yaml_io
+from sub_decoder import (BATCH_LINES, FORMAT_BASE64, FORMAT_LINKS, FORMAT_YAML, DecodeError, iter_nodes,
+                         sniff_format)
+
+
+def make_proxies(count):
+    return [{"name": f"节点 {i}", "type": "trojan", "server": f"s{i}.example.com", "port": 443, "password": f"pw{i}"}
+            for i in range(count)]
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def decode(data, chunk_size=4096, **kwargs):
+    return list(iter_nodes(chunked(data, chunk_size), **kwargs))
+
+
+LINKS = b"trojan://pw0@s0.example.com:443#a\n# comment\n\r\ntrojan://pw1@s1.example.com:443#b\r\n"
+
+
+@pytest.mark.parametrize("head, fmt", [
+    (b"trojan://pw@host:443#a\n", FORMAT_LINKS),
+    (b"\xef\xbb\xbf\n  vless://uuid@host:443", FORMAT_LINKS),
+    (base64.b64encode(LINKS), FORMAT_BASE64),
+    (base64.urlsafe_b64encode(b"\xfb\xff" * 20) + b"\n", FORMAT_BASE64),
+    (b"proxies:\n  - name: a\n", FORMAT_YAML),
+    (b"- name: a\n  type: ss\n", FORMAT_YAML),
+    (b"port: 7890\nproxies: []\n", FORMAT_YAML),
+    (b"", FORMAT_YAML),
+])
+def test_sniff_format(head, fmt):
+    assert sniff_format(head) == fmt
+
+
+def test_links():
+    assert [p["name"] for p in decode(LINKS, chunk_size=5)] == ["a", "b"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 64, 4096])
+def test_base64_across_chunks(chunk_size):
+    text = b"".join(f"trojan://pw{i}@s{i}.example.com:443#n{i}\n".encode() for i in range(50))
+    encoded = base64.encodebytes(text)      # 每 76 字符换行，末尾带填充
+    nodes = decode(encoded, chunk_size=chunk_size)
+    assert [p["name"] for p in nodes] == [f"n{i}" for i in range(50)]
+
+    # URL-safe 字符、缺失的填充与 CRLF 换行
+    encoded = base64.urlsafe_b64encode(text).rstrip(b"=")
+    encoded = b"\r\n".join(chunked(encoded, 60))
+    assert decode(encoded, chunk_size=chunk_size) == nodes
+
+
+def test_base64_yaml():
+    body = yaml_io.dump({"proxies": make_proxies(3)}).encode()
+    assert decode(base64.b64encode(body), chunk_size=10) == make_proxies(3)
+
+
+def test_invalid_base64():
+    with pytest.raises(DecodeError, match="无法识别的订阅格式"):
+        decode(base64.b64encode(base64.b64encode(b"x" * 600)))
+    # 多出的单个字符无法构成完整的 Base64 分组
+    text = b"".join(f"trojan://pw{i}@s{i}.example.com:443#n{i}\n".encode() for i in range(30))
+    with pytest.raises(DecodeError, match="Base64 解码失败"):
+        decode(base64.b64encode(text) + b"Q")
+
+
+def test_yaml_longer_than_a_batch():
+    proxies = make_proxies(BATCH_LINES)     # 每个节点 5 行，跨越多个批次
+    indented = "".join("  " + line for line in yaml_io.dump(proxies).splitlines(keepends=True))
+    body = ("port: 7890\nproxies:\n" + indented + "proxy-groups: []\n").encode()
+    assert yaml_io.load(body)["proxies"] == proxies
+    assert decode(body, chunk_size=1000) == proxies
+
+    # 直接以 "- " 开头的节点列表
+    assert decode(yaml_io.dump(proxies).encode()) == proxies
+
+
+def test_yaml_anchors_across_batches():
+    lines = ["proxies:",
+             "  - &base {name: base, type: trojan, server: b.example.com, port: 443, password: pw}"]
+    for i in range(BATCH_LINES):
+        lines.append(f"  - {{name: plain{i}, type: trojan, server: p{i}.example.com, port: 443, password: pw}}")
+    lines += ["  - <<: *base", "    name: derived", "  - *base", ""]
+    nodes = decode("\n".join(lines).encode(), chunk_size=777)
+    assert len(nodes) == BATCH_LINES + 3
+    assert nodes[-2] == dict(nodes[0], name="derived")
+    assert nodes[-1] == nodes[0]
+
+
+def test_bad_item_reported_per_node():
+    body = ("proxies:\n"
+            "  - {name: a, type: ss}\n"
+            "  - {name: b, type: [unclosed\n"
+            "  - just a string\n"
+            "  - {name: c, type: ss}\n").encode()
+    errors = []
+    nodes = decode(body, on_error=lambda source, exc: errors.append(source))
+    assert [p["name"] for p in nodes] == ["a", "c"]
+    assert errors == ["- {name: b, type: [unclosed", "- just a string"]
+    with pytest.raises(DecodeError):
+        decode(body)
+
+
+def test_flow_style_falls_back_to_full_parse():
+    body = b"proxies: [{name: a, type: ss}, {name: b, type: ss}]\nrules: []\n"
+    assert [p["name"] for p in decode(body)] == ["a", "b"]
+    with pytest.raises(DecodeError, match="不是有效的节点列表"):
+        decode(b"port: 7890\n")
+
+
+def test_max_bytes():
+    body = yaml_io.dump({"proxies": make_proxies(100)}).encode()
+    assert len(decode(body, max_bytes=len(body))) == 100
+    with pytest.raises(DecodeError, match="超过上限"):
+        decode(body, chunk_size=100, max_bytes=len(body) - 1)
+
+    # 逐块检查：超过上限时立即停止读取
+    read = []
+
+    def chunks():
+        for chunk in chunked(body, 100):
+            read.append(chunk)
+            yield chunk
+
+    with pytest.raises(DecodeError):
+        list(iter_nodes(chunks(), max_bytes=1000))
+    assert len(read) == 11
@@ -0,0 +1,171 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from subscription import SubscriptionError, aggregate_subscriptions, create_session, fetch_subscription
+
+DELAY = 0.5
+
+
+def clash_yaml(prefix, count, port=443):
+    lines = ["proxies:"]
+    for i in range(count):
+        lines.append(f"  - {{name: {prefix}-{i}, type: ss, server: {prefix}{i}.example.com, port: {port}, "
+                     f"cipher: aes-128-gcm, password: pw{i}}}")
+    return ("\n".join(lines) + "\n").encode()
+
+
+class Handler(BaseHTTPRequestHandler):
+    hits = {}
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body, status=200, length=True):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/yaml")
+        if length:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        with self.lock:
+            self.hits[self.path] = self.hits.get(self.path, 0) + 1
+            hits = self.hits[self.path]
+
+        if self.path.startswith("/slow/"):
+            time.sleep(DELAY)
+            self._send(clash_yaml(self.path.rsplit("/", 1)[1], 3))
+        elif self.path == "/hang":
+            time.sleep(5)
+            self._send(clash_yaml("hang", 1))
+        elif self.path == "/flaky":
+            if hits <= 2:
+                self._send(b"busy", status=503)
+            else:
+                self._send(clash_yaml("flaky", 2))
+        elif self.path == "/missing":
+            self._send(b"not found", status=404)
+        elif self.path == "/big":
+            self._send(b"#" * 200_000)
+        elif self.path == "/big-chunked":
+            # 不带 Content-Length，只能在读取过程中截断
+            self._send(b"#" * 200_000, length=False)
+            self.close_connection = True
+        elif self.path == "/dup":
+            # 与 /slow/a 的节点完全相同，用于检查去重与来源标记
+            self._send(clash_yaml("a", 3))
+        else:
+            self._send(b"", status=404)
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def reset_hits():
+    Handler.hits.clear()
+
+
+def test_concurrent_fetch(server):
+    urls = [f"{server}/slow/{c}" for c in "abcd"]
+    start = time.monotonic()
+    store, results = aggregate_subscriptions(urls, timeout=5, retries=0)
+    elapsed = time.monotonic() - start
+
+    # 4 个订阅各延迟 DELAY 秒，并发拉取总耗时应接近单个订阅
+    assert elapsed < DELAY * 2.5
+    assert len(store) == 12
+    assert [r["url"] for r in results] == urls
+    assert all(r["error"] is None and r["added"] == 3 for r in results)
+
+
+def test_per_source_timeout(server):
+    start = time.monotonic()
+    store, results = aggregate_subscriptions([f"{server}/hang", f"{server}/slow/a"], timeout=1, retries=0)
+    elapsed = time.monotonic() - start
+
+    hang, ok = results
+    assert hang["error"] is not None
+    assert ok["error"] is None and ok["added"] == 3
+    assert len(store) == 3
+    assert elapsed < 3
+
+
+def test_retries_on_5xx(server):
+    store, results = aggregate_subscriptions([f"{server}/flaky"], timeout=5, retries=2)
+    assert results[0]["error"] is None
+    assert results[0]["added"] == 2
+    assert Handler.hits["/flaky"] == 3
+
+
+def test_retries_exhausted(server):
+    _, results = aggregate_subscriptions([f"{server}/flaky"], timeout=5, retries=1)
+    assert "503" in results[0]["error"]
+    assert Handler.hits["/flaky"] == 2
+
+
+def test_no_retry_on_4xx(server):
+    _, results = aggregate_subscriptions([f"{server}/missing"], timeout=5, retries=2)
+    assert "404" in results[0]["error"]
+    assert Handler.hits["/missing"] == 1
+
+
+@pytest.mark.parametrize("path", ["/big", "/big-chunked"])
+def test_byte_cap(server, path, tmp_path):
+    session = create_session()
+    with open(tmp_path / "sink", "w+b") as sink, pytest.raises(SubscriptionError) as exc:
+        fetch_subscription(session, server + path, sink, timeout=5, retries=0, max_bytes=100_000)
+    assert "上限" in str(exc.value)
+    assert not exc.value.retryable
+    session.close()
+
+    _, results = aggregate_subscriptions([server + path], timeout=5, retries=0, max_bytes=100_000)
+    assert "上限" in results[0]["error"]
+
+
+def test_tag_attribution(server):
+    first, second, third = f"{server}/slow/a", f"{server}/dup", f"{server}/slow/b"
+    store, results = aggregate_subscriptions([first, second, third], timeout=5, retries=0)
+
+    # 重复节点只保留先出现的来源
+    assert [r["added"] for r in results] == [3, 0, 3]
+    assert results[1]["duplicates"] == 3
+    assert {store.tag_of(n) for n in store.names()[:3]} == {first}
+    assert {store.tag_of(n) for n in store.names()[3:]} == {third}
+
+
+def test_duplicate_urls_fetched_once(server):
+    url = f"{server}/slow/a"
+    _, results = aggregate_subscriptions([url, url + " ", ""], timeout=5, retries=0)
+    assert len(results) == 1
+    assert Handler.hits["/slow/a"] == 1
+
+
+def test_cache_ttl_per_call(server, tmp_path):
+    from subscription_cache import SubscriptionCache
+
+    cache = SubscriptionCache(cache_dir=str(tmp_path), ttl=3600, timeout=5, retries=0)
+    url = f"{server}/slow/a"
+    _, results = aggregate_subscriptions([url], cache=cache)
+    assert results[0]["cache"] == "fetched"
+
+    _, results = aggregate_subscriptions([url], cache=cache, cache_ttl=3600)
+    assert results[0]["cache"] == "fresh"
+
+    # 有效期为 0 时本次调用视为过期，但不改变缓存实例的默认有效期
+    _, results = aggregate_subscriptions([url], cache=cache, cache_ttl=0)
+    assert results[0]["cache"] == "stale"
+    assert results[0]["added"] == 3
+    assert cache.ttl == 3600
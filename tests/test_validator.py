@@ -0,0 +1,85 @@
+from validator import validate_config
+
+
+def proxy(name, **extra):
+    return dict({"name": name, "type": "ss", "server": "example.com", "port": 443,
+                 "cipher": "aes-128-gcm", "password": "pw"}, **extra)
+
+
+def base_config(**overrides):
+    config = {
+        "proxies": [proxy("a"), proxy("b")],
+        "proxy-groups": [{"name": "Proxy", "type": "select", "proxies": ["a", "b"]}],
+        "rules": ["DOMAIN-SUFFIX,example.com,Proxy", "MATCH,DIRECT"],
+    }
+    config.update(overrides)
+    return config
+
+
+def test_valid_config():
+    assert validate_config(base_config()) == ([], [])
+
+
+def test_empty_proxies():
+    errors, _ = validate_config(base_config(proxies=[]))
+    assert "Proxies 为空" in errors
+
+
+def test_duplicate_names():
+    errors, _ = validate_config(base_config(
+        proxies=[proxy("a"), proxy("a"), proxy("Proxy")],
+        **{"proxy-groups": [{"name": "Proxy", "type": "select", "proxies": ["a"]},
+                            {"name": "Proxy", "type": "select", "proxies": ["a"]}]},
+    ))
+    assert any("节点名称重复: 'a'" in e for e in errors)
+    assert any("策略组名称重复: 'Proxy'" in e for e in errors)
+    assert any("'Proxy' 与节点同名" in e for e in errors)
+
+
+def test_dangling_dialer_proxy():
+    errors, _ = validate_config(base_config(proxies=[proxy("a", **{"dialer-proxy": "missing"}), proxy("b")]))
+    assert any("dialer-proxy 指向不存在" in e and "'missing'" in e for e in errors)
+
+
+def test_dialer_proxy_cycle():
+    proxies = [
+        proxy("a", **{"dialer-proxy": "b"}),
+        proxy("b", **{"dialer-proxy": "c"}),
+        proxy("c", **{"dialer-proxy": "a"}),
+        proxy("d", **{"dialer-proxy": "a"}),
+    ]
+    errors, _ = validate_config(base_config(proxies=proxies))
+    cycles = [e for e in errors if "循环引用" in e]
+    assert len(cycles) == 1
+    for name in "abc":
+        assert name in cycles[0]
+    assert "d" not in cycles[0].split(":", 1)[1]
+
+
+def test_dialer_proxy_to_group_is_not_a_cycle():
+    errors, _ = validate_config(base_config(proxies=[proxy("a", **{"dialer-proxy": "Proxy"}), proxy("b")]))
+    assert errors == []
+
+
+def test_rules_after_match():
+    _, warnings = validate_config(base_config(rules=["MATCH,DIRECT", "DOMAIN,a.com,Proxy", "DOMAIN,b.com,Proxy"]))
+    assert any("MATCH 规则 (第 1 条) 之后还有 2 条规则" in w for w in warnings)
+
+
+def test_rule_set_references():
+    config = base_config(
+        rules=["RULE-SET,missing,Proxy", "AND,((RULE-SET,other),(NETWORK,UDP)),DIRECT", "MATCH,DIRECT"],
+        **{"rule-providers": {"unused": {"type": "http", "behavior": "domain", "url": "https://example.com"}}},
+    )
+    errors, warnings = validate_config(config)
+    assert any("'missing'" in e for e in errors)
+    assert any("'other'" in e for e in errors)
+    assert any("'unused' 未被任何规则引用" in w for w in warnings)
+
+
+def test_unknown_targets():
+    config = base_config(rules=["DOMAIN,a.com,Nowhere", "MATCH,DIRECT"],
+                         **{"proxy-groups": [{"name": "Proxy", "type": "select", "proxies": ["a", "ghost"]}]})
+    _, warnings = validate_config(config)
+    assert any("'ghost'" in w for w in warnings)
+    assert any("'Nowhere'" in w for w in warnings)
@@ -0,0 +1,134 @@
+import sqlite3
+
+import pytest
+
+from node_store import NodeStore
+from workspace_store import WorkspaceNodeStore, WorkspaceStore
+
+
+def node(name, server=None):
+    return {"name": name, "type": "trojan", "server": server or f"{name}.example.com", "port": 443, "password": "pw"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return WorkspaceStore(str(tmp_path / "workspaces.db"))
+
+
+def counting(store):
+    """记录 node_data 读取的行数"""
+    reads = []
+    node_data = store.node_data
+
+    def wrapped(workspace, names=None):
+        rows = node_data(workspace, names)
+        reads.append(len(rows))
+        return rows
+
+    store.node_data = wrapped
+    return reads
+
+
+def test_open_reads_index_only(store):
+    WorkspaceNodeStore(store).add_many([node(f"n{i}") for i in range(100)])
+    reads = counting(store)
+    session = WorkspaceNodeStore(store)
+    assert len(session) == 100 and session.tag_of("n1") is None
+    assert session.search("") == [f"n{i}" for i in range(100)]
+    assert reads == []
+    assert session.get("n5")["server"] == "n5.example.com"
+    assert reads == [1]
+    assert len(session.proxies) == 100
+    assert reads == [1, 99]
+
+
+def test_sessions_see_each_other(store):
+    first = WorkspaceNodeStore(store)
+    second = WorkspaceNodeStore(store)
+    first.add_many([node("a"), node("b"), node("c")])
+    assert len(second) == 0
+    assert second.refresh() and second.names() == ["a", "b", "c"]
+
+    second.remove("b")
+    second.replace("c", node("c2", "c.example.com"))
+    assert first.refresh() and first.names() == ["a", "c2"]
+    assert first.get("c2")["name"] == "c2"
+    assert not first.refresh()
+
+    # 增删改之前先同步：重复节点按对方写入的内容判断
+    assert first.add(node("dup", "a.example.com")) is None
+    second.add(node("d"))
+    assert first.add(node("d", "other.example.com")) == "d 2"
+    assert WorkspaceNodeStore(store).names() == ["a", "c2", "d", "d 2"]
+
+
+def test_remove_deleted_elsewhere(store):
+    first = WorkspaceNodeStore(store)
+    first.add_many([node("a"), node("b")])
+    second = WorkspaceNodeStore(store)
+    first.remove("a")
+    # second 尚未同步，读取已删除的节点时将其移除而不是写回
+    assert second.get("a") is None and "a" not in second
+    assert second.remove_many(["a", "b"]) == [node("b")]
+    assert len(WorkspaceNodeStore(store)) == 0
+
+
+def test_cache_key_shared_between_sessions(store):
+    first = WorkspaceNodeStore(store)
+    first.add(node("a"))
+    second = WorkspaceNodeStore(store)
+    assert first.cache_key() == second.cache_key()
+    with second.batch():
+        second.add(node("b"))
+        assert second.cache_key() != first.cache_key()
+    first.refresh()
+    assert first.cache_key() == second.cache_key()
+
+    # 期间有其他会话写入时不再共用，直到重新同步
+    first.add(node("c"))
+    second.add(node("d"))
+    assert second.cache_key() != first.cache_key()
+    second.refresh()
+    first.refresh()
+    assert first.cache_key() == second.cache_key()
+    assert first.names() == second.names() == ["a", "b", "c", "d"]
+
+
+def test_empty_search_skips_index():
+    store = NodeStore([node("a"), node("b")])
+    assert store.search("") == ["a", "b"]
+    assert store._index is None
+    assert store.search("name:A") == ["a"]
+
+
+def test_save_settings_after_external_write(store):
+    other = WorkspaceStore(store.path)  # 另一个进程
+    store.save_settings("default", {"a": 1, "b": 1})
+    other.save_settings("default", {"a": 2})
+    # 缓存的旧值与数据库不同，须重新读取后写入
+    assert store.save_settings("default", {"a": 1, "b": 1}) == 1
+    assert other.load_settings("default") == {"a": 1, "b": 1}
+    assert store.save_settings("default", {"a": 1}) == 0
+
+
+def test_migrates_old_database(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE workspaces (workspace TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0,
+                                 updated_at INTEGER NOT NULL DEFAULT 0);
+        CREATE TABLE nodes (workspace TEXT NOT NULL, name TEXT NOT NULL, position INTEGER NOT NULL,
+                            data TEXT NOT NULL, tag TEXT, PRIMARY KEY (workspace, name));
+        INSERT INTO workspaces VALUES ('default', 3, 0);
+    """)
+    conn.execute("INSERT INTO nodes VALUES ('default', 'a', 1, ?, NULL)",
+                 ('{"name": "a", "type": "trojan", "server": "a.example.com", "port": 443, "password": "pw"}',))
+    conn.commit()
+    conn.close()
+
+    store = WorkspaceStore(path)
+    session = WorkspaceNodeStore(store)
+    assert session.proxies == [node("a")]
+    session.add(node("b"))
+    assert store.version("default") == 4 and store.nodes_version("default") == 1
+    assert WorkspaceNodeStore(store).names() == ["a", "b"]
@@ -0,0 +1,39 @@
+import pytest
+import yaml
+
+import yaml_io
+
+SAMPLES = [
+    {"proxies": [{"name": "🇭🇰 香港 01", "type": "ss", "server": "hk.example.com", "port": 443,
+                  "cipher": "aes-128-gcm", "password": "p@ss: word", "udp": True}]},
+    {"name": "emoji 😀🚀 and 中文", "private": "\ue000 占位", "astral": "\U0001F1FA\U0001F1F8"},
+    {"quoted": ["yes", "no", "on", "null", "~", "123", "0x1F", "1e3", "- dash", "#hash", ": colon", ""]},
+    {"numbers": [0, -1, 3.5, 1e20], "bools": [True, False], "none": None},
+    {"nested": {"a": [{"b": [1, 2, {"c": "d"}]}], "long": "x" * 200, "multi": "line1\nline2"}},
+]
+
+
+def reference_dump(data):
+    return yaml.dump(data, Dumper=yaml.SafeDumper, **yaml_io.DUMP_DEFAULTS)
+
+
+@pytest.mark.parametrize("data", SAMPLES)
+def test_dump_matches_pure_python(data):
+    assert yaml_io.dump(data) == reference_dump(data)
+
+
+@pytest.mark.parametrize("data", SAMPLES)
+def test_dump_round_trip(data):
+    assert yaml_io.load(yaml_io.dump(data)) == data
+
+
+def test_dump_to_stream(tmp_path):
+    path = tmp_path / "out.yaml"
+    with open(path, "w", encoding="utf-8") as f:
+        yaml_io.dump(SAMPLES[0], f)
+    assert path.read_text(encoding="utf-8") == reference_dump(SAMPLES[0])
+
+
+def test_load_payload():
+    text = "payload:\n  - '1.1.1.0/24'\n  - 2.2.2.0/24 # comment\n  - \"3.3.3.3/32\"\n"
+    assert yaml_io.load_payload(text) == ["1.1.1.0/24", "2.2.2.0/24", "3.3.3.3/32"]